@@ -0,0 +1,65 @@
+"""
+Micro-benchmark of `BookingRecord` against the pydantic `Booking` model on the hot paths: conversion, identity and
+eval scoring.
+"""
+
+import timeit
+from collections.abc import Callable
+
+from src.bookings import Booking, Bookings, from_records, to_records
+from src.eval.data import test_set
+from src.eval.run import normalise_booking
+
+NUMBER = 200
+
+
+def normalise_pydantic(booking: Booking) -> Booking:
+    booking = booking.model_copy(deep=True)
+    if booking.event_type:
+        booking.event_type = booking.event_type.strip().lower()
+    if booking.any_other_info:
+        booking.any_other_info = booking.any_other_info.strip().lower()
+    return booking
+
+
+def score_pydantic(resp: Bookings, expected: Bookings) -> float:
+    resp = Bookings(bookings=[normalise_pydantic(b) for b in resp.bookings])
+    expected = Bookings(bookings=[normalise_pydantic(b) for b in expected.bookings])
+    if resp == expected:
+        return 1.0
+    return sum(1 for b in resp.bookings if b in expected.bookings) / max(len(expected.bookings), 1)
+
+
+def score_records(resp: Bookings, expected: Bookings) -> float:
+    resp_records = [normalise_booking(b) for b in to_records(resp)]
+    expected_records = [normalise_booking(b) for b in to_records(expected)]
+    if resp_records == expected_records:
+        return 1.0
+    expected_set = set(expected_records)
+    return sum(1 for b in resp_records if b in expected_set) / max(len(expected_records), 1)
+
+
+def bench(name: str, fn: Callable[[], object], n_bookings: int) -> None:
+    seconds = min(timeit.repeat(fn, number=NUMBER, repeat=5)) / NUMBER
+    print(f"{name:<40} {seconds * 1e6:>10.1f} us/call {seconds * 1e6 / n_bookings:>8.2f} us/booking")
+
+
+def main():
+    bookings = Bookings(bookings=[b for _, expected in test_set for b in expected.bookings])
+    reversed_ = Bookings(bookings=bookings.bookings[::-1])
+    records = to_records(bookings)
+    n = len(bookings.bookings)
+    print(f"{n} bookings")
+
+    bench("to_records", lambda: to_records(bookings), n)
+    bench("from_records", lambda: from_records(records), n)
+    bench("Booking.booking_id", lambda: [b.booking_id for b in bookings.bookings], n)
+    bench("set of Booking ids", lambda: {b.booking_id for b in bookings.bookings}, n)
+    bench("set of BookingRecord", lambda: set(records), n)
+    bench("score (pydantic)", lambda: score_pydantic(reversed_, bookings), n)
+    bench("score (records)", lambda: score_records(reversed_, bookings), n)
+    assert score_pydantic(reversed_, bookings) == score_records(reversed_, bookings)
+
+
+if __name__ == "__main__":
+    main()
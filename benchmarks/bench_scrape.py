@@ -0,0 +1,45 @@
+"""
+Benchmark of the streaming `<img>` scanner against the previous BeautifulSoup tree build on a saved Squarespace page.
+"""
+
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+
+from bs4 import BeautifulSoup, Tag
+
+from src.scrape import URL, is_booking_url, scan_img_urls
+
+FIXTURE = Path(__file__).parents[1] / "tests" / "fixtures" / "squarespace_page.html"
+NUMBER = 50
+
+
+def get_img_urls_bs4(html: str) -> list[str]:
+    soup = BeautifulSoup(html, "html.parser")
+    urls = []
+    for img_tag in soup.find_all("img"):
+        if isinstance(img_tag, Tag) and (url := img_tag.get("src")) and isinstance(url, str) and is_booking_url(url):
+            urls.append(url)
+    return urls
+
+
+def get_img_urls_scan(html: str) -> list[str]:
+    return [url for url in scan_img_urls(html, URL) if is_booking_url(url)]
+
+
+def bench(name: str, fn: Callable[[], object], size: int) -> None:
+    seconds = min(timeit.repeat(fn, number=NUMBER, repeat=5)) / NUMBER
+    print(f"{name:<40} {seconds * 1e3:>10.2f} ms/page {size / seconds / 1e6:>8.1f} MB/s")
+
+
+def main():
+    html = FIXTURE.read_text()
+    print(f"{len(html)} characters")
+
+    bench("BeautifulSoup (html.parser)", lambda: get_img_urls_bs4(html), len(html))
+    bench("ImgScanner", lambda: get_img_urls_scan(html), len(html))
+    print(f"BeautifulSoup: {len(get_img_urls_bs4(html))} URLs, ImgScanner: {len(get_img_urls_scan(html))} URLs")
+
+
+if __name__ == "__main__":
+    main()
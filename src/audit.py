@@ -0,0 +1,48 @@
+"""
+Report bookings with more than one calendar event, i.e. stale events left behind by an interrupted run, from the
+calendar mirror (see `src.sync`) of each source's calendar.
+"""
+
+import argparse
+import logging
+
+from src.manifest import ManifestStore
+from src.run import get_manifest_store
+from src.sources import get_sources
+from src.sync import CalendarMirror, get_private_property
+
+logger = logging.getLogger(__name__)
+
+
+def find_duplicates(store: ManifestStore, calendar_id: str) -> dict[str, list[str]]:
+    """
+    Bring the mirror of `calendar_id` up to date and find the bookings with duplicate events.
+
+    Returns:
+        dict[str, list[str]]: The IDs of the events of each duplicated booking, by booking ID.
+    """
+    mirror = CalendarMirror(store.client, store.bucket, calendar_id)
+    mirror.load()
+    mirror.sync()
+    mirror.save()
+    duplicates = {}
+    for booking_id in mirror.duplicate_booking_ids():
+        events = mirror.events_for_booking(booking_id)
+        duplicates[booking_id] = [event_id for event in events if (event_id := event.get("id"))]
+        sources = ", ".join(sorted({get_private_property(event, "source_id") or "?" for event in events}))
+        logger.warning(f"Booking {booking_id} has {len(events)} events in {calendar_id} (from {sources})")
+    return duplicates
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__).parse_args()
+
+    store = get_manifest_store()
+    calendar_ids = {source.get_calendar_id() for source in get_sources()}
+    found = sum(len(find_duplicates(store, calendar_id)) for calendar_id in sorted(calendar_ids))
+    logger.info(f"Found {found} bookings with duplicate events")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
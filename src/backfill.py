@@ -0,0 +1,325 @@
+"""
+Re-extract bookings from every image stored in S3, e.g. after a change to the prompt or model.
+
+Extraction runs concurrently (bounded and rate limited); calendar reconciliation runs serially, oldest image first,
+so newer schedules take precedence where images overlap, and never replaces the dates of a completed image uploaded
+after the one being reconciled (see `src.run.reconcile_contents`), so neither a filtered backfill (e.g. of failed
+images only) nor an interrupted one leaves an older schedule on top of a newer one. Progress is checkpointed to S3 after every completed image,
+so a backfill interrupted by a Lambda timeout resumes where it left off when re-run with the same name, retrying the
+images that failed.
+
+With `--batch`, every image is extracted in one batch instead (see `src/extract/batch.py`), e.g. a Gemini batch job at
+half the price, whose results arrive when the whole job finishes; reconciliation then runs as above.
+"""
+
+import argparse
+import datetime
+import logging
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from pydantic import BaseModel, Field
+
+if TYPE_CHECKING:
+    from types_boto3_s3.client import S3Client
+
+from src.bookings import Bookings
+from src.dedup import RESULTS_PREFIX
+from src.extract.batch import BATCH_BACKENDS, BatchBackend, BatchRequest, get_batch_backend
+from src.extract.google_ import extract_bookings_from_bytes
+from src.manifest import ManifestStore, ProcessingStatus
+from src.run import ContentStoreResult, get_manifest_store, reconcile_content, usage_fields
+from src.sources import Source, get_source
+from src.usage import Usage, log_usage, track_usage
+
+logger = logging.getLogger(__name__)
+STATE_PREFIX = "state/"
+CHECKPOINT_KEY = STATE_PREFIX + "backfill/{name}.json"
+MAX_WORKERS = 4
+MIN_INTERVAL_S = 2.0
+
+
+@dataclass(frozen=True)
+class StoredObject:
+    id_: str
+    key: str
+    last_modified: datetime.datetime
+
+
+@dataclass(frozen=True)
+class BackfillFilter:
+    statuses: frozenset[ProcessingStatus | None] | None = None
+    "Only include images with one of these statuses (`None` matches images with no status); all if unset"
+    prefix: str = ""
+    since: datetime.date | None = None
+    "Only include images stored on or after this date"
+    until: datetime.date | None = None
+    "Only include images stored on or before this date"
+
+    def matches(self, obj: StoredObject, status: ProcessingStatus | None) -> bool:
+        if self.statuses is not None and status not in self.statuses:
+            return False
+        stored = obj.last_modified.date()
+        if self.since and stored < self.since:
+            return False
+        if self.until and stored > self.until:
+            return False
+        return True
+
+
+class ExtractionFailed(RuntimeError):
+    """An extraction that raised, with the LLM usage of its calls up to then."""
+
+    def __init__(self, message: str, usage: Usage):
+        super().__init__(message)
+        self.usage = usage
+
+
+class Checkpoint(BaseModel):
+    done: list[str] = Field(default_factory=list)
+    "The images completed so far; failed images are left out so a re-run retries them"
+
+
+@dataclass
+class BackfillResult:
+    completed: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+
+
+class RateLimiter:
+    """Enforce a minimum interval between calls across threads."""
+
+    def __init__(self, min_interval_s: float):
+        self.min_interval_s = min_interval_s
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.min_interval_s
+        if delay > 0:
+            time.sleep(delay)
+
+
+def list_stored_objects(client: "S3Client", bucket: str, prefix: str = "") -> Iterator[StoredObject]:
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            if key.startswith((STATE_PREFIX, RESULTS_PREFIX)):
+                continue
+            yield StoredObject(id_=key.rsplit(".", 1)[0], key=key, last_modified=obj["LastModified"])
+
+
+def load_checkpoint(client: "S3Client", bucket: str, name: str) -> Checkpoint:
+    try:
+        response = client.get_object(Bucket=bucket, Key=CHECKPOINT_KEY.format(name=name))
+    except client.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "NoSuchKey":
+            raise
+        return Checkpoint()
+    return Checkpoint.model_validate_json(response["Body"].read())
+
+
+def save_checkpoint(client: "S3Client", bucket: str, name: str, checkpoint: Checkpoint) -> None:
+    client.put_object(
+        Bucket=bucket,
+        Key=CHECKPOINT_KEY.format(name=name),
+        Body=checkpoint.model_dump_json().encode(),
+        ContentType="application/json",
+    )
+
+
+def extract_stored_object(
+    client: "S3Client", bucket: str, obj: StoredObject, source: Source, rate_limiter: RateLimiter
+) -> tuple[Bookings | None, Usage]:
+    """
+    The bookings extracted from a stored image and the LLM usage of the extraction. Raises `ExtractionFailed`, with
+    the usage so far, if the extraction raises.
+    """
+    response = client.get_object(Bucket=bucket, Key=obj.key)
+    data = response["Body"].read()
+    rate_limiter.wait()
+    with track_usage() as tracker:
+        try:
+            bookings = extract_bookings_from_bytes(data, response.get("ContentType"), source.prompt.text)
+        except Exception as e:
+            raise ExtractionFailed(f"Extraction of {obj.id_} failed: {e}", tracker.usage) from e
+    return bookings, tracker.usage
+
+
+def extract_batch(
+    client: "S3Client", bucket: str, objs: list[StoredObject], sources: list[Source], batch: BatchBackend
+) -> list[Future[tuple[Bookings | None, Usage]]]:
+    """
+    Extract stored images in one batch, as completed futures so they are reconciled like concurrent extractions.
+    """
+    requests = []
+    for obj, source in zip(objs, sources):
+        response = client.get_object(Bucket=bucket, Key=obj.key)
+        requests.append(BatchRequest(obj.id_, response["Body"].read(), response.get("ContentType"), source.prompt.text))
+
+    futures = []
+    for result in batch.run(requests):
+        future: Future[tuple[Bookings | None, Usage]] = Future()
+        if result.error is not None:
+            future.set_exception(ExtractionFailed(f"Batch extraction failed: {result.error}", result.usage))
+        else:
+            future.set_result((result.bookings, result.usage))
+        futures.append(future)
+    return futures
+
+
+def backfill(
+    name: str = "default",
+    filter_: BackfillFilter | None = None,
+    store: ManifestStore | None = None,
+    max_workers: int = MAX_WORKERS,
+    min_interval_s: float = MIN_INTERVAL_S,
+    reset: bool = False,
+    scoped: bool = False,
+    batch: BatchBackend | None = None,
+) -> BackfillResult:
+    """
+    Re-extract and reconcile every stored image matching `filter_`.
+
+    Args:
+        name (str): Name of the backfill, used to key its checkpoint.
+        filter_ (BackfillFilter | None): Which images to include; all images if not set.
+        store (ManifestStore | None): The loaded manifest; loaded from S3 if not set.
+        max_workers (int): Maximum number of concurrent extractions.
+        min_interval_s (float): Minimum interval between extraction requests.
+        reset (bool): Ignore any existing checkpoint and start from scratch.
+        scoped (bool): Only replace the events each image created itself, instead of every event in its date range.
+        batch (BatchBackend | None): Extract every image in one batch with this backend, instead of concurrently.
+
+    Returns:
+        BackfillResult: The content hashes completed, failed and skipped by this invocation.
+    """
+    filter_ = filter_ or BackfillFilter()
+    store = store or get_manifest_store()
+    client, bucket = store.client, store.bucket
+    checkpoint = Checkpoint() if reset else load_checkpoint(client, bucket, name)
+    done = set(checkpoint.done)
+    result = BackfillResult()
+
+    candidates = []
+    for obj in list_stored_objects(client, bucket, filter_.prefix):
+        if obj.id_ in done:
+            result.skipped.append(obj.id_)
+        elif filter_.matches(obj, store.manifest.get_status(obj.id_)):
+            candidates.append(obj)
+
+    def published_at(obj: StoredObject) -> datetime.datetime:
+        entry = store.manifest.entries.get(obj.id_)
+        return entry.published_at if entry and entry.published_at else obj.last_modified
+
+    def source_of(obj: StoredObject) -> Source:
+        entry = store.manifest.entries.get(obj.id_)
+        return get_source(entry.source if entry else None)
+
+    candidates.sort(key=published_at)
+    logger.info(f"Backfill {name!r}: {len(candidates)} images to process, {len(result.skipped)} already done")
+
+    rate_limiter = RateLimiter(min_interval_s)
+    total_usage = Usage()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if batch is not None:
+            futures = extract_batch(client, bucket, candidates, [source_of(obj) for obj in candidates], batch)
+        else:
+            futures = [
+                executor.submit(extract_stored_object, client, bucket, obj, source_of(obj), rate_limiter)
+                for obj in candidates
+            ]
+        for obj, future in zip(candidates, futures):
+            content = ContentStoreResult(
+                id_=obj.id_,
+                key=obj.key,
+                s3_url=f"https://{bucket}.s3.amazonaws.com/{obj.key}",
+                should_process=True,
+                processing_status=store.manifest.get_status(obj.id_),
+            )
+            try:
+                if (error := future.exception()) is not None:
+                    usage = error.usage if isinstance(error, ExtractionFailed) else Usage()
+                    total_usage += usage
+                    store.update(
+                        obj.id_, obj.key, status=ProcessingStatus.FAILED, **usage_fields(store, obj.id_, usage)
+                    )
+                bookings, usage = future.result()
+                total_usage += usage
+                if fields := usage_fields(store, obj.id_, usage):
+                    store.update(obj.id_, obj.key, **fields)
+                reconcile_content(store, content, bookings, scoped, source_of(obj).get_calendar_id())
+                result.completed.append(obj.id_)
+            except Exception:
+                logger.exception(f"Backfill of {obj.id_} failed")
+                result.failed.append(obj.id_)
+                continue
+
+            checkpoint.done.append(obj.id_)
+            save_checkpoint(client, bucket, name, checkpoint)
+
+    logger.info(
+        f"Backfill {name!r} finished: {len(result.completed)} completed, {len(result.failed)} failed, "
+        f"{len(result.skipped)} skipped"
+    )
+    log_usage("backfill", total_usage, name=name)
+    return result
+
+
+def parse_status(value: str) -> ProcessingStatus | None:
+    return None if value == "unset" else ProcessingStatus(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--name", default="default", help="Backfill name, used to key the checkpoint")
+    parser.add_argument(
+        "--status",
+        action="append",
+        type=parse_status,
+        help="Only include images with this status (repeatable; `unset` for images with no status)",
+    )
+    parser.add_argument("--prefix", default="", help="Only include keys with this prefix")
+    parser.add_argument("--since", type=datetime.date.fromisoformat, help="Only include images stored on/after")
+    parser.add_argument("--until", type=datetime.date.fromisoformat, help="Only include images stored on/before")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--min-interval", type=float, default=MIN_INTERVAL_S)
+    parser.add_argument("--reset", action="store_true", help="Ignore any existing checkpoint")
+    parser.add_argument(
+        "--scoped", action="store_true", help="Only replace each image's own events, leaving other images' alone"
+    )
+    parser.add_argument(
+        "--batch",
+        choices=BATCH_BACKENDS,
+        help="Extract every image in one batch: a Gemini batch job (`gemini`), or one at a time locally (`local`)",
+    )
+    args = parser.parse_args()
+
+    backfill(
+        name=args.name,
+        filter_=BackfillFilter(
+            statuses=frozenset(args.status) if args.status else None,
+            prefix=args.prefix,
+            since=args.since,
+            until=args.until,
+        ),
+        max_workers=args.max_workers,
+        min_interval_s=args.min_interval,
+        reset=args.reset,
+        scoped=args.scoped,
+        batch=get_batch_backend(args.batch, args.min_interval) if args.batch else None,
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
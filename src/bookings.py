@@ -1,6 +1,6 @@
 import datetime
 from datetime import time
-from typing import Literal
+from typing import Literal, NamedTuple
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -44,3 +44,58 @@ class Bookings(BaseModel):
         from_date = min(booking.date for booking in self.bookings)
         to_date = max(booking.date for booking in self.bookings)
         return (to_date - from_date).days + 1
+
+
+def to_minutes(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+
+def from_minutes(minutes: int) -> time:
+    return time(minutes // 60, minutes % 60)
+
+
+class BookingRecord(NamedTuple):
+    """
+    A lightweight, immutable and hashable form of `Booking` for diffing and scoring.
+
+    Times are stored as minutes since midnight; `duration` holds the free-text time (e.g. 'ALL DAY') instead.
+    """
+
+    date: datetime.date
+    start: int | None
+    end: int | None
+    duration: str | None
+    day: str | None
+    event_type: str | None
+    any_other_info: str | None
+
+    @classmethod
+    def from_booking(cls, booking: Booking) -> "BookingRecord":
+        if isinstance(booking.time, str):
+            start = end = None
+            duration = booking.time
+        else:
+            start, end = to_minutes(booking.time.start), to_minutes(booking.time.end)
+            duration = None
+        return cls(booking.date, start, end, duration, booking.day, booking.event_type, booking.any_other_info)
+
+    def to_booking(self) -> Booking:
+        if self.start is None or self.end is None:
+            time_ = self.duration or ""
+        else:
+            time_ = FromToTime(start=from_minutes(self.start), end=from_minutes(self.end))
+        return Booking(
+            day=self.day,
+            date=self.date,
+            time=time_,
+            event_type=self.event_type,
+            any_other_info=self.any_other_info,
+        )
+
+
+def to_records(bookings: Bookings) -> list[BookingRecord]:
+    return [BookingRecord.from_booking(booking) for booking in bookings.bookings]
+
+
+def from_records(records: list[BookingRecord]) -> Bookings:
+    return Bookings(bookings=[record.to_booking() for record in records])
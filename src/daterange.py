@@ -0,0 +1,75 @@
+import datetime
+from collections.abc import Iterator
+from dataclasses import dataclass
+from zoneinfo import ZoneInfo
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+@dataclass(frozen=True)
+class DateRange:
+    """
+    A half-open range of dates: `start` is included, `stop` is not.
+
+    Use `DateRange.inclusive` to build one from a first and last date, e.g. the min and max dates of some bookings.
+    """
+
+    start: datetime.date
+    stop: datetime.date
+
+    def __post_init__(self):
+        if self.stop < self.start:
+            raise ValueError(f"Invalid date range: stop {self.stop} is before start {self.start}")
+
+    @classmethod
+    def inclusive(cls, first: datetime.date, last: datetime.date) -> "DateRange":
+        return cls(first, last + ONE_DAY)
+
+    @property
+    def last(self) -> datetime.date:
+        """The last date in the range (inclusive)."""
+        return self.stop - ONE_DAY
+
+    @property
+    def days(self) -> int:
+        return (self.stop - self.start).days
+
+    def __contains__(self, date: object) -> bool:
+        return isinstance(date, datetime.date) and self.start <= date < self.stop
+
+    def __iter__(self) -> Iterator[datetime.date]:
+        for offset in range(self.days):
+            yield self.start + datetime.timedelta(days=offset)
+
+    def __str__(self) -> str:
+        return f"{self.start} to {self.last}"
+
+    def split_months(self) -> list["DateRange"]:
+        """
+        Split the range at month boundaries.
+
+        Example:
+            2023-01-15 to 2023-03-10 (inclusive) gives 2023-01-15 to 2023-01-31, 2023-02-01 to 2023-02-28 and
+            2023-03-01 to 2023-03-10.
+        """
+        ranges = []
+        start = self.start
+        while start < self.stop:
+            next_month = (start.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+            ranges.append(DateRange(start, min(next_month, self.stop)))
+            start = next_month
+        return ranges
+
+    def to_datetimes(self, tz: str) -> tuple[datetime.datetime, datetime.datetime]:
+        """
+        The range as local midnights in `tz`, suitable for `timeMin`/`timeMax` (which are also start-inclusive and
+        stop-exclusive).
+
+        Midnight is never skipped or repeated by `Europe/London` DST transitions (which happen at 01:00 UTC), so the
+        UTC offset is always the one in force on the date itself.
+        """
+        zone = ZoneInfo(tz)
+        return (
+            datetime.datetime.combine(self.start, datetime.time.min, tzinfo=zone),
+            datetime.datetime.combine(self.stop, datetime.time.min, tzinfo=zone),
+        )
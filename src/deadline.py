@@ -0,0 +1,38 @@
+import math
+import time
+from collections.abc import Callable
+from typing import Any
+
+
+class Deadline:
+    """
+    The time left for an invocation, so work that cannot finish in time is left for the next one instead of being
+    killed half way through.
+    """
+
+    def __init__(self, remaining_s: float | None = None, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.expires_at = None if remaining_s is None else clock() + remaining_s
+
+    @classmethod
+    def from_lambda_context(cls, context: Any) -> "Deadline":
+        return cls(context.get_remaining_time_in_millis() / 1000)
+
+    def remaining(self) -> float:
+        return math.inf if self.expires_at is None else self.expires_at - self.clock()
+
+    def has_time_for(self, seconds: float) -> bool:
+        return self.remaining() >= seconds
+
+
+class DurationEstimate:
+    """A running estimate of how long a step takes: the initial guess until observed, then a moving average."""
+
+    def __init__(self, initial_s: float, smoothing: float = 0.5):
+        self.seconds = initial_s
+        self.smoothing = smoothing
+        self.observed = False
+
+    def observe(self, seconds: float) -> None:
+        self.seconds = seconds if not self.observed else self.smoothing * seconds + (1 - self.smoothing) * self.seconds
+        self.observed = True
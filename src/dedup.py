@@ -0,0 +1,96 @@
+"""
+Recognise stored images that are re-renders of an image already extracted, so they can reuse its bookings.
+
+Each image's difference hash (dHash) is kept in the manifest. A perceptual hash alone cannot tell a re-encoded
+schedule from one with a single cell edited (both differ by a few bits), so a near-duplicate must also come from the
+same CDN asset path, i.e. be the same upload served with a different encoding, size or query string.
+"""
+
+import io
+import logging
+from typing import TYPE_CHECKING
+
+from PIL import Image, UnidentifiedImageError
+
+if TYPE_CHECKING:
+    from types_boto3_s3.client import S3Client
+
+from src.bookings import Bookings
+from src.manifest import Manifest, ProcessingStatus
+
+logger = logging.getLogger(__name__)
+HASH_SIZE = 16
+MAX_DISTANCE = 8
+"Maximum number of differing bits (of `HASH_SIZE ** 2`); re-encoding at JPEG quality 40 flips up to ~7"
+RESULTS_PREFIX = "results/"
+RESULT_KEY = RESULTS_PREFIX + "{id_}.json"
+
+
+def dhash(data: bytes, hash_size: int = HASH_SIZE) -> str | None:
+    """
+    The difference hash of an image: one bit per pixel of a `hash_size` square greyscale thumbnail, set if the
+    pixel is brighter than its right-hand neighbour. `None` if the data is not an image Pillow can read (e.g. a PDF).
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            pixels = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS).tobytes()
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    bits = 0
+    for row in range(hash_size):
+        for col in range(row * (hash_size + 1), row * (hash_size + 1) + hash_size):
+            bits = bits << 1 | (pixels[col] > pixels[col + 1])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def hamming_distance(a: str, b: str) -> int:
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def find_near_duplicate(manifest: Manifest, id_: str, max_distance: int = MAX_DISTANCE) -> str | None:
+    """
+    The content hash of the closest completed image from the same source and asset path as `id_` whose dHash is
+    within `max_distance` bits, or `None`. The newest image wins ties.
+    """
+    entry = manifest.entries.get(id_)
+    if entry is None or entry.phash is None or entry.url_path is None:
+        return None
+
+    candidates = []
+    for other_id, other in manifest.entries.items():
+        if (
+            other_id != id_
+            and other.status == ProcessingStatus.COMPLETED
+            and other.phash is not None
+            and other.source == entry.source
+            and other.url_path == entry.url_path
+            and (distance := hamming_distance(entry.phash, other.phash)) <= max_distance
+        ):
+            candidates.append((distance, -(other.created_at.timestamp() if other.created_at else 0), other_id))
+    return min(candidates)[2] if candidates else None
+
+
+def save_result(client: "S3Client", bucket: str, id_: str, bookings: Bookings) -> None:
+    client.put_object(
+        Bucket=bucket,
+        Key=RESULT_KEY.format(id_=id_),
+        Body=bookings.model_dump_json().encode(),
+        ContentType="application/json",
+    )
+
+
+def delete_result(client: "S3Client", bucket: str, id_: str) -> None:
+    """Forget the bookings saved for `id_`, e.g. after they were undone, so they are never reused."""
+    client.delete_object(Bucket=bucket, Key=RESULT_KEY.format(id_=id_))
+
+
+def load_result(client: "S3Client", bucket: str, id_: str) -> Bookings | None:
+    """The bookings saved for `id_`, or `None` if it was extracted before results were saved."""
+    try:
+        response = client.get_object(Bucket=bucket, Key=RESULT_KEY.format(id_=id_))
+    except client.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "NoSuchKey":
+            raise
+        return None
+    return Bookings.model_validate_json(response["Body"].read())
@@ -1,12 +1,20 @@
+import argparse
 import difflib
 import json
 import logging
+import mimetypes
 import time
+from dataclasses import dataclass, field
 from typing import Any
 
-from src.bookings import Booking, Bookings
+from src.bookings import BookingRecord, Bookings, from_records, to_records
 from src.eval.data import test_set
+from src.extract.batch import BATCH_BACKENDS, BatchRequest, get_batch_backend
 from src.extract.google_ import extract_bookings_from_path
+from src.extract.prompts import Prompt, parse_prompt_id
+from src.extract.replay import ReplayMode, recorder
+from src.sources import ATHLETICS_TRACK
+from src.usage import Usage, track_usage
 
 logger = logging.getLogger(__name__)
 
@@ -23,13 +31,11 @@ def log_diff(expected: Bookings, actual: Bookings) -> None:
         logger.warning(line)
 
 
-def normalise_booking(booking: Booking) -> Booking:
-    booking = booking.model_copy(deep=True)
-    if booking.event_type:
-        booking.event_type = booking.event_type.strip().lower()
-    if booking.any_other_info:
-        booking.any_other_info = booking.any_other_info.strip().lower()
-    return booking
+def normalise_booking(booking: BookingRecord) -> BookingRecord:
+    return booking._replace(
+        event_type=booking.event_type.strip().lower() if booking.event_type else booking.event_type,
+        any_other_info=booking.any_other_info.strip().lower() if booking.any_other_info else booking.any_other_info,
+    )
 
 
 def score(resp: Bookings | None, expected: Bookings) -> float:
@@ -37,34 +43,117 @@ def score(resp: Bookings | None, expected: Bookings) -> float:
         logger.warning("No response received")
         return 0.0
 
-    resp = Bookings(bookings=[normalise_booking(b) for b in resp.bookings])
-    expected = Bookings(bookings=[normalise_booking(b) for b in expected.bookings])
+    resp_records = [normalise_booking(b) for b in to_records(resp)]
+    expected_records = [normalise_booking(b) for b in to_records(expected)]
 
-    if resp == expected:
+    if resp_records == expected_records:
         logger.info("Perfect match!")
         return 1.0
 
-    log_diff(expected, resp)
-    return sum(1 for b in resp.bookings if b in expected.bookings) / max(len(expected.bookings), 1)
+    log_diff(from_records(expected_records), from_records(resp_records))
+    expected_set = set(expected_records)
+    return sum(1 for b in resp_records if b in expected_set) / max(len(expected_records), 1)
 
 
-def main():
-    scores: list[float] = []
-    responses: dict[str, dict[int, Any]] = {}
+@dataclass
+class VariantResult:
+    """The scores and LLM usage of one prompt version over the eval set."""
+
+    prompt: Prompt
+    scores: list[float] = field(default_factory=list)
+    usage: Usage = field(default_factory=Usage)
+    responses: dict[str, dict[int, Any]] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        runs, calls = max(len(self.scores), 1), max(self.usage.calls, 1)
+        return (
+            f"{self.prompt.id}: score={sum(self.scores) / runs:.3f}"
+            f" latency={self.usage.latency_s / calls:.1f}s"
+            f" input_tokens={self.usage.input_tokens / calls:.0f}"
+            f" (cached {self.usage.cached_tokens / calls:.0f})"
+            f" output_tokens={self.usage.output_tokens / calls:.0f}"
+            f" cost=${self.usage.cost_usd:.4f} over {len(self.scores)} runs"
+        )
+
+    def add(self, case_name: str, case: int, resp: Bookings | None, expected: Bookings, usage: Usage) -> None:
+        self.usage += usage
+        self.responses.setdefault(case_name, {})[case] = resp.model_dump(mode="json") if resp else None
+        self.scores.append(score(resp, expected))
+        logger.info(f"Score for {case_name} with {self.prompt.id} (case {case + 1}): {self.scores[-1]}")
+
+
+def run_sequential(results: list[VariantResult]) -> None:
+    """Extract and score each case of each variant in turn, pausing between images to stay within rate limits."""
     for path, bookings in test_set:
-        responses[path.stem] = {}
         for case in range(REPS_PER_CASE):
-            logger.info(f"Testing {path} (case {case + 1})")
-            resp = extract_bookings_from_path(path)
-            responses[path.stem][case] = resp.model_dump(mode="json") if resp else None
-            scores.append(score(resp, bookings))
-            logger.info(f"Score for {path} (case {case + 1}): {scores[-1]}")
-        time.sleep(60)
-
-    avg_score = sum(scores) / len(scores) if scores else 0.0
-    logger.info(f"Average score over {len(scores)} runs: {avg_score}")
+            recorder.sample = case
+            for result in results:
+                logger.info(f"Testing {path} with {result.prompt.id} (case {case + 1})")
+                with track_usage() as tracker:
+                    resp = extract_bookings_from_path(path, result.prompt.text)
+                result.add(path.stem, case, resp, bookings, tracker.usage)
+        if recorder.mode != ReplayMode.REPLAY:
+            time.sleep(60)
+
+
+def run_batch(results: list[VariantResult], backend: str) -> None:
+    """Extract every case of every variant in one batch, then score them."""
+    requests, expected = [], []
+    for path, bookings in test_set:
+        for case in range(REPS_PER_CASE):
+            for result in results:
+                requests.append(
+                    BatchRequest(
+                        key=f"{result.prompt.id}/{path.stem}/{case}",
+                        data=path.read_bytes(),
+                        mime_type=mimetypes.guess_type(path.name)[0],
+                        prompt=result.prompt.text,
+                        sample=case,
+                    )
+                )
+                expected.append((result, path, case, bookings))
+    for batch_result, (result, path, case, bookings) in zip(get_batch_backend(backend).run(requests), expected):
+        if batch_result.error is not None:
+            logger.warning(
+                f"Extraction of {path} with {result.prompt.id} (case {case + 1}) failed: {batch_result.error}"
+            )
+        result.add(path.stem, case, batch_result.bookings, bookings, batch_result.usage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score extraction against the eval set")
+    parser.add_argument(
+        "--prompt",
+        action="append",
+        type=parse_prompt_id,
+        help="Prompt version to evaluate, e.g. `athletics-track@2` (repeatable, to compare versions); the version"
+        " the athletics track source uses in production if not set",
+    )
+    parser.add_argument(
+        "--replay",
+        type=ReplayMode,
+        choices=list(ReplayMode),
+        default=recorder.mode,
+        help="Use recorded responses (`replay`), record missing ones (`record`) or re-record all (`refresh`)",
+    )
+    parser.add_argument(
+        "--batch",
+        choices=BATCH_BACKENDS,
+        help="Extract every case in one batch (see `src/extract/batch.py`) instead of one at a time",
+    )
+    args = parser.parse_args()
+    recorder.mode = args.replay
+    results = [VariantResult(prompt) for prompt in args.prompt or [ATHLETICS_TRACK.prompt]]
+
+    if args.batch:
+        run_batch(results, args.batch)
+    else:
+        run_sequential(results)
+
+    for result in results:
+        logger.info(result.summary())
     with open("responses.json", "w") as f:
-        json.dump(responses, f, indent=2)
+        json.dump({result.prompt.id: result.responses for result in results}, f, indent=2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,206 @@
+"""
+Batch extraction for workloads that can wait for their results, e.g. backfills and eval runs.
+
+`GeminiBatchBackend` submits the requests as Gemini batch jobs, billed at `BATCH_PRICE_FACTOR` of the interactive
+price and outside the interactive rate limits, polls until they finish and parses each response into `Bookings` as a
+synchronous extraction would. `LocalBatchBackend` is the stand-in where the batch API isn't available (or for small
+runs): it works through the same requests with synchronous calls. Both replay and record responses like synchronous
+calls (see `src/extract/replay.py`), so only requests without a recording are sent.
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from google import genai
+
+from src.bookings import Bookings
+from src.extract import google_
+from src.extract.google_ import MODEL, PROMPT, get_media_from_bytes, get_replay_request, get_usage
+from src.extract.replay import RecordingNotFound
+from src.usage import Usage, call_usage, record_usage, track_usage
+
+logger = logging.getLogger(__name__)
+BATCH_BACKENDS = ("gemini", "local")
+MAX_JOB_BYTES = 20_000_000
+"Gemini limits the inlined requests of a batch job to 20MB; larger batches are split across jobs"
+POLL_INTERVAL_S = 30.0
+MAX_WAIT_S = 24 * 3600.0
+"Gemini expires batch jobs that haven't finished within 24 hours"
+FINISHED_STATES = {
+    genai.types.JobState.JOB_STATE_SUCCEEDED,
+    genai.types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED,
+    genai.types.JobState.JOB_STATE_FAILED,
+    genai.types.JobState.JOB_STATE_CANCELLED,
+    genai.types.JobState.JOB_STATE_EXPIRED,
+}
+
+
+@dataclass(frozen=True)
+class BatchRequest:
+    key: str
+    "Identifies the request to the caller, e.g. the content hash of the image"
+    data: bytes
+    mime_type: str | None = None
+    prompt: str = PROMPT
+    sample: int = 0
+    "Distinguishes repeated requests in recordings, e.g. the repetitions of an eval case"
+
+    def part(self) -> genai.types.Part:
+        return get_media_from_bytes(self.data, self.mime_type)
+
+    def replay_request(self) -> dict[str, Any]:
+        return {**get_replay_request(self.part(), self.prompt), "sample": self.sample}
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    key: str
+    bookings: Bookings | None
+    usage: Usage = field(default_factory=Usage)
+    error: str | None = None
+    "Why the request failed, in which case `bookings` is `None`"
+
+
+class GeminiBatchBackend:
+    def __init__(
+        self,
+        client: genai.Client | None = None,
+        poll_interval_s: float = POLL_INTERVAL_S,
+        max_wait_s: float = MAX_WAIT_S,
+    ):
+        self.client = client or google_.client
+        self.poll_interval_s = poll_interval_s
+        self.max_wait_s = max_wait_s
+
+    def run(self, requests: list[BatchRequest]) -> list[BatchResult]:
+        """The result of each request, in order; requests without a recording are sent in as few jobs as fit."""
+        results: list[BatchResult | None] = []
+        pending: list[tuple[int, BatchRequest]] = []
+        for request in requests:
+            with track_usage() as tracker:
+                found, bookings = google_.recorder.replay(request.replay_request(), Bookings)
+            results.append(BatchResult(request.key, bookings, tracker.usage) if found else None)
+            if not found:
+                pending.append((len(results) - 1, request))
+
+        jobs = [(self.submit([request for _, request in chunk]), chunk) for chunk in chunk_by_size(pending)]
+        for name, chunk in jobs:
+            job = self.wait(name)
+            for (index, _), result in zip(chunk, self.collect(job, [request for _, request in chunk])):
+                results[index] = result
+        return [result for result in results if result is not None]
+
+    def submit(self, requests: list[BatchRequest]) -> str:
+        job = self.client.batches.create(
+            model=MODEL,
+            src=[
+                genai.types.InlinedRequest(
+                    contents=[genai.types.Content(role="user", parts=[request.part()])],
+                    config=genai.types.GenerateContentConfig(
+                        response_mime_type="application/json",
+                        response_schema=Bookings,
+                        system_instruction=request.prompt,
+                    ),
+                )
+                for request in requests
+            ],
+            config=genai.types.CreateBatchJobConfig(display_name=f"extract-bookings-{len(requests)}"),
+        )
+        logger.info(f"Submitted batch job {job.name} with {len(requests)} requests")
+        return job.name or ""
+
+    def wait(self, name: str) -> genai.types.BatchJob:
+        """Poll the job called `name` until it finishes. Raises `TimeoutError` after `max_wait_s`."""
+        started = time.monotonic()
+        while True:
+            job = self.client.batches.get(name=name)
+            if job.state in FINISHED_STATES:
+                logger.info(f"Batch job {name} finished as {job.state} after {time.monotonic() - started:.0f}s")
+                return job
+            if time.monotonic() - started > self.max_wait_s:
+                raise TimeoutError(f"Batch job {name} still {job.state} after {self.max_wait_s:.0f}s")
+            logger.info(f"Batch job {name} is {job.state}; polling again in {self.poll_interval_s:.0f}s")
+            time.sleep(self.poll_interval_s)
+
+    def collect(self, job: genai.types.BatchJob, requests: list[BatchRequest]) -> list[BatchResult]:
+        """Parse the responses of a finished job, which are in the order of its requests."""
+        responses = job.dest.inlined_responses if job.dest and job.dest.inlined_responses else []
+        results = []
+        for i, request in enumerate(requests):
+            inlined = responses[i] if i < len(responses) else None
+            if inlined is None or inlined.error or inlined.response is None:
+                error = inlined.error.message if inlined and inlined.error else f"batch job {job.name} {job.state}"
+                usage = call_usage(MODEL, 0.0, failed=True, batch=True)
+                record_usage(usage, MODEL)
+                logger.warning(f"Batch request {request.key} failed: {error}")
+                results.append(BatchResult(request.key, None, usage, str(error)))
+                continue
+
+            usage = get_usage(inlined.response.usage_metadata, 0.0, batch=True)
+            record_usage(usage, MODEL)
+            text = inlined.response.text
+            try:
+                bookings = Bookings.model_validate_json(text) if text else None
+            except ValueError as e:
+                logger.warning(f"Batch request {request.key} returned invalid bookings: {e}")
+                results.append(BatchResult(request.key, None, usage, str(e)))
+                continue
+            google_.recorder.record(request.replay_request(), bookings, usage)
+            results.append(BatchResult(request.key, bookings, usage))
+        return results
+
+
+class LocalBatchBackend:
+    def __init__(self, min_interval_s: float = 0.0):
+        self.min_interval_s = min_interval_s
+
+    def run(self, requests: list[BatchRequest]) -> list[BatchResult]:
+        """The result of each request, in order, extracted one at a time at most every `min_interval_s`."""
+        results = []
+        sample = google_.recorder.sample
+        try:
+            for i, request in enumerate(requests):
+                if i and self.min_interval_s:
+                    time.sleep(self.min_interval_s)
+                google_.recorder.sample = request.sample
+                with track_usage() as tracker:
+                    try:
+                        bookings = google_.extract_bookings(request.part(), request.prompt)
+                    except RecordingNotFound:
+                        raise
+                    except Exception as e:
+                        logger.exception(f"Batch request {request.key} failed")
+                        results.append(BatchResult(request.key, None, tracker.usage, str(e)))
+                        continue
+                results.append(BatchResult(request.key, bookings, tracker.usage))
+        finally:
+            google_.recorder.sample = sample
+        return results
+
+
+BatchBackend = GeminiBatchBackend | LocalBatchBackend
+
+
+def get_batch_backend(name: str, min_interval_s: float = 0.0) -> BatchBackend:
+    """The backend called `name` (one of `BATCH_BACKENDS`); `min_interval_s` only applies to the local backend."""
+    if name == "gemini":
+        return GeminiBatchBackend()
+    if name == "local":
+        return LocalBatchBackend(min_interval_s)
+    raise ValueError(f"Unknown batch backend {name!r}, expected one of {BATCH_BACKENDS}")
+
+
+def chunk_by_size(items: list[tuple[int, BatchRequest]]) -> list[list[tuple[int, BatchRequest]]]:
+    """Split requests into chunks whose media add up to at most `MAX_JOB_BYTES` (but at least one request each)."""
+    chunks: list[list[tuple[int, BatchRequest]]] = []
+    size = 0
+    for item in items:
+        item_size = len(item[1].data)
+        if not chunks or size + item_size > MAX_JOB_BYTES:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(item)
+        size += item_size
+    return chunks
@@ -1,21 +1,34 @@
 import logging
 import mimetypes
+import os
+import threading
+import time
+from collections.abc import Generator
 from pathlib import Path
-from typing import cast
+from typing import Any, cast
 
 import requests
 from google import genai
 
 from src.bookings import Bookings
+from src.extract.prompts import get_prompt
+from src.extract.replay import media_hash, recorder
+from src.extract.stream import BookingsStreamParser, StreamAborted
+from src.usage import Usage, call_usage, record_usage
 
 logger = logging.getLogger(__name__)
-
-PROMPT = """
-Extract ALL the bookings of the athletics track from the image.
-If the image does not contain information about athletics track bookings, return `{"bookings": []}`
-Make sure to get the year right, it may appear at the top of the image.
-ONLY EXTRACT ATHLETICS TRACK BOOKINGS, if the image relates to some other type of bookings, return `{"bookings": []}`
-"""
+MODEL = "gemini-3-flash-preview"
+PROMPT = get_prompt("athletics-track", 1).text
+TENNIS_PROMPT = get_prompt("tennis", 1).text
+CONTEXT_CACHING = os.getenv("GEMINI_CONTEXT_CACHING", "0").lower() in ("1", "true")
+"Send prompts from an explicit context cache; off by default as the current prompts are too short to cache"
+CACHE_TTL_S = 3600
+CACHE_RENEW_MARGIN_S = 300
+"A context cache is replaced this long before it expires, so no request races its expiry"
+MIN_CACHE_TOKENS = 1024
+"Smallest prefix Gemini accepts in an explicit context cache; shorter prompts rely on implicit prefix caching"
+STREAMING = os.getenv("GEMINI_STREAMING", "0").lower() in ("1", "true")
+"Stream responses and stop generations that go off the rails early (see `generate_bookings_stream`)"
 
 
 client = genai.Client()
@@ -41,26 +54,162 @@ def get_media_from_url(url: str) -> genai.types.Part:
     return genai.types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
 
 
-def extract_bookings(part: genai.types.Part) -> Bookings | None:
-    cfg = genai.types.GenerateContentConfigDict(
-        response_mime_type="application/json",
-        response_schema=Bookings,
+def get_media_from_bytes(data: bytes, mime_type: str | None = None) -> genai.types.Part:
+    return genai.types.Part.from_bytes(data=data, mime_type=mime_type or "image/jpeg")
+
+
+def get_usage(
+    metadata: genai.types.GenerateContentResponseUsageMetadata | None, latency_s: float, batch: bool = False
+) -> Usage:
+    if metadata is None:
+        return call_usage(MODEL, latency_s, batch=batch)
+    image_tokens = sum(
+        details.token_count or 0
+        for details in metadata.prompt_tokens_details or []
+        if details.modality in (genai.types.MediaModality.IMAGE, genai.types.MediaModality.DOCUMENT)
     )
-    response = client.models.generate_content(
-        model="gemini-3-flash-preview",
-        contents=[part, PROMPT],
-        config=cfg,
+    return call_usage(
+        MODEL,
+        latency_s,
+        input_tokens=metadata.prompt_token_count or 0,
+        output_tokens=(metadata.candidates_token_count or 0) + (metadata.thoughts_token_count or 0),
+        image_tokens=image_tokens,
+        cached_tokens=metadata.cached_content_token_count or 0,
+        batch=batch,
     )
-    return cast(Bookings | None, response.parsed)
 
 
-def extract_bookings_from_path(path: Path) -> Bookings | None:
+prefix_caches: dict[str, tuple[str | None, float]] = {}
+"Context cache name (or `None` if not cached) and renewal time of each prompt"
+prefix_caches_lock = threading.Lock()
+
+
+def create_prefix_cache(prompt: str) -> str | None:
+    if len(prompt) < MIN_CACHE_TOKENS:
+        # A token spans at least one character, so there is no need to count them
+        logger.info(f"Prompt is {len(prompt)} characters, too short to cache; sending it inline")
+        return None
+    try:
+        tokens = client.models.count_tokens(model=MODEL, contents=prompt).total_tokens or 0
+        if tokens < MIN_CACHE_TOKENS:
+            logger.info(
+                f"Prompt is {tokens} tokens, below the {MIN_CACHE_TOKENS} needed to cache it; sending it inline"
+            )
+            return None
+        cache = client.caches.create(
+            model=MODEL,
+            config=genai.types.CreateCachedContentConfig(system_instruction=prompt, ttl=f"{CACHE_TTL_S}s"),
+        )
+    except Exception:
+        logger.exception("Failed to create a context cache; sending the prompt inline")
+        return None
+    logger.info(f"Cached the {tokens}-token prompt as {cache.name}")
+    return cache.name
+
+
+def get_prefix_cache(prompt: str) -> str | None:
+    """
+    The name of a context cache holding `prompt` as the system instruction, created on first use and renewed before
+    it expires. `None` if caching is disabled, or if the prompt is too short to cache or the cache could not be
+    created; that outcome is remembered for the TTL too.
+    """
+    if not CONTEXT_CACHING:
+        return None
+    with prefix_caches_lock:
+        name, renew_at = prefix_caches.get(prompt, (None, 0.0))
+        if time.monotonic() < renew_at:
+            return name
+        name = create_prefix_cache(prompt)
+        prefix_caches[prompt] = (name, time.monotonic() + CACHE_TTL_S - CACHE_RENEW_MARGIN_S)
+        return name
+
+
+def get_replay_request(part: genai.types.Part, prompt: str) -> dict[str, Any]:
+    """What determines the response to an extraction, to fingerprint recordings by (see `src/extract/replay.py`)."""
+    inline_data = part.inline_data
+    return {
+        "provider": "google",
+        "model": MODEL,
+        "prompt": prompt,
+        "media": media_hash(inline_data.data or b"") if inline_data else None,
+        "mime_type": inline_data.mime_type if inline_data else None,
+        "schema": Bookings.model_json_schema(),
+    }
+
+
+def generate_bookings_stream(
+    part: genai.types.Part, cfg: genai.types.GenerateContentConfig
+) -> tuple[Bookings | None, genai.types.GenerateContentResponseUsageMetadata | None]:
+    """
+    Stream the response to `part`, validating each booking as it arrives (see `src/extract/stream.py`), and stop the
+    generation as soon as the response can no longer become usable bookings, so failures don't pay for the rest of it.
+
+    Returns:
+        tuple: The bookings (`None` if the generation was stopped) and the usage reported by the last chunk received.
+    """
+    parser = BookingsStreamParser()
+    metadata = None
+    stream = client.models.generate_content_stream(model=MODEL, contents=[part], config=cfg)
+    try:
+        for chunk in stream:
+            metadata = chunk.usage_metadata or metadata
+            parser.feed(chunk.text or "")
+        return parser.finish(), metadata
+    except StreamAborted as e:
+        logger.warning(f"Stopped generation after {len(parser.bookings)} bookings: {e}")
+        return None, metadata
+    finally:
+        if isinstance(stream, Generator):
+            stream.close()
+
+
+def extract_bookings(part: genai.types.Part, prompt: str = PROMPT) -> Bookings | None:
+    """
+    Extract the bookings in `part`, sending `prompt` as the system instruction so every request shares the same
+    prefix, from a context cache where possible (see `get_prefix_cache`). With `STREAMING`, a response that goes off
+    the rails is stopped early and gives `None`.
+    """
+    request = get_replay_request(part, prompt)
+
+    def generate() -> Bookings | None:
+        started = time.monotonic()
+        cfg = genai.types.GenerateContentConfig(response_mime_type="application/json", response_schema=Bookings)
+        if cache_name := get_prefix_cache(prompt):
+            cfg.cached_content = cache_name
+        else:
+            cfg.system_instruction = prompt
+        try:
+            if STREAMING:
+                bookings, metadata = generate_bookings_stream(part, cfg)
+            else:
+                response = client.models.generate_content(
+                    model=MODEL,
+                    contents=[part],
+                    config=cfg,
+                )
+                bookings, metadata = cast(Bookings | None, response.parsed), response.usage_metadata
+        except Exception:
+            record_usage(call_usage(MODEL, time.monotonic() - started, failed=True), MODEL)
+            raise
+        record_usage(get_usage(metadata, time.monotonic() - started), MODEL)
+        return bookings
+
+    return recorder.call(request, Bookings, generate)
+
+
+def extract_bookings_from_path(path: Path, prompt: str = PROMPT) -> Bookings | None:
     logger.info(f"Extracting bookings from path: {path}")
     part = get_media_from_path(path)
-    return extract_bookings(part)
+    return extract_bookings(part, prompt)
 
 
-def extract_bookings_from_url(url: str) -> Bookings | None:
+def extract_bookings_from_url(url: str, prompt: str = PROMPT) -> Bookings | None:
     logger.info(f"Extracting bookings from url: {url}")
     part = get_media_from_url(url)
-    return extract_bookings(part)
+    return extract_bookings(part, prompt)
+
+
+def extract_bookings_from_bytes(data: bytes, mime_type: str | None = None, prompt: str = PROMPT) -> Bookings | None:
+    logger.info(f"Extracting bookings from {len(data)} bytes of {mime_type or 'unknown type'}")
+    part = get_media_from_bytes(data, mime_type)
+    return extract_bookings(part, prompt)
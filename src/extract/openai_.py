@@ -1,30 +1,58 @@
+import time
+
 import openai
 
 from src.bookings import Bookings
+from src.extract.prompts import get_prompt
+from src.extract.replay import recorder
+from src.usage import call_usage, record_usage
 
-PROMPT = """
-Extract ALL the bookings of the athletics track from the image.
-If the image does not contain information about athletics track bookings, return `{"bookings": []}`
-Make sure to get the year right, it may appear at the top of the image.
-ONLY EXTRACT ATHLETICS TRACK BOOKINGS, if the image relates to some other type of bookings, return `{"bookings": []}`
-"""
+PROMPT = get_prompt("athletics-track", 1).text
+MODEL = "gpt-4o"
 
 
 client = openai.Client()
 
 
 def extract_bookings(img_url: str) -> Bookings | None:
-    response = client.responses.parse(
-        model="gpt-4o",
-        input=[
-            {"role": "system", "content": PROMPT},
-            {  # type: ignore
-                "role": "user",
-                "content": [
-                    {"type": "input_image", "image_url": img_url},
+    request = {
+        "provider": "openai",
+        "model": MODEL,
+        "prompt": PROMPT,
+        "image_url": img_url,
+        "schema": Bookings.model_json_schema(),
+    }
+
+    def parse() -> Bookings | None:
+        started = time.monotonic()
+        try:
+            response = client.responses.parse(
+                model=MODEL,
+                input=[
+                    {"role": "system", "content": PROMPT},
+                    {  # type: ignore
+                        "role": "user",
+                        "content": [
+                            {"type": "input_image", "image_url": img_url},
+                        ],
+                    },
                 ],
-            },
-        ],
-        text_format=Bookings,
-    )
-    return response.output_parsed
+                text_format=Bookings,
+            )
+        except Exception:
+            record_usage(call_usage(MODEL, time.monotonic() - started, failed=True), MODEL)
+            raise
+        usage = response.usage
+        record_usage(
+            call_usage(
+                MODEL,
+                time.monotonic() - started,
+                input_tokens=usage.input_tokens if usage else 0,
+                output_tokens=usage.output_tokens if usage else 0,
+                cached_tokens=usage.input_tokens_details.cached_tokens if usage else 0,
+            ),
+            MODEL,
+        )
+        return response.output_parsed
+
+    return recorder.call(request, Bookings, parse)
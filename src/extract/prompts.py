@@ -0,0 +1,74 @@
+"""
+Versioned extraction prompts.
+
+A registered prompt's text never changes: an edit is registered as a new version, so recordings (see
+`src/extract/replay.py`) and eval results stay attributable, and versions can be compared with
+`make eval ARGS="--prompt athletics-track@1 --prompt athletics-track@2"`. Sources pin the version they use in
+production.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Prompt:
+    name: str
+    version: int
+    text: str
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}@{self.version}"
+
+
+PROMPTS = (
+    Prompt(
+        name="athletics-track",
+        version=1,
+        text="""
+Extract ALL the bookings of the athletics track from the image.
+If the image does not contain information about athletics track bookings, return `{"bookings": []}`
+Make sure to get the year right, it may appear at the top of the image.
+ONLY EXTRACT ATHLETICS TRACK BOOKINGS, if the image relates to some other type of bookings, return `{"bookings": []}`
+""",
+    ),
+    Prompt(
+        name="athletics-track",
+        version=2,
+        text="""
+Extract ALL the bookings of the athletics track from the image, one booking per row (or per time slot if a row
+lists several).
+If the image does not contain information about athletics track bookings, return `{"bookings": []}`
+Make sure to get the year right, it may appear at the top of the image or in the title; never guess a year that is
+not shown.
+Give times as a start and end time (24-hour clock) where both are shown; otherwise copy the text exactly, e.g.
+'ALL DAY' or 'EVE'.
+Copy the event type as written, without adding information that is not in the image.
+ONLY EXTRACT ATHLETICS TRACK BOOKINGS, if the image relates to some other type of bookings, return `{"bookings": []}`
+""",
+    ),
+    Prompt(
+        name="tennis",
+        version=1,
+        text="""
+Extract ALL the bookings of the tennis courts from the image.
+If the image does not contain information about tennis court bookings, return `{"bookings": []}`
+Make sure to get the year right, it may appear at the top of the image.
+ONLY EXTRACT TENNIS COURT BOOKINGS, if the image relates to some other type of bookings, return `{"bookings": []}`
+""",
+    ),
+)
+
+
+def get_prompt(name: str, version: int | None = None) -> Prompt:
+    """The prompt called `name` at `version`, or its latest version if `version` is `None`."""
+    versions = [prompt for prompt in PROMPTS if prompt.name == name and version in (None, prompt.version)]
+    if not versions:
+        raise ValueError(f"Unknown prompt {name!r}" + (f" version {version}" if version is not None else ""))
+    return max(versions, key=lambda prompt: prompt.version)
+
+
+def parse_prompt_id(value: str) -> Prompt:
+    """The prompt for an ID like `athletics-track@2`, or the latest version for a bare name."""
+    name, _, version = value.partition("@")
+    return get_prompt(name, int(version) if version else None)
@@ -0,0 +1,128 @@
+"""
+Record and replay LLM responses, so tests and eval scoring can run offline.
+
+Each call is fingerprinted by the SHA-256 of its request (provider, model, prompt, a hash of the media and the
+response schema) and its parsed response is stored as JSON at `<LLM_REPLAY_DIR>/<fingerprint>.json`, alongside the
+request for inspection and the usage of the call, which is reported again on replay so evals run from recordings
+still compare tokens and latency. `LLM_REPLAY` sets the mode (see `ReplayMode`).
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Callable
+from enum import StrEnum
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel
+
+from src.usage import Usage, record_usage, track_usage
+
+logger = logging.getLogger(__name__)
+DEFAULT_REPLAY_DIR = Path(__file__).parents[2] / "eval_data" / "recordings"
+
+
+class ReplayMode(StrEnum):
+    OFF = "off"
+    "Always call the model"
+    REPLAY = "replay"
+    "Only use recordings; raise `RecordingNotFound` if there is none"
+    RECORD = "record"
+    "Use recordings, calling the model and recording the response if there is none"
+    REFRESH = "refresh"
+    "Always call the model and overwrite the recording"
+
+
+class RecordingNotFound(LookupError):
+    pass
+
+
+def fingerprint(request: dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def media_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResponseRecorder:
+    """
+    Wraps LLM calls returning a parsed pydantic model (or `None`) with the record/replay `mode`.
+
+    `sample` is part of every fingerprint, so repeated calls with the same request (e.g. the repetitions of an eval
+    case) can be recorded separately.
+    """
+
+    def __init__(self, directory: Path, mode: ReplayMode = ReplayMode.OFF):
+        self.directory = directory
+        self.mode = mode
+        self.sample = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseRecorder":
+        return cls(
+            Path(os.getenv("LLM_REPLAY_DIR") or DEFAULT_REPLAY_DIR),
+            ReplayMode(os.getenv("LLM_REPLAY", ReplayMode.OFF).lower()),
+        )
+
+    def path(self, request: dict[str, Any]) -> Path:
+        return self.directory / f"{fingerprint(request)}.json"
+
+    def replay[T: BaseModel](self, request: dict[str, Any], response_type: type[T]) -> tuple[bool, T | None]:
+        """
+        `(True, response)` if `request` (including its `sample`) has a recording to replay in this mode, otherwise
+        `(False, None)`. Raises `RecordingNotFound` in REPLAY mode if there is none.
+        """
+        path = self.path(request)
+        if self.mode in (ReplayMode.OFF, ReplayMode.REFRESH) or not path.exists():
+            if self.mode == ReplayMode.REPLAY:
+                raise RecordingNotFound(f"No recording at {path} for {request.get('provider')} {request.get('model')}")
+            return False, None
+
+        logger.info(f"Replaying LLM response from {path.name}")
+        recording = json.loads(path.read_text())
+        if "usage" in recording:
+            record_usage(Usage.model_validate(recording["usage"]), str(request.get("model")))
+        response = recording["response"]
+        return True, None if response is None else response_type.model_validate(response)
+
+    def record(self, request: dict[str, Any], result: BaseModel | None, usage: Usage) -> None:
+        if self.mode == ReplayMode.OFF:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        recording = {
+            "request": request,
+            "response": result.model_dump(mode="json") if result is not None else None,
+            "usage": usage.model_dump(),
+        }
+        path = self.path(request)
+        path.write_text(json.dumps(recording, indent=2, sort_keys=True, default=str) + "\n")
+        logger.info(f"Recorded LLM response to {path.name}")
+
+    def call[T: BaseModel](
+        self, request: dict[str, Any], response_type: type[T], fn: Callable[[], T | None]
+    ) -> T | None:
+        """
+        The response to `request`: replayed from its recording or returned by `fn`, depending on the mode.
+
+        Args:
+            request (dict[str, Any]): Everything that determines the response; JSON-serialisable.
+            response_type (type[T]): The model the response is parsed into.
+            fn (Callable[[], T | None]): Calls the model.
+        """
+        if self.mode == ReplayMode.OFF:
+            return fn()
+
+        request = {**request, "sample": self.sample}
+        found, result = self.replay(request, response_type)
+        if found:
+            return result
+        with track_usage() as tracker:
+            result = fn()
+        self.record(request, result, tracker.usage)
+        return result
+
+
+recorder = ResponseRecorder.from_env()
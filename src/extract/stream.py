@@ -0,0 +1,100 @@
+"""
+Incremental parsing of a streamed `Bookings` response, to stop a generation as soon as it goes off the rails.
+
+`BookingsStreamParser` is fed the response text as it arrives and validates each booking against `Booking` as soon as
+its object closes. It raises `StreamAborted` once the response can no longer become usable bookings: the text isn't a
+`{"bookings": [...]}` object, a booking is invalid, the dates span more than `MAX_SPAN_DAYS` (the image isn't a
+booking schedule), or the model repeats a booking `MAX_REPEATS` times in a row or lists more than `MAX_BOOKINGS`
+(a degenerate loop).
+"""
+
+import re
+
+from pydantic import ValidationError
+
+from src.bookings import Booking, Bookings
+
+PREFIX = re.compile(r'\s*\{\s*"bookings"\s*:\s*\[')
+"The response up to the opening of the bookings array"
+MAX_SPAN_DAYS = 366
+MAX_REPEATS = 5
+"Consecutive identical bookings after which the model is assumed to be looping; real schedules repeat rows less"
+MAX_BOOKINGS = 1000
+
+
+class StreamAborted(ValueError):
+    pass
+
+
+class BookingsStreamParser:
+    def __init__(self):
+        self.text = ""
+        self.bookings: list[Booking] = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.object_start: int | None = None
+        "Where the booking being streamed starts in `text`"
+        self.repeats = 0
+
+    def feed(self, chunk: str) -> list[Booking]:
+        """
+        Add the next chunk of the response.
+
+        Returns:
+            list[Booking]: The bookings completed by `chunk`.
+
+        Raises:
+            StreamAborted: If the response can no longer become usable bookings.
+        """
+        start = len(self.text)
+        self.text += chunk
+        completed = []
+        for i in range(start, len(self.text)):
+            char = self.text[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+                if self.depth == 2 and not PREFIX.fullmatch(self.text, 0, i + 1):
+                    raise StreamAborted(f"Response does not start with a bookings array: {self.text[: i + 1]!r}")
+                if self.depth == 3 and char == "{":
+                    self.object_start = i
+            elif char in "}]":
+                if self.depth == 3 and char == "}" and self.object_start is not None:
+                    completed.append(self.add(self.text[self.object_start : i + 1]))
+                    self.object_start = None
+                self.depth -= 1
+            elif self.depth == 0 and not char.isspace():
+                raise StreamAborted(f"Response is not a JSON object: {self.text[: i + 1]!r}")
+        return completed
+
+    def add(self, raw: str) -> Booking:
+        try:
+            booking = Booking.model_validate_json(raw)
+        except ValidationError as e:
+            raise StreamAborted(f"Booking {len(self.bookings) + 1} is invalid: {e}") from e
+
+        self.repeats = self.repeats + 1 if self.bookings and booking == self.bookings[-1] else 0
+        if self.repeats >= MAX_REPEATS:
+            raise StreamAborted(f"Booking on {booking.date} repeated {self.repeats} times in a row")
+        if self.bookings and abs((booking.date - self.bookings[0].date).days) > MAX_SPAN_DAYS:
+            raise StreamAborted(f"Booking on {booking.date} is over {MAX_SPAN_DAYS} days from {self.bookings[0].date}")
+        if len(self.bookings) >= MAX_BOOKINGS:
+            raise StreamAborted(f"Response has more than {MAX_BOOKINGS} bookings")
+        self.bookings.append(booking)
+        return booking
+
+    def finish(self) -> Bookings:
+        """The bookings of the complete response. Raises `StreamAborted` if it is incomplete or invalid."""
+        try:
+            return Bookings.model_validate_json(self.text)
+        except ValidationError as e:
+            raise StreamAborted(f"Response is not valid bookings: {e}") from e
@@ -1,24 +1,61 @@
+import argparse
+import base64
 import datetime
+import functools
+import hashlib
 import json
 import logging
 import os
-from typing import TYPE_CHECKING, cast
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from html import escape
+from string import Template
+from typing import TYPE_CHECKING, Any, cast
 from urllib.parse import urlencode
 
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from zoneinfo import ZoneInfo
 
 if TYPE_CHECKING:
     from googleapiclient._apis.calendar.v3 import CalendarResource, Event, EventDateTime
+    from googleapiclient.http import HttpRequest
 
-from src.bookings import Booking, Bookings
+from src.bookings import Booking, Bookings, FromToTime
+from src.daterange import ONE_DAY, DateRange
 
 logger = logging.getLogger(__name__)
 CALENDAR_ID = os.environ["CALENDAR_ID"]
 
 TZ = "Europe/London"
 ISSUES_URL = "https://github.com/nhols/bpma-bookings/issues/new"
+BATCH_SIZE = 50
+MAX_RESULTS = 2500
+MARKER_PROPERTY = "created_by=bpma-bookings"
+"Private extended property set on every event created by this app"
+MARKER_NAME, MARKER_VALUE = MARKER_PROPERTY.split("=")
+
+BOOKING_TEMPLATE = Template(
+    "<div class='booking'><h3>$heading</h3>"
+    "<p><strong>Date:</strong> $date</p><p><strong>Time:</strong> $time</p>$details$footer</div>"
+)
+FIELD_TEMPLATE = Template("<p><strong>$label:</strong> $value</p>")
+FOOTER_TEMPLATE = Template("<p><em>Something looks off? <a href='$issue_url'>Raise an issue here</a>.</em></p>")
+
+
+@dataclass(frozen=True)
+class EventLabels:
+    """How the events of a source are labelled in the calendar."""
+
+    heading: str = "BPMA Track Booking"
+    "Heading of the event description"
+    title: str = "BPMA Track booked"
+    "Event title for bookings without an event type"
+    location: str = "Battersea Park Millennium Arena"
+
+
+TRACK_LABELS = EventLabels()
 
 
 def get_client() -> "CalendarResource":
@@ -38,6 +75,7 @@ def get_client() -> "CalendarResource":
     return cast("CalendarResource", service)
 
 
+@functools.lru_cache(maxsize=1024)
 def get_issue_url(source_id: str | None = None, s3_url: str | None = None) -> str:
     body_lines = [
         "Something looks off with this BPMA booking event.",
@@ -57,46 +95,79 @@ def get_issue_url(source_id: str | None = None, s3_url: str | None = None) -> st
     return f"{ISSUES_URL}?{query}"
 
 
-def booking_to_html(booking: Booking, s3_url: str | None = None, source_id: str | None = None) -> str:
-    """Convert a booking to HTML format for display."""
-    html = "<div class='booking'>"
-    html += "<h3>BPMA Track Booking</h3>"
-    html += f"<p><strong>Date:</strong> {booking.date.strftime('%A, %B %d, %Y')}</p>"
+@functools.lru_cache(maxsize=1024)
+def render_footer(source_id: str | None = None, s3_url: str | None = None) -> str:
+    """The source and issue link paragraphs, which are the same for every booking from an image."""
+    source = FIELD_TEMPLATE.substitute(label="Source Image", value=escape(s3_url)) if s3_url else ""
+    return source + FOOTER_TEMPLATE.substitute(issue_url=escape(get_issue_url(source_id, s3_url)))
 
-    if isinstance(booking.time, str):
-        html += f"<p><strong>Time:</strong> {booking.time}</p>"
-    else:
-        start_time = booking.time.start.strftime("%H:%M")
-        end_time = booking.time.end.strftime("%H:%M")
-        html += f"<p><strong>Time:</strong> {start_time} - {end_time}</p>"
-
-    if booking.event_type:
-        html += f"<p><strong>Event Type:</strong> {booking.event_type}</p>"
-    if booking.any_other_info:
-        html += f"<p><strong>Additional Info:</strong> {booking.any_other_info}</p>"
-    if s3_url:
-        html += f"<p><strong>Source Image:</strong> {s3_url}</p>"
-    html += (
-        "<p><em>Something looks off? "
-        f"<a href='{get_issue_url(source_id, s3_url)}'>Raise an issue here</a>.</em></p>"
+
+@functools.lru_cache(maxsize=1024)
+def format_date(date: datetime.date) -> str:
+    return date.strftime("%A, %B %d, %Y")
+
+
+@functools.lru_cache(maxsize=1024)
+def format_clock(time: datetime.time) -> str:
+    return time.strftime("%H:%M")
+
+
+def format_time(time: FromToTime | str) -> str:
+    if isinstance(time, str):
+        return time
+    return f"{format_clock(time.start)} - {format_clock(time.end)}"
+
+
+def booking_to_html(
+    booking: Booking, s3_url: str | None = None, source_id: str | None = None, heading: str = TRACK_LABELS.heading
+) -> str:
+    """Convert a booking to HTML format for display."""
+    details = "".join(
+        FIELD_TEMPLATE.substitute(label=label, value=escape(value))
+        for label, value in (("Event Type", booking.event_type), ("Additional Info", booking.any_other_info))
+        if value
     )
+    return BOOKING_TEMPLATE.substitute(
+        heading=escape(heading),
+        date=format_date(booking.date),
+        time=escape(format_time(booking.time)),
+        details=details,
+        footer=render_footer(source_id, s3_url),
+    )
+
 
-    html += "</div>"
-    return html
+def get_event_id(booking_id: str, calendar_id: str = CALENDAR_ID) -> str:
+    """
+    A deterministic event ID for a booking, so that inserting the same booking twice conflicts instead of creating
+    a duplicate. Calendar event IDs must be 5-1024 characters from base32hex (`0-9a-v`).
+    """
+    digest = hashlib.sha256(f"{calendar_id}\n{booking_id}".encode()).digest()
+    return base64.b32hexencode(digest).decode().lower().rstrip("=")
 
 
-def booking_to_event(booking: Booking, s3_url: str | None = None, source_id: str | None = None) -> "Event":
-    title = booking.event_type or "BPMA Track booked"
+def booking_to_event(
+    booking: Booking,
+    s3_url: str | None = None,
+    source_id: str | None = None,
+    calendar_id: str = CALENDAR_ID,
+    labels: EventLabels = TRACK_LABELS,
+) -> "Event":
+    title = booking.event_type or labels.title
     if isinstance(booking.time, str):
         title += f" ({booking.time})"
         start = {
             "date": booking.date.isoformat(),
             "timeZone": TZ,
         }
-        end = start
+        end = {
+            "date": (booking.date + ONE_DAY).isoformat(),  # all-day end dates are exclusive
+            "timeZone": TZ,
+        }
     else:
         start_dt = datetime.datetime.combine(booking.date, booking.time.start)
         end_dt = datetime.datetime.combine(booking.date, booking.time.end)
+        if booking.time.end == datetime.time(0):  # ends at midnight
+            end_dt += ONE_DAY
         start = {
             "dateTime": start_dt.isoformat(),
             "timeZone": TZ,
@@ -105,89 +176,295 @@ def booking_to_event(booking: Booking, s3_url: str | None = None, source_id: str
             "dateTime": end_dt.isoformat(),
             "timeZone": TZ,
         }
-    private_props = {"booking_id": booking.booking_id}
+    private_props = {"booking_id": booking.booking_id, MARKER_NAME: MARKER_VALUE}
     if source_id:
         private_props["source_id"] = source_id
     return {
+        "id": get_event_id(booking.booking_id, calendar_id),
         "summary": title,
-        "location": "Battersea Park Millennium Arena",
-        "description": booking_to_html(booking, s3_url, source_id),
+        "location": labels.location,
+        "description": booking_to_html(booking, s3_url, source_id, labels.heading),
         "start": cast("EventDateTime", start),
         "end": cast("EventDateTime", end),
         "extendedProperties": {"private": private_props},
     }
 
 
-def push_bookings_to_calendar(bookings: Bookings, id_: str, s3_url: str | None = None) -> None:
-    service = get_client()
+def bookings_to_events(
+    bookings: Bookings,
+    s3_url: str | None = None,
+    source_id: str | None = None,
+    calendar_id: str = CALENDAR_ID,
+    labels: EventLabels = TRACK_LABELS,
+) -> list["Event"]:
+    """Convert every booking from one image to an event, rendering the per-image parts of the description once."""
+    return [booking_to_event(booking, s3_url, source_id, calendar_id, labels) for booking in bookings.bookings]
+
+
+def execute_batched(
+    service: "CalendarResource",
+    requests: list[tuple[str, "HttpRequest"]],
+    callback: Callable[..., None],
+    progress: Callable[[int, int], None] | None = None,
+) -> None:
+    """
+    Execute `(request_id, request)` pairs in batches of at most `BATCH_SIZE` requests, calling `progress` with
+    `(done, total)` after each batch.
+    """
+    for start in range(0, len(requests), BATCH_SIZE):
+        chunk = requests[start : start + BATCH_SIZE]
+        batch = service.new_batch_http_request()
+        for request_id, request in chunk:
+            batch.add(request, callback=callback, request_id=request_id)
+        logger.info(f"Executing batch of {len(chunk)} requests ({start + len(chunk)}/{len(requests)})")
+        batch.execute()
+        if progress:
+            progress(start + len(chunk), len(requests))
+
+
+def is_conflict(exception: Exception) -> bool:
+    """Whether an insert failed because an event with the same ID exists (possibly cancelled)."""
+    return isinstance(exception, HttpError) and exception.resp.status == 409
+
+
+def insert_events(events: list["Event"], calendar_id: str = CALENDAR_ID) -> list["Event"]:
+    """
+    Insert `events` into the calendar in batches.
+
+    Events have deterministic IDs, so an insert that conflicts with an existing event is for the same booking, e.g.
+    one inserted by an earlier, interrupted run or one that was deleted (cancelled) and has now reappeared. Those
+    events are updated in place instead, which also restores cancelled events.
+
+    Returns:
+        list[Event]: The events that were created or restored, as returned by the API.
+    """
+    if not events:
+        logger.info("No events to insert")
+        return []
 
-    if not bookings.bookings:
-        logger.info("No bookings to push to calendar")
-        return
+    service = get_client()
+    created: list["Event"] = []
+    conflicts: list["Event"] = []
 
     def callback(request_id, response, exception):
-        if exception is not None:
+        if exception is not None and is_conflict(exception):
+            logger.info(f"Event for request {request_id} already exists; updating it instead")
+            conflicts.append(events[int(request_id)])
+        elif exception is not None:
             logger.error(f"Error creating event for request {request_id}: {exception}")
         else:
             logger.info(f"Successfully created event: {response.get('summary', 'Unknown')}")
+            created.append(response)
 
-    batch = service.new_batch_http_request()
-    for i, booking in enumerate(bookings.bookings):
-        logger.info(f"Adding booking to batch: {booking}")
-        event = booking_to_event(booking, s3_url, id_)
-        batch.add(service.events().insert(calendarId=CALENDAR_ID, body=event), callback=callback, request_id=str(i))
+    requests = []
+    for i, event in enumerate(events):
+        logger.info(f"Adding event to batch: {event.get('summary')} {event.get('start')}")
+        requests.append((str(i), service.events().insert(calendarId=calendar_id, body=event)))
 
-    logger.info(f"Executing batch request with {len(bookings.bookings)} events")
-    batch.execute()
+    logger.info(f"Inserting {len(events)} events")
+    execute_batched(service, requests, callback)
+    if conflicts:
+        created.extend(update_events(conflicts, calendar_id))
+    return created
 
 
-def list_events(from_date: datetime.date, to_date: datetime.date) -> list["Event"]:
+def update_events(events: list["Event"], calendar_id: str = CALENDAR_ID) -> list["Event"]:
+    """Replace existing events (matched by `id`) with `events`, marking them confirmed."""
     service = get_client()
+    updated: list["Event"] = []
 
-    tz = ZoneInfo(TZ)
-    time_min = datetime.datetime.combine(from_date, datetime.time.min, tzinfo=tz).isoformat()
-    time_max = datetime.datetime.combine(to_date, datetime.time.min, tzinfo=tz).isoformat()
+    def callback(request_id, response, exception):
+        if exception is not None:
+            logger.error(f"Error updating event {request_id}: {exception}")
+        else:
+            updated.append(response)
 
-    logger.info(f"Listing events from {time_min} to {time_max}")
-    events_result = (
-        service.events()
-        .list(
-            calendarId=CALENDAR_ID,
-            timeMin=time_min,
-            timeMax=time_max,
-            singleEvents=True,
-            orderBy="startTime",
+    requests = [
+        (
+            event["id"],
+            service.events().update(calendarId=calendar_id, eventId=event["id"], body={**event, "status": "confirmed"}),
         )
-        .execute()
-    )
-    return events_result.get("items", [])
+        for event in events
+    ]
+    logger.info(f"Updating {len(events)} existing events")
+    execute_batched(service, requests, callback)
+    return updated
+
+
+def get_event_date(event: "Event") -> datetime.date | None:
+    """The (local) start date of an event, for both all-day and timed events."""
+    start = event.get("start", {})
+    if date := start.get("date"):
+        return datetime.date.fromisoformat(date)
+    if date_time := start.get("dateTime"):
+        return datetime.datetime.fromisoformat(date_time).astimezone(ZoneInfo(TZ)).date()
+    return None
+
+
+def iter_events(calendar_id: str = CALENDAR_ID, **params: Any) -> Iterator["Event"]:
+    """Yield every event matching the `events().list` `params`, following `nextPageToken` across pages."""
+    service = get_client()
+    page_token = None
+    while True:
+        events_result = (
+            service.events()
+            .list(calendarId=calendar_id, maxResults=MAX_RESULTS, pageToken=page_token, **params)
+            .execute()
+        )
+        yield from events_result.get("items", [])
+        if not (page_token := events_result.get("nextPageToken")):
+            return
+
+
+class SyncTokenExpired(Exception):
+    """The sync token is no longer valid (HTTP 410) and a full sync is required."""
+
+
+def sync_events(sync_token: str | None = None, calendar_id: str = CALENDAR_ID) -> tuple[list["Event"], str | None]:
+    """
+    Fetch the events changed since `sync_token` was issued, or every event if it is `None`.
+
+    Changed events include deletions, which are returned with `status` "cancelled".
+
+    Returns:
+        tuple[list[Event], str | None]: The changed events and the token for the next sync.
+
+    Raises:
+        SyncTokenExpired: If the server has invalidated `sync_token`.
+    """
+    service = get_client()
+    events: list["Event"] = []
+    page_token = None
+    while True:
+        params: dict[str, Any] = {"pageToken": page_token}
+        if sync_token:
+            params["syncToken"] = sync_token
+        try:
+            events_result = service.events().list(calendarId=calendar_id, maxResults=MAX_RESULTS, **params).execute()
+        except HttpError as e:
+            if e.resp.status == 410:
+                raise SyncTokenExpired() from e
+            raise
+        events.extend(events_result.get("items", []))
+        if not (page_token := events_result.get("nextPageToken")):
+            logger.info(f"Fetched {len(events)} changed events ({'incremental' if sync_token else 'full'} sync)")
+            return events, events_result.get("nextSyncToken")
+
+
+def list_events(date_range: DateRange, calendar_id: str = CALENDAR_ID) -> list["Event"]:
+    """List the events overlapping any date in `date_range`, including the last."""
+    time_min, time_max = (dt.isoformat() for dt in date_range.to_datetimes(TZ))
+
+    logger.info(f"Listing events from {time_min} to {time_max}")
+    events = list(iter_events(calendar_id, timeMin=time_min, timeMax=time_max, singleEvents=True, orderBy="startTime"))
+    return events
+
+
+def source_property(source_id: str) -> str:
+    """The `privateExtendedProperty` filter matching events created from the image with hash `source_id`."""
+    return f"source_id={source_id}"
+
+
+def list_source_events(source_id: str, calendar_id: str = CALENDAR_ID) -> list["Event"]:
+    """List every event created from the image with hash `source_id`, whatever its date."""
+    logger.info(f"Listing events created from source {source_id}")
+    return list(iter_events(calendar_id, privateExtendedProperty=source_property(source_id), singleEvents=True))
+
+
+def is_gone(exception: Exception) -> bool:
+    """Whether an API error means the event no longer exists, e.g. because an earlier attempt deleted it."""
+    return isinstance(exception, HttpError) and exception.resp.status in (404, 410)
+
 
+def delete_events(
+    event_ids: list[str], progress: Callable[[int, int], None] | None = None, calendar_id: str = CALENDAR_ID
+) -> None:
+    if not event_ids:
+        logger.info("No events to delete")
+        return
 
-def delete_events(event_ids: list[str]) -> None:
     service = get_client()
 
     def callback(request_id, response, exception):
-        if exception is not None:
+        if exception is not None and not is_gone(exception):
             logger.error(f"Error deleting event for request {request_id}: {exception}")
         else:
             logger.info(f"Successfully deleted event with ID: {request_id}")
 
-    batch = service.new_batch_http_request()
+    requests = []
     for event_id in event_ids:
         logger.info(f"Adding delete request to batch for event ID: {event_id}")
-        batch.add(
-            service.events().delete(calendarId=CALENDAR_ID, eventId=event_id), callback=callback, request_id=event_id
-        )
+        requests.append((event_id, service.events().delete(calendarId=calendar_id, eventId=event_id)))
 
     logger.info(f"Executing batch delete request with {len(event_ids)} events")
-    batch.execute()
-
+    execute_batched(service, requests, callback, progress)
+
+
+def is_app_event(event: "Event") -> bool:
+    """
+    Whether this app created `event`: it has the `MARKER_PROPERTY`, or a `booking_id`, which events created before
+    the marker was introduced have.
+    """
+    private = event.get("extendedProperties", {}).get("private", {})
+    return private.get(MARKER_NAME) == MARKER_VALUE or "booking_id" in private
+
+
+def delete_all_events(
+    date_range: DateRange | None = None,
+    match: Callable[["Event"], bool] | None = None,
+    progress: Callable[[int, int], None] | None = None,
+    calendar_id: str = CALENDAR_ID,
+) -> int:
+    """
+    Delete every event in the calendar, optionally restricted to a date range and/or the events `match` accepts.
+
+    All pages of matching events are listed up front and then deleted in batches. Events that are already gone are
+    treated as deleted, so an interrupted wipe is resumed by simply calling this again with the same filters.
+
+    Args:
+        date_range (DateRange | None): Only delete events overlapping this range.
+        match (Callable[[Event], bool] | None): Only delete the events this returns `True` for, e.g. `is_app_event`.
+        progress (Callable[[int, int], None] | None): Called with `(deleted, total)` after each batch.
+        calendar_id (str): The calendar to delete from.
+
+    Returns:
+        int: The number of events deleted.
+    """
+    params: dict[str, Any] = {}
+    if date_range:
+        time_min, time_max = date_range.to_datetimes(TZ)
+        params["timeMin"], params["timeMax"] = time_min.isoformat(), time_max.isoformat()
+
+    event_ids = [
+        event_id
+        for event in iter_events(calendar_id, **params)
+        if (event_id := event.get("id")) and (match is None or match(event))
+    ]
+    logger.info(f"Deleting {len(event_ids)} {'matching ' if match else ''}events in {params or 'all dates'}")
+    delete_events(event_ids, progress, calendar_id)
+    return len(event_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete events from the bookings calendar")
+    parser.add_argument("--from-date", type=datetime.date.fromisoformat, help="First date to clear (inclusive)")
+    parser.add_argument("--to-date", type=datetime.date.fromisoformat, help="Last date to clear (inclusive)")
+    parser.add_argument("--calendar-id", default=CALENDAR_ID, help="Calendar to clear (default: CALENDAR_ID)")
+    parser.add_argument(
+        "--all", action="store_true", help="Include events not created by this app (e.g. created manually)"
+    )
+    args = parser.parse_args()
+    if (args.from_date is None) != (args.to_date is None):
+        parser.error("--from-date and --to-date must be given together")
+
+    delete_all_events(
+        DateRange.inclusive(args.from_date, args.to_date) if args.from_date else None,
+        match=None if args.all else is_app_event,
+        progress=lambda done, total: logger.info(f"Deleted {done}/{total} events"),
+        calendar_id=args.calendar_id,
+    )
 
-def delete_all_events():
-    service = get_client()
 
-    events = service.events().list(calendarId=CALENDAR_ID).execute()
-    for event in events.get("items", []):
-        if event_id := event.get("id"):
-            logger.info(f"Deleting event: {event.get('summary', 'Unknown')}")
-            service.events().delete(calendarId=CALENDAR_ID, eventId=event_id).execute()
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
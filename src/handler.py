@@ -1,6 +1,9 @@
 import logging
 
+from src.backfill import backfill
+from src.deadline import Deadline
 from src.run import run
+from src.workqueue import enqueue, get_work_queue, handle_sqs_records
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", force=True)
 root_logger = logging.getLogger()
@@ -17,7 +20,20 @@ def lambda_handler(event, context):
     )
 
     try:
-        run()
+        if isinstance(event, dict) and "Records" in event:
+            response = handle_sqs_records(event["Records"], Deadline.from_lambda_context(context))
+            logger.info(f"Lambda function completed with {len(response['batchItemFailures'])} failed messages")
+            return response
+        if isinstance(event, dict) and event.get("mode") == "enqueue":
+            enqueue(get_work_queue())
+        elif isinstance(event, dict) and event.get("mode") == "backfill":
+            backfill(
+                name=event.get("name", "default"),
+                reset=event.get("reset", False),
+                scoped=event.get("scoped", False),
+            )
+        else:
+            run(Deadline.from_lambda_context(context))
         logger.info("Lambda function completed successfully")
     except Exception:
         logger.exception("Error processing bookings")
@@ -0,0 +1,139 @@
+import datetime
+import logging
+from enum import StrEnum
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel, Field
+
+from src.usage import Usage
+
+if TYPE_CHECKING:
+    from types_boto3_s3.client import S3Client
+
+logger = logging.getLogger(__name__)
+MANIFEST_KEY = "state/manifest.json"
+MAX_CONFLICT_RETRIES = 5
+
+
+class ProcessingStatus(StrEnum):
+    PENDING = "pending"
+    "Stored but not yet reconciled, e.g. left for the next invocation when time ran out"
+    QUEUED = "queued"
+    "Sent to the work queue (see `src/workqueue.py`); not sent again until it completes, fails or goes stale"
+    FAILED = "failed"
+    COMPLETED = "completed"
+    ROLLED_BACK = "rolled_back"
+    "Its events were removed with `src/undo.py`; skipped by scheduled runs"
+
+
+class ManifestEntry(BaseModel):
+    key: str
+    source: str | None = None
+    "Name of the registered source the image was scraped for; the default source if unset"
+    status: ProcessingStatus | None = None
+    created_at: datetime.datetime | None = None
+    "When the image was first stored"
+    uploaded_at: datetime.datetime | None = None
+    "When the image was uploaded to the website, from its CDN URL (see `src/scrape.py`)"
+    queued_at: datetime.datetime | None = None
+    "When the image was last sent to the work queue"
+    extracted_at: datetime.datetime | None = None
+    booking_count: int | None = None
+    from_date: datetime.date | None = None
+    to_date: datetime.date | None = None
+    event_ids: list[str] = Field(default_factory=list)
+    phash: str | None = None
+    "Difference hash of the image (see `src/dedup.py`); unset for files that are not images"
+    url_path: str | None = None
+    "Path of the URL the image was first downloaded from; CDN re-renders of the same upload share it"
+    usage: Usage | None = None
+    "LLM usage summed over every extraction of the image, including failed ones"
+
+    @property
+    def published_at(self) -> datetime.datetime | None:
+        """
+        When the schedule was published, to rank overlapping images by: its upload time, or when it was first stored
+        if its URL has none. Images are stored newest upload first, so the time stored alone would rank them backwards.
+        """
+        return self.uploaded_at or self.created_at
+
+
+class Manifest(BaseModel):
+    entries: dict[str, ManifestEntry] = Field(default_factory=dict)
+
+    def get_status(self, id_: str) -> ProcessingStatus | None:
+        entry = self.entries.get(id_)
+        return entry.status if entry else None
+
+
+def is_conflict(e: Exception) -> bool:
+    code = getattr(e, "response", {}).get("Error", {}).get("Code")
+    return code in ("PreconditionFailed", "ConditionalRequestConflict")
+
+
+class ManifestStore:
+    """
+    The processing state of every stored image, kept as a single JSON object in S3 keyed by content hash.
+
+    Writes are conditional on the ETag of the last read: if another writer got there first the manifest is
+    re-read and the update re-applied, so concurrent runs never silently overwrite each other.
+    """
+
+    def __init__(self, client: "S3Client", bucket: str, key: str = MANIFEST_KEY):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.manifest = Manifest()
+        self.etag: str | None = None
+
+    def load(self) -> Manifest:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key)
+        except self.client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "NoSuchKey":
+                raise
+            logger.info(f"No manifest at s3://{self.bucket}/{self.key}; starting empty")
+            self.manifest, self.etag = Manifest(), None
+            return self.manifest
+
+        self.manifest = Manifest.model_validate_json(response["Body"].read())
+        self.etag = response["ETag"]
+        logger.info(f"Loaded manifest with {len(self.manifest.entries)} entries")
+        return self.manifest
+
+    def save(self) -> None:
+        condition = {"IfMatch": self.etag} if self.etag else {"IfNoneMatch": "*"}
+        response = self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=self.manifest.model_dump_json(exclude_none=True).encode(),
+            ContentType="application/json",
+            **condition,  # type: ignore[arg-type]
+        )
+        self.etag = response["ETag"]
+
+    def update(self, id_: str, key: str, **fields: Any) -> ManifestEntry:
+        """
+        Update the entry for `id_` with `fields` and write the manifest back, retrying on concurrent modification.
+
+        Args:
+            id_ (str): The content hash of the image.
+            key (str): The S3 key of the image, used if the entry does not exist yet.
+            **fields: `ManifestEntry` fields to set.
+
+        Returns:
+            ManifestEntry: The updated entry.
+        """
+        for attempt in range(1, MAX_CONFLICT_RETRIES + 1):
+            entry = self.manifest.entries.get(id_) or ManifestEntry(key=key)
+            entry = entry.model_copy(update=fields)
+            self.manifest.entries[id_] = entry
+            try:
+                self.save()
+                return entry
+            except self.client.exceptions.ClientError as e:
+                if not is_conflict(e):
+                    raise
+                logger.info(f"Manifest modified concurrently, reloading (attempt {attempt}/{MAX_CONFLICT_RETRIES})")
+                self.load()
+        raise RuntimeError(f"Failed to update manifest entry {id_} after {MAX_CONFLICT_RETRIES} attempts")
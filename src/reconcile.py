@@ -0,0 +1,209 @@
+import datetime
+import logging
+from collections import defaultdict
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from src.bookings import Booking, Bookings
+from src.daterange import DateRange
+from src.gcal import (
+    CALENDAR_ID,
+    TRACK_LABELS,
+    EventLabels,
+    bookings_to_events,
+    delete_events,
+    get_event_date,
+    insert_events,
+    list_events,
+    list_source_events,
+)
+from src.increment import bookings_date_range, get_booking_id
+
+if TYPE_CHECKING:
+    from googleapiclient._apis.calendar.v3 import Event
+
+logger = logging.getLogger(__name__)
+MAX_WINDOW_DAYS = 30 * 4  # ~ 4 months
+
+
+@dataclass(frozen=True)
+class SourcedBookings:
+    source_id: str
+    s3_url: str | None
+    bookings: Bookings
+    published_at: datetime.datetime
+    "When the source was published; newer sources take precedence where sources overlap"
+    labels: EventLabels = TRACK_LABELS
+    "How the source's events are labelled, e.g. as athletics track or tennis court bookings"
+
+
+@dataclass(frozen=True)
+class ReconciledRange:
+    """The dates of an image reconciled earlier, which only sources published after it may replace."""
+
+    date_range: DateRange
+    published_at: datetime.datetime
+
+
+@dataclass(frozen=True)
+class ResolvedBookings:
+    bookings: list[tuple[Booking, SourcedBookings]]
+    "The winning bookings, each with the source it came from"
+    dates: set[datetime.date]
+    "Every date covered by at least one source"
+
+
+def resolve_overlaps(sources: list[SourcedBookings], reconciled: Sequence[ReconciledRange] = ()) -> ResolvedBookings:
+    """
+    Each source is a complete replacement for the range of dates it covers, so where sources overlap, the newest
+    source owns every date in its range and the bookings of older sources on those dates are dropped. Dates in a
+    `reconciled` range published after every source covering them are left out altogether, so their events stay.
+    """
+    owners: dict[datetime.date, SourcedBookings | ReconciledRange] = {}
+    for owner in sorted([*sources, *reconciled], key=lambda o: o.published_at):
+        date_range = owner.date_range if isinstance(owner, ReconciledRange) else bookings_date_range(owner.bookings)
+        if date_range is None:
+            continue
+        for date in date_range:
+            owners[date] = owner
+
+    bookings = [
+        (booking, source)
+        for source in sources
+        for booking in source.bookings.bookings
+        if owners[booking.date] is source
+    ]
+    return ResolvedBookings(
+        bookings=bookings, dates={date for date, owner in owners.items() if isinstance(owner, SourcedBookings)}
+    )
+
+
+def get_windows(dates: set[datetime.date], max_days: int) -> list[DateRange]:
+    """
+    Split the span of `dates` into windows: a single window if the span is at most `max_days`, otherwise one per
+    calendar month. Windows without any of `dates` are skipped.
+    """
+    span = DateRange.inclusive(min(dates), max(dates))
+    if span.days <= max_days:
+        return [span]
+    return [window for window in span.split_months() if any(d in window for d in dates)]
+
+
+def reconcile(
+    sources: list[SourcedBookings],
+    max_window_days: int = MAX_WINDOW_DAYS,
+    lister: Callable[[DateRange], list["Event"]] | None = None,
+    calendar_id: str = CALENDAR_ID,
+    reconciled: Sequence[ReconciledRange] = (),
+) -> dict[str, list[str]]:
+    """
+    Bring the calendar in line with the bookings from all `sources` with one listing and batched writes per window.
+
+    Existing events on a covered date which are not in the resolved bookings (or duplicate another event) are
+    deleted, and resolved bookings without an event are inserted. Dates not covered by any source are untouched.
+    Spans longer than `max_window_days` are reconciled one calendar month at a time, so listings stay bounded.
+    Existing events are read with `lister` (default `list_events` on `calendar_id`), e.g. `CalendarMirror.list_events`
+    to avoid a live listing. Dates owned by a newer `reconciled` image are untouched (see `resolve_overlaps`).
+
+    Returns:
+        dict[str, list[str]]: The IDs of the events created, keyed by source ID.
+    """
+    resolved = resolve_overlaps(sources, reconciled)
+    if not resolved.dates:
+        return {}
+
+    windows = get_windows(resolved.dates, max_window_days)
+    logger.info(f"Reconciling {len(sources)} sources over {len(resolved.dates)} dates in {len(windows)} window(s)")
+    created_ids: dict[str, list[str]] = defaultdict(list)
+    for window in windows:
+        window_bookings = ResolvedBookings(
+            bookings=[(b, source) for b, source in resolved.bookings if b.date in window],
+            dates={d for d in resolved.dates if d in window},
+        )
+        for event in reconcile_window(window_bookings, window, lister, calendar_id):
+            source_id = event.get("extendedProperties", {}).get("private", {}).get("source_id")
+            if source_id and (event_id := event.get("id")):
+                created_ids[source_id].append(event_id)
+    return dict(created_ids)
+
+
+def diff_events(
+    events: list["Event"], bookings: list[tuple[Booking, SourcedBookings]]
+) -> tuple[list[str], list[tuple[Booking, SourcedBookings]]]:
+    """
+    Returns:
+        tuple[list[str], list[tuple[Booking, SourcedBookings]]]: The IDs of `events` which are not in `bookings` (or
+            duplicate another event), and the `bookings` without an event.
+    """
+    booking_ids = [booking.booking_id for booking, _ in bookings]
+    wanted = set(booking_ids)
+
+    extant: set[str] = set()
+    to_delete: list[str] = []
+    for event in events:
+        if (event_id := event.get("id")) is None:
+            continue
+        booking_id = get_booking_id(event)
+        if booking_id in wanted and booking_id not in extant:
+            extant.add(booking_id)
+        else:
+            to_delete.append(event_id)
+
+    to_insert = [pair for pair, booking_id in zip(bookings, booking_ids) if booking_id not in extant]
+    return to_delete, to_insert
+
+
+def apply_diff(
+    to_delete: list[str], to_insert: list[tuple[Booking, SourcedBookings]], calendar_id: str = CALENDAR_ID
+) -> list["Event"]:
+    delete_events(to_delete, calendar_id=calendar_id)
+    by_source: dict[str, tuple[SourcedBookings, list[Booking]]] = {}
+    for booking, source in to_insert:
+        by_source.setdefault(source.source_id, (source, []))[1].append(booking)
+    events = [
+        event
+        for source, bookings in by_source.values()
+        for event in bookings_to_events(
+            Bookings(bookings=bookings), source.s3_url, source.source_id, calendar_id, source.labels
+        )
+    ]
+    return insert_events(events, calendar_id)
+
+
+def reconcile_window(
+    resolved: ResolvedBookings,
+    window: DateRange,
+    lister: Callable[[DateRange], list["Event"]] | None = None,
+    calendar_id: str = CALENDAR_ID,
+) -> list["Event"]:
+    listed = lister(window) if lister else list_events(window, calendar_id)
+    events = [event for event in listed if get_event_date(event) in resolved.dates]
+    to_delete, to_insert = diff_events(events, resolved.bookings)
+    logger.info(
+        f"Window {window}: {len(resolved.bookings) - len(to_insert)} bookings unchanged, {len(to_insert)} to insert, "
+        f"{len(to_delete)} events to delete"
+    )
+    return apply_diff(to_delete, to_insert, calendar_id)
+
+
+def reconcile_source(
+    source: SourcedBookings,
+    calendar_id: str = CALENDAR_ID,
+    source_lister: Callable[[str], list["Event"]] | None = None,
+) -> list[str]:
+    """
+    Replace the events created from a single source with its bookings, e.g. after re-extracting an image.
+
+    Unlike `reconcile`, only the source's own events (found by their `source_id` property) are read and deleted, so
+    events from other sources on the same dates are left alone. A booking that already has an event from another
+    source is taken over by this one, as event IDs are derived from the booking. The source's events are read with
+    `source_lister` (default `list_source_events` on `calendar_id`), e.g. `CalendarMirror.events_for_source`.
+
+    Returns:
+        list[str]: The IDs of the events created.
+    """
+    listed = source_lister(source.source_id) if source_lister else list_source_events(source.source_id, calendar_id)
+    to_delete, to_insert = diff_events(listed, [(booking, source) for booking in source.bookings.bookings])
+    logger.info(f"Source {source.source_id}: {len(to_insert)} bookings to insert, {len(to_delete)} events to delete")
+    return [event_id for event in apply_diff(to_delete, to_insert, calendar_id) if (event_id := event.get("id"))]
@@ -0,0 +1,172 @@
+"""
+Extract only the parts of a schedule image that changed since the previous version.
+
+Schedules are usually re-published with a few rows edited. The new image is compared with the previous version
+pixel by pixel to find the changed horizontal bands; each band (with the top of the image, which has the column
+headings and often the year) is extracted from both versions. The bookings found in the old band are swapped for
+those in the new band, and the rest come from the previous result. Whenever that is not clearly safe (different
+dimensions, large or scattered changes, an old band with no bookings or a different number of bookings than the new band, or the
+old band disagreeing with the previous result) `None` is returned and the caller falls back to a full extraction.
+"""
+
+import io
+import logging
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+from PIL import Image, ImageChops, UnidentifiedImageError
+
+if TYPE_CHECKING:
+    from types_boto3_s3.client import S3Client
+
+from src.bookings import Booking, Bookings
+from src.dedup import load_result
+from src.manifest import Manifest, ProcessingStatus
+
+logger = logging.getLogger(__name__)
+PIXEL_THRESHOLD = 48
+"Minimum greyscale difference for a pixel to count as changed, above JPEG re-encoding noise"
+ROW_THRESHOLD = 0.005
+"Minimum fraction of changed pixels for a row to count as changed"
+BAND_PADDING = 0.01
+"Fraction of the image height added above and below each changed band, so edited rows are cropped whole"
+HEADER_FRACTION = 0.1
+"Fraction of the image height at the top sent with every band"
+MAX_CHANGED_FRACTION = 0.35
+"Above this fraction of the image height, a full extraction is cheaper and safer"
+MAX_BANDS = 2
+"Above this many changed bands, the two extractions per band (old and new crop) cost more than one full extraction"
+
+Band = tuple[int, int]
+Extractor = Callable[[bytes], Bookings | None]
+
+
+def open_image(data: bytes) -> Image.Image | None:
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.convert("RGB")
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+def changed_bands(old: Image.Image, new: Image.Image) -> list[Band] | None:
+    """
+    The `(top, bottom)` pixel rows of the bands that differ between two images, padded and merged. `None` if the
+    images have different sizes, so rows cannot be compared.
+    """
+    if old.size != new.size:
+        return None
+    height = new.height
+    mask = ImageChops.difference(old.convert("L"), new.convert("L")).point(lambda v: 255 if v > PIXEL_THRESHOLD else 0)
+    row_means = mask.resize((1, height), Image.Resampling.BOX).tobytes()
+    changed = [row for row, mean in enumerate(row_means) if mean > ROW_THRESHOLD * 255]
+
+    padding = round(BAND_PADDING * height)
+    bands: list[Band] = []
+    for row in changed:
+        top, bottom = max(0, row - padding), min(height, row + 1 + padding)
+        if bands and top <= bands[-1][1]:
+            bands[-1] = (bands[-1][0], bottom)
+        else:
+            bands.append((top, bottom))
+    return bands
+
+
+def crop_with_header(image: Image.Image, band: Band) -> bytes:
+    """The header of `image` stacked above the rows in `band`, as PNG."""
+    width, height = image.size
+    header_bottom = min(round(HEADER_FRACTION * height), band[0])
+    crop = Image.new(image.mode, (width, header_bottom + band[1] - band[0]), "white")
+    crop.paste(image.crop((0, 0, width, header_bottom)), (0, 0))
+    crop.paste(image.crop((0, band[0], width, band[1])), (0, header_bottom))
+    out = io.BytesIO()
+    crop.save(out, "PNG")
+    return out.getvalue()
+
+
+def extract_changes(old_data: bytes, new_data: bytes, previous: Bookings, extract: Extractor) -> Bookings | None:
+    """
+    The bookings in the new image, extracting only the bands that changed since the old image.
+
+    Args:
+        old_data (bytes): The previous version of the image.
+        new_data (bytes): The new version of the image.
+        previous (Bookings): The bookings extracted from the previous version.
+        extract (Extractor): Extracts the bookings from a PNG crop.
+
+    Returns:
+        Bookings | None: The merged bookings, or `None` if a full extraction is needed.
+    """
+    old, new = open_image(old_data), open_image(new_data)
+    if old is None or new is None or (bands := changed_bands(old, new)) is None:
+        return None
+    changed_rows = sum(bottom - top for top, bottom in bands)
+    if changed_rows > MAX_CHANGED_FRACTION * new.height:
+        logger.info(f"{changed_rows} of {new.height} rows changed; extracting the whole image")
+        return None
+    if len(bands) > MAX_BANDS:
+        logger.info(f"{len(bands)} separate bands changed; extracting the whole image")
+        return None
+    if not bands:
+        logger.info("No rows changed; reusing the previous bookings")
+        return previous
+
+    previous_ids = {booking.booking_id for booking in previous.bookings}
+    removed: set[str] = set()
+    added: dict[str, Booking] = {}
+    for band in bands:
+        old_bookings, new_bookings = extract(crop_with_header(old, band)), extract(crop_with_header(new, band))
+        if old_bookings is None or new_bookings is None:
+            return None
+        if not old_bookings.bookings or len(old_bookings.bookings) != len(new_bookings.bookings):
+            logger.info(
+                f"Rows {band} hold {len(old_bookings.bookings)} bookings in the old image and"
+                f" {len(new_bookings.bookings)} in the new one; extracting the whole image"
+            )
+            return None
+        old_ids = {booking.booking_id for booking in old_bookings.bookings}
+        if not old_ids <= previous_ids:
+            logger.info(f"Rows {band} of the old image do not match its previous bookings; extracting the whole image")
+            return None
+        removed |= old_ids
+        added.update((booking.booking_id, booking) for booking in new_bookings.bookings)
+
+    logger.info(f"Re-extracted {len(bands)} changed band(s): {len(removed)} bookings replaced by {len(added)}")
+    kept = [booking for booking in previous.bookings if booking.booking_id not in removed]
+    kept_ids = {booking.booking_id for booking in kept}
+    return Bookings(bookings=kept + [booking for id_, booking in added.items() if id_ not in kept_ids])
+
+
+def find_previous_version(manifest: Manifest, id_: str) -> str | None:
+    """
+    The newest completed image from the same source as `id_`, i.e. the version it most likely replaces. Images from
+    the same CDN asset path are preferred, so with several schedules on one page (e.g. April and May) each is compared
+    with its own previous version.
+    """
+    entry = manifest.entries.get(id_)
+    if entry is None:
+        return None
+    candidates = [
+        (entry.url_path is not None and other.url_path == entry.url_path, other.created_at, other_id)
+        for other_id, other in manifest.entries.items()
+        if other_id != id_
+        and other.status == ProcessingStatus.COMPLETED
+        and other.phash is not None
+        and other.source == entry.source
+        and other.created_at is not None
+    ]
+    return max(candidates)[2] if candidates else None
+
+
+def extract_changed_regions(
+    client: "S3Client", bucket: str, manifest: Manifest, id_: str, extract: Extractor
+) -> Bookings | None:
+    """Load the previous version of `id_` and its bookings from S3 and run `extract_changes`, if there is one."""
+    if (previous_id := find_previous_version(manifest, id_)) is None:
+        return None
+    if (previous := load_result(client, bucket, previous_id)) is None:
+        return None
+    old_data = client.get_object(Bucket=bucket, Key=manifest.entries[previous_id].key)["Body"].read()
+    new_data = client.get_object(Bucket=bucket, Key=manifest.entries[id_].key)["Body"].read()
+    logger.info(f"Comparing content {id_} with its previous version {previous_id}")
+    return extract_changes(old_data, new_data, previous, extract)
@@ -1,9 +1,10 @@
+import datetime
 import hashlib
 import logging
 import mimetypes
 import os
+import time
 from dataclasses import dataclass
-from enum import StrEnum
 from typing import TYPE_CHECKING
 from urllib.parse import urlparse
 
@@ -13,20 +14,31 @@ import requests
 if TYPE_CHECKING:
     from types_boto3_s3.client import S3Client
 
-from src.extract.google_ import extract_bookings_from_url
-from src.gcal import push_bookings_to_calendar
-from src.increment import increment_bookings
-from src.scrape import URL, get_img_urls
+from src.bookings import Bookings
+from src.daterange import DateRange
+from src.deadline import Deadline, DurationEstimate
+from src.dedup import dhash, find_near_duplicate, load_result, save_result
+from src.extract.google_ import extract_bookings_from_bytes, extract_bookings_from_url
+from src.gcal import CALENDAR_ID
+from src.increment import bookings_min_max_dates
+from src.manifest import ManifestStore, ProcessingStatus
+from src.reconcile import MAX_WINDOW_DAYS, ReconciledRange, SourcedBookings, reconcile, reconcile_source
+from src.regions import extract_changed_regions
+from src.scrape import upload_datetime, upload_time
+from src.sources import Source, get_source, get_source_img_urls, get_sources
+from src.sync import CalendarMirror
+from src.usage import Usage, log_usage, track_usage
+from src.validate import validate_bookings
 
 logger = logging.getLogger(__name__)
 BUCKET = os.getenv("S3_BUCKET_NAME")
-MAX_DAYS = 30 * 4  # ~ 4 months
-PROCESSING_STATUS_TAG = "processing_status"
-
-
-class ProcessingStatus(StrEnum):
-    FAILED = "failed"
-    COMPLETED = "completed"
+INCREMENTAL_SYNC = os.getenv("INCREMENTAL_SYNC", "").lower() in ("1", "true")
+EXTRACT_ESTIMATE_S = 60.0
+"Initial estimate of the time to download, store and extract one image, until one has been timed"
+RECONCILE_RESERVE_S = 60.0
+"Time kept back for reconciling the calendars after extraction"
+IN_FLIGHT_STATUSES = (ProcessingStatus.PENDING, ProcessingStatus.QUEUED)
+"Statuses of images extracted by an earlier invocation but possibly not yet reconciled, whose saved result is reused"
 
 
 @dataclass(frozen=True)
@@ -62,35 +74,24 @@ def get_ext_content_type(url: str) -> tuple[str, str]:
     return ext, content_type
 
 
-def put_processing_status(client: "S3Client", key: str, status: ProcessingStatus) -> None:
-    bucket = get_bucket_name()
-    logger.info(f"Tagging s3://{bucket}/{key} with {PROCESSING_STATUS_TAG}={status.value}")
-    client.put_object_tagging(
-        Bucket=bucket,
-        Key=key,
-        Tagging={"TagSet": [{"Key": PROCESSING_STATUS_TAG, "Value": status.value}]},
-    )
-
-
-def get_processing_status(client: "S3Client", key: str) -> ProcessingStatus | None:
-    bucket = get_bucket_name()
-    response = client.get_object_tagging(Bucket=bucket, Key=key)
-    tags = {tag["Key"]: tag["Value"] for tag in response.get("TagSet", [])}
-    status = tags.get(PROCESSING_STATUS_TAG)
-    if status is None:
-        return None
-    return ProcessingStatus(status)
+def get_manifest_store() -> ManifestStore:
+    client: "S3Client" = boto3.client("s3")
+    store = ManifestStore(client, get_bucket_name())
+    store.load()
+    return store
 
 
-def get_content_store_s3(url: str) -> ContentStoreResult:
+def get_content_store_s3(url: str, store: ManifestStore | None = None, source: str | None = None) -> ContentStoreResult:
     bucket = get_bucket_name()
+    store = store or get_manifest_store()
 
-    client: "S3Client" = boto3.client("s3")
+    client = store.client
     content = requests.get(url).content
     id_ = hashlib.sha256(content).hexdigest()
     ext, content_type = get_ext_content_type(url)
     key = f"{id_}{ext}"
 
+    s3_url = f"https://{bucket}.s3.amazonaws.com/{key}"
     try:
         client.put_object(
             Bucket=bucket,
@@ -99,67 +100,320 @@ def get_content_store_s3(url: str) -> ContentStoreResult:
             ContentType=content_type,
             IfNoneMatch="*",
         )
+    except client.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "PreconditionFailed":
+            raise
+        logger.info("Object already exists in s3")
+        status = store.manifest.get_status(id_)
+        logger.info("Object status: %s", status)
+        entry = store.manifest.entries.get(id_)
+        if entry is not None and entry.uploaded_at is None and (uploaded_at := upload_datetime(url)):
+            store.update(id_, key, uploaded_at=uploaded_at)
         return ContentStoreResult(
             id_=id_,
             key=key,
-            s3_url=f"https://{bucket}.s3.amazonaws.com/{key}",
-            should_process=True,
-            processing_status=None,
+            s3_url=s3_url,
+            should_process=status not in (ProcessingStatus.COMPLETED, ProcessingStatus.ROLLED_BACK),
+            processing_status=status,
         )
-    except client.exceptions.ClientError as e:
-        if e.response.get("Error", {}).get("Code") == "PreconditionFailed":
-            logger.info("Object already exists in s3")
-            status = get_processing_status(client, key)
-            logger.info("Object status: %s", status)
-            return ContentStoreResult(
-                id_=id_,
-                key=key,
-                s3_url=f"https://{bucket}.s3.amazonaws.com/{key}",
-                should_process=status != ProcessingStatus.COMPLETED,
-                processing_status=status,
-            )
-        raise
+
+    store.update(
+        id_,
+        key,
+        status=ProcessingStatus.PENDING,
+        created_at=datetime.datetime.now(datetime.UTC),
+        uploaded_at=upload_datetime(url),
+        source=source,
+        phash=dhash(content),
+        url_path=urlparse(url).path,
+    )
+    return ContentStoreResult(
+        id_=id_,
+        key=key,
+        s3_url=s3_url,
+        should_process=True,
+        processing_status=None,
+    )
+
+
+def check_bookings(content_id: str, bookings: Bookings | None) -> Bookings:
+    if bookings is None or len(bookings.bookings) == 0:
+        raise ValueError(f"No bookings found for content {content_id}")
+
+    validated = validate_bookings(bookings)
+    for issue in validated.issues:
+        logger.warning(f"Content {content_id}: {issue}")
+    bookings = validated.bookings
+    if len(bookings.bookings) == 0:
+        raise ValueError(f"No valid bookings found for content {content_id}")
+
+    if bookings.range > MAX_WINDOW_DAYS:
+        logger.info(f"Bookings for content {content_id} span {bookings.range} days; reconciling in monthly windows")
+    return bookings
 
 
-def process_img_url(img_url: str) -> None:
+def reuse_near_duplicate(store: ManifestStore, id_: str) -> Bookings | None:
+    """The bookings of an earlier, completed image that `id_` is a re-render of (see `src/dedup.py`), if any."""
+    if (duplicate_id := find_near_duplicate(store.manifest, id_)) is None:
+        return None
+    if (bookings := load_result(store.client, store.bucket, duplicate_id)) is None:
+        return None
+    logger.info(f"Content {id_} is a near-duplicate of {duplicate_id}; reusing its {len(bookings.bookings)} bookings")
+    return bookings
+
+
+def extract_changed_bookings(store: ManifestStore, id_: str, source: Source) -> Bookings | None:
+    """
+    The bookings of `id_`, extracting only the regions that changed since the previous version from the same source
+    (see `src/regions.py`), or `None` if a full extraction is needed.
+    """
+    try:
+        return extract_changed_regions(
+            store.client,
+            store.bucket,
+            store.manifest,
+            id_,
+            lambda data: extract_bookings_from_bytes(data, "image/png", source.prompt.text),
+        )
+    except Exception:
+        logger.exception(f"Diff-aware extraction of content {id_} failed; extracting the whole image")
+        return None
+
+
+def extract_img_url(
+    img_url: str, store: ManifestStore, source: Source | None = None
+) -> tuple[ContentStoreResult, Bookings] | None:
+    """
+    Store the image at `img_url` and extract its bookings with the prompt of `source` (the default source if not
+    set), unless it has already been processed.
+    """
     logger.info("Processing image URL: %s", img_url)
-    result = get_content_store_s3(img_url)
+    source = source or get_source(None)
+    result = get_content_store_s3(img_url, store, source.name)
     if not result.should_process:
         logger.info(f"Content already processed with ID: {result.id_}; skipping")
-        return
+        return None
+
+    return result, extract_content(store, result, img_url, source)
+
 
+def usage_fields(store: ManifestStore, id_: str, usage: Usage) -> dict[str, Usage]:
+    """The manifest field adding `usage` to the usage of earlier extractions of `id_`, if any LLM call was made."""
+    if not usage.calls:
+        return {}
+    entry = store.manifest.entries.get(id_)
+    return {"usage": entry.usage + usage if entry and entry.usage else usage}
+
+
+def extract_content(store: ManifestStore, result: ContentStoreResult, img_url: str, source: Source) -> Bookings:
+    """
+    Extract the bookings of a stored image, reusing a saved or near-duplicate result or the unchanged regions of its
+    previous version where possible, and save them. A saved result is only reused while the image is in flight
+    (extracted by an earlier invocation but not yet reconciled); otherwise, e.g. after an undo, it is re-extracted.
+
+    The manifest entry is marked FAILED and the exception re-raised if extraction fails or yields unusable bookings.
+    The LLM usage of the extraction is added to the entry either way.
+    """
     logger.info(
         f"Processing content with ID: {result.id_} at URL: {result.s3_url}"
         f" (status={result.processing_status or 'unset'})"
     )
+    with track_usage() as tracker:
+        try:
+            bookings = (
+                (
+                    load_result(store.client, store.bucket, result.id_)
+                    if result.processing_status in IN_FLIGHT_STATUSES
+                    else None
+                )
+                or reuse_near_duplicate(store, result.id_)
+                or extract_changed_bookings(store, result.id_, source)
+                or extract_bookings_from_url(img_url, source.prompt.text)
+            )
+            bookings = check_bookings(result.id_, bookings)
+        except Exception:
+            store.update(
+                result.id_,
+                result.key,
+                status=ProcessingStatus.FAILED,
+                **usage_fields(store, result.id_, tracker.usage),
+            )
+            raise
+    save_result(store.client, store.bucket, result.id_, bookings)
+    if fields := usage_fields(store, result.id_, tracker.usage):
+        store.update(result.id_, result.key, **fields)
+    return bookings
+
+
+def get_calendar_mirror(store: ManifestStore, calendar_id: str = CALENDAR_ID) -> CalendarMirror | None:
+    """
+    In incremental sync mode, the S3 mirror of `calendar_id` brought up to date, to read existing events from;
+    otherwise `None`, i.e. list live from the calendar.
+    """
+    if not INCREMENTAL_SYNC:
+        return None
+    mirror = CalendarMirror(store.client, store.bucket, calendar_id)
+    mirror.load()
+    mirror.sync()
+    mirror.save()
+    return mirror
+
+
+def get_reconciled_ranges(store: ManifestStore, calendar_id: str, exclude: set[str]) -> list[ReconciledRange]:
+    """The date ranges of the completed images reconciled into `calendar_id`, other than those in `exclude`."""
+    ranges = []
+    for id_, entry in store.manifest.entries.items():
+        if (
+            id_ not in exclude
+            and entry.status == ProcessingStatus.COMPLETED
+            and entry.from_date is not None
+            and entry.to_date is not None
+            and entry.published_at is not None
+            and get_source(entry.source).calendar_id == calendar_id
+        ):
+            ranges.append(ReconciledRange(DateRange.inclusive(entry.from_date, entry.to_date), entry.published_at))
+    return ranges
+
+
+def reconcile_contents(
+    store: ManifestStore,
+    extracted: list[tuple[ContentStoreResult, Bookings]],
+    scoped: bool = False,
+    calendar_id: str = CALENDAR_ID,
+) -> None:
+    """
+    Reconcile the calendar `calendar_id` with the bookings extracted from several stored images in one pass and
+    record the outcome of each in the manifest.
+
+    Where images overlap, the most recently published image wins (see `ManifestEntry.published_at`), including
+    completed images reconciled earlier: dates they own are left alone, however the images arrive (e.g. from a
+    backfill or in any order from the work queue). If `scoped`, each image instead only replaces the
+    events it created itself (see `reconcile_source`). If the calendar update fails, every image is marked FAILED
+    and the exception re-raised.
+    """
+    if not extracted:
+        return
+
+    extracted_at = datetime.datetime.now(datetime.UTC)
+    sources = []
+    for result, bookings in extracted:
+        entry = store.manifest.entries.get(result.id_)
+        published_at = entry.published_at if entry and entry.published_at else extracted_at
+        labels = get_source(entry.source if entry else None).labels
+        sources.append(SourcedBookings(result.id_, result.s3_url, bookings, published_at, labels))
+
     try:
-        bookings = extract_bookings_from_url(img_url)
-        if bookings is None or len(bookings.bookings) == 0:
-            raise ValueError(f"No bookings found for url {img_url}")
+        mirror = get_calendar_mirror(store, calendar_id)
+        if scoped:
+            source_lister = mirror.events_for_source if mirror else None
+            created_ids = {source.source_id: reconcile_source(source, calendar_id, source_lister) for source in sources}
+        else:
+            created_ids = reconcile(
+                sources,
+                lister=mirror.list_events if mirror else None,
+                calendar_id=calendar_id,
+                reconciled=get_reconciled_ranges(store, calendar_id, {source.source_id for source in sources}),
+            )
+    except Exception:
+        for result, _ in extracted:
+            store.update(result.id_, result.key, status=ProcessingStatus.FAILED)
+        raise
 
-        if bookings.range > MAX_DAYS:
-            raise ValueError(f"Bookings range too large: {bookings.range} days, max is {MAX_DAYS}")
+    for result, bookings in extracted:
+        from_to = bookings_min_max_dates(bookings)
+        store.update(
+            result.id_,
+            result.key,
+            status=ProcessingStatus.COMPLETED,
+            extracted_at=extracted_at,
+            booking_count=len(bookings.bookings),
+            from_date=from_to[0] if from_to else None,
+            to_date=from_to[1] if from_to else None,
+            event_ids=created_ids.get(result.id_, []),
+        )
 
-        incremented = increment_bookings(bookings)
-        push_bookings_to_calendar(incremented, result.id_, result.s3_url)
+
+def reconcile_content(
+    store: ManifestStore,
+    result: ContentStoreResult,
+    bookings: Bookings | None,
+    scoped: bool = False,
+    calendar_id: str = CALENDAR_ID,
+) -> None:
+    """
+    Reconcile the calendar with the bookings extracted from a single stored image and record the outcome in the
+    manifest, marking it FAILED and re-raising if the bookings are unusable or the calendar update fails.
+    """
+    try:
+        bookings = check_bookings(result.id_, bookings)
     except Exception:
-        client: "S3Client" = boto3.client("s3")
-        put_processing_status(client, result.key, ProcessingStatus.FAILED)
+        store.update(result.id_, result.key, status=ProcessingStatus.FAILED)
         raise
+    save_result(store.client, store.bucket, result.id_, bookings)
+    reconcile_contents(store, [(result, bookings)], scoped, calendar_id)
+
 
-    client = boto3.client("s3")
-    put_processing_status(client, result.key, ProcessingStatus.COMPLETED)
+def process_img_url(img_url: str, store: ManifestStore | None = None, source: Source | None = None) -> None:
+    store = store or get_manifest_store()
+    source = source or get_source(None)
+    if extracted := extract_img_url(img_url, store, source):
+        reconcile_contents(store, [extracted], calendar_id=source.get_calendar_id())
 
 
-def run():
+def run(deadline: Deadline | None = None):
+    """
+    Extract and reconcile every new image, newest upload first.
+
+    With a `deadline` (e.g. the Lambda's remaining time), an image is only started if it can be extracted with
+    `RECONCILE_RESERVE_S` to spare; later images are left for the next invocation. Each extraction is saved as soon
+    as it finishes and its entry stays PENDING until reconciled, so the next invocation reuses it.
+    """
     logger.info("Starting run function")
-    img_urls = get_img_urls(URL)
-    logger.info(f"Retrieved {len(img_urls)} image URLs")
+    deadline = deadline or Deadline()
+    sources = get_sources()
+    img_urls = get_source_img_urls(sources)
+    logger.info(f"Retrieved {len(img_urls)} image URLs from {len(sources)} sources")
     if not img_urls:
         raise ValueError("Expected at least 1 image URL, found 0")
-
-    for img_url in img_urls:
-        process_img_url(img_url)
+    img_urls.sort(key=lambda source_url: upload_time(source_url[1]), reverse=True)
+
+    store = get_manifest_store()
+    extracted: dict[str, list[tuple[ContentStoreResult, Bookings]]] = {}
+    errors: list[Exception] = []
+    usage_by_source: dict[str, Usage] = {}
+    estimate = DurationEstimate(EXTRACT_ESTIMATE_S)
+    for i, (source, img_url) in enumerate(img_urls):
+        if not deadline.has_time_for(estimate.seconds + RECONCILE_RESERVE_S):
+            logger.warning(
+                f"{deadline.remaining():.0f}s left; leaving {len(img_urls) - i} images for the next invocation"
+            )
+            break
+        started = time.monotonic()
+        with track_usage() as tracker:
+            try:
+                if result := extract_img_url(img_url, store, source):
+                    extracted.setdefault(source.get_calendar_id(), []).append(result)
+                    estimate.observe(time.monotonic() - started)
+            except Exception as e:
+                logger.exception(f"Failed to extract {source.name} bookings from {img_url}")
+                errors.append(e)
+        usage_by_source[source.name] = usage_by_source.get(source.name, Usage()) + tracker.usage
+
+    if extracted and not deadline.has_time_for(RECONCILE_RESERVE_S):
+        logger.warning(f"{deadline.remaining():.0f}s left; leaving extracted images PENDING for the next invocation")
+        extracted = {}
+    for calendar_id, calendar_extracted in extracted.items():
+        try:
+            reconcile_contents(store, calendar_extracted, calendar_id=calendar_id)
+        except Exception as e:
+            logger.exception(f"Failed to reconcile calendar {calendar_id}")
+            errors.append(e)
+
+    for name, usage in usage_by_source.items():
+        log_usage("source", usage, source=name)
+    log_usage("run", sum(usage_by_source.values(), Usage()))
+    if errors:
+        raise errors[0]
 
 
 if __name__ == "__main__":
@@ -1,22 +1,95 @@
+import datetime
+import re
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
 import requests
-from bs4 import BeautifulSoup, Tag
 
 URL = "https://bluebird-carrot-kkzr.squarespace.com/battersea-park-millennium-arena-gym"
+LAZY_SRC_ATTRS = ("data-src", "data-image")
+"Attributes Squarespace puts the original image URL in when lazy-loading, leaving `src` as a placeholder"
+SIZE_PARAMS = frozenset({"format"})
+"Query parameters selecting a resized copy of a Squarespace image; without them the CDN serves the original"
+UPLOAD_TIME = re.compile(r"/(\d{13})-[^/]*/")
+"Squarespace CDN paths put each upload in a folder named after its upload time (ms since the epoch)"
 
 
 def is_booking_url(url: str) -> bool:
     return all(kw in url.lower() for kw in ["athletics", "track", "bookings"])
 
 
-def get_img_urls(page_url: str):
+def parse_srcset(srcset: str) -> list[tuple[str, float]]:
+    """The `(url, width)` candidates in a `srcset`, treating density (`2x`) descriptors as widths of 0."""
+    candidates = []
+    for candidate in srcset.split(","):
+        url, _, descriptor = candidate.strip().partition(" ")
+        descriptor = descriptor.strip()
+        width = float(descriptor[:-1]) if descriptor.endswith("w") and descriptor[:-1].isdigit() else 0.0
+        if url:
+            candidates.append((url, width))
+    return candidates
+
+
+def upload_time(url: str) -> int:
+    """The upload time of a Squarespace image in ms since the epoch, or 0 if the URL does not include it."""
+    return int(match.group(1)) if (match := UPLOAD_TIME.search(url)) else 0
+
+
+def upload_datetime(url: str) -> datetime.datetime | None:
+    """The upload time of a Squarespace image, or `None` if the URL does not include it."""
+    ms = upload_time(url)
+    return datetime.datetime.fromtimestamp(ms / 1000, datetime.UTC) if ms else None
+
+
+def normalise_url(url: str, base_url: str) -> str:
+    """Resolve `url` against the page, dropping the fragment and any resize parameters."""
+    parts = urlsplit(urljoin(base_url, url.strip()))
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in SIZE_PARAMS])
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+
+def best_img_url(attrs: dict[str, str | None]) -> str | None:
+    """
+    The URL of the highest resolution version of an `<img>`: a lazy-loading original if there is one, then the
+    widest `srcset` candidate, then `src`. Inline `data:` placeholders are ignored.
+    """
+    candidates = [attrs.get(name) for name in LAZY_SRC_ATTRS]
+    if srcset := attrs.get("srcset"):
+        candidates.extend(url for url, _ in sorted(parse_srcset(srcset), key=lambda c: c[1], reverse=True)[:1])
+    candidates.append(attrs.get("src"))
+    return next((url for url in candidates if url and not url.startswith("data:")), None)
+
+
+class ImgScanner(HTMLParser):
+    """
+    Collects the URL of every `<img>` as the page streams through the parser, without building a document tree.
+    URLs are normalised and deduplicated in page order.
+    """
+
+    def __init__(self, base_url: str):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.urls: dict[str, None] = {}
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag == "img" and (url := best_img_url(dict(attrs))):
+            self.urls.setdefault(normalise_url(url, self.base_url), None)
+
+
+def scan_img_urls(html: str, base_url: str) -> list[str]:
+    scanner = ImgScanner(base_url)
+    scanner.feed(html)
+    scanner.close()
+    return list(scanner.urls)
+
+
+def get_page_img_urls(page_url: str) -> list[str]:
     resp = requests.get(page_url)
-    soup = BeautifulSoup(resp.text, "html.parser")
-    img_tags = soup.find_all("img")
-    urls = []
-    for img_tag in img_tags:
-        if isinstance(img_tag, Tag) and (url := img_tag.get("src")) and isinstance(url, str) and is_booking_url(url):
-            urls.append(url)
-    return urls
+    return scan_img_urls(resp.text, page_url)
+
+
+def get_img_urls(page_url: str) -> list[str]:
+    return [url for url in get_page_img_urls(page_url) if is_booking_url(url)]
 
 
 if __name__ == "__main__":
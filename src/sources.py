@@ -0,0 +1,90 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from src.extract.prompts import Prompt, get_prompt
+from src.gcal import CALENDAR_ID, TRACK_LABELS, EventLabels
+from src.scrape import URL, get_page_img_urls
+
+logger = logging.getLogger(__name__)
+MAX_PAGE_WORKERS = 4
+
+
+@dataclass(frozen=True)
+class Source:
+    """A kind of schedule published on the venue's website, and the calendar its bookings are kept in."""
+
+    name: str
+    url: str
+    "The page the schedule images are published on"
+    keywords: tuple[str, ...]
+    "Words that must all appear in an image URL (case-insensitively) for the image to belong to this source"
+    prompt: Prompt
+    "The prompt version extracted with in production"
+    calendar_id: str | None
+    "The calendar to reconcile with; the source is disabled if unset"
+    labels: EventLabels = TRACK_LABELS
+    "How the source's bookings are labelled in the calendar"
+
+    def matches(self, img_url: str) -> bool:
+        return all(kw in img_url.lower() for kw in self.keywords)
+
+    def get_calendar_id(self) -> str:
+        if not self.calendar_id:
+            raise ValueError(f"No calendar configured for source {self.name!r}")
+        return self.calendar_id
+
+
+ATHLETICS_TRACK = Source(
+    name="athletics-track",
+    url=URL,
+    keywords=("athletics", "track", "bookings"),
+    prompt=get_prompt("athletics-track", 1),
+    calendar_id=CALENDAR_ID,
+)
+SOURCES = (
+    ATHLETICS_TRACK,
+    Source(
+        name="tennis",
+        url=URL,
+        keywords=("tennis",),
+        prompt=get_prompt("tennis", 1),
+        calendar_id=os.getenv("TENNIS_CALENDAR_ID"),
+        labels=EventLabels(heading="BPMA Tennis Booking", title="BPMA Tennis courts booked"),
+    ),
+)
+
+
+def get_sources() -> list[Source]:
+    """The sources with a calendar configured."""
+    return [source for source in SOURCES if source.calendar_id]
+
+
+def get_source(name: str | None) -> Source:
+    """The source called `name`, or the athletics track (the original, and only, source) if `name` is `None`."""
+    if name is None:
+        return ATHLETICS_TRACK
+    for source in SOURCES:
+        if source.name == name:
+            return source
+    raise ValueError(f"Unknown source {name!r}")
+
+
+def get_source_img_urls(sources: list[Source]) -> list[tuple[Source, str]]:
+    """
+    Fetch every distinct page used by `sources` concurrently and match the images on each page to its sources.
+
+    Returns:
+        list[tuple[Source, str]]: Each matched image URL with its source, in source then page order.
+    """
+    page_urls = list(dict.fromkeys(source.url for source in sources))
+    with ThreadPoolExecutor(max_workers=min(MAX_PAGE_WORKERS, len(page_urls) or 1)) as executor:
+        pages = dict(zip(page_urls, executor.map(get_page_img_urls, page_urls)))
+
+    img_urls = []
+    for source in sources:
+        matched = [url for url in pages[source.url] if source.matches(url)]
+        logger.info(f"Source {source.name}: {len(matched)} of {len(pages[source.url])} images on {source.url} match")
+        img_urls.extend((source, url) for url in matched)
+    return img_urls
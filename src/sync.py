@@ -0,0 +1,111 @@
+import logging
+from collections import Counter
+from typing import TYPE_CHECKING, Any, cast
+
+from pydantic import BaseModel, Field
+
+if TYPE_CHECKING:
+    from googleapiclient._apis.calendar.v3 import Event
+    from types_boto3_s3.client import S3Client
+
+from src.daterange import DateRange
+from src.gcal import CALENDAR_ID, SyncTokenExpired, get_event_date, sync_events
+
+logger = logging.getLogger(__name__)
+SYNC_STATE_KEY = "state/calendar-sync.json"
+"Sync state of the default calendar; other calendars use `state/calendar-sync/{calendar_id}.json`"
+MIRRORED_FIELDS = ("id", "status", "summary", "start", "end", "extendedProperties")
+"The event fields kept in the mirror: enough to diff against bookings, without the HTML descriptions"
+
+
+def get_sync_state_key(calendar_id: str = CALENDAR_ID) -> str:
+    return SYNC_STATE_KEY if calendar_id == CALENDAR_ID else f"state/calendar-sync/{calendar_id}.json"
+
+
+class SyncState(BaseModel):
+    sync_token: str | None = None
+    events: dict[str, dict[str, Any]] = Field(default_factory=dict)
+
+
+class CalendarMirror:
+    """
+    A copy of the calendar's events stored in S3 and kept current with incremental (`syncToken`) syncs, so each
+    run only fetches the events changed since the last one instead of listing whole date ranges. It is the only
+    local view of a calendar: the app's own writes reach it through the next sync, like anyone else's, and questions
+    like "which events did this image create?" are answered from it without listing the calendar.
+    """
+
+    def __init__(self, client: "S3Client", bucket: str, calendar_id: str = CALENDAR_ID):
+        self.client = client
+        self.bucket = bucket
+        self.calendar_id = calendar_id
+        self.key = get_sync_state_key(calendar_id)
+        self.state = SyncState()
+
+    def load(self) -> None:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key)
+        except self.client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "NoSuchKey":
+                raise
+            logger.info(f"No calendar sync state at s3://{self.bucket}/{self.key}; a full sync is needed")
+            self.state = SyncState()
+            return
+        self.state = SyncState.model_validate_json(response["Body"].read())
+
+    def save(self) -> None:
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=self.state.model_dump_json(exclude_none=True).encode(),
+            ContentType="application/json",
+        )
+
+    def sync(self) -> int:
+        """
+        Apply the changes since the last sync, falling back to a full resync if the sync token has expired.
+
+        Returns:
+            int: The number of changed events fetched.
+        """
+        try:
+            changes, sync_token = sync_events(self.state.sync_token, self.calendar_id)
+        except SyncTokenExpired:
+            logger.warning("Calendar sync token expired; resyncing from scratch")
+            self.state = SyncState()
+            changes, sync_token = sync_events(None, self.calendar_id)
+
+        self.apply(changes)
+        self.state.sync_token = sync_token
+        return len(changes)
+
+    def apply(self, changes: list["Event"]) -> None:
+        for event in changes:
+            if (event_id := event.get("id")) is None:
+                continue
+            if event.get("status") == "cancelled":
+                self.state.events.pop(event_id, None)
+            else:
+                self.state.events[event_id] = {k: v for k, v in event.items() if k in MIRRORED_FIELDS}
+
+    def list_events(self, date_range: DateRange) -> list["Event"]:
+        """The mirrored events starting on a date in `date_range`; a drop-in for `gcal.list_events`."""
+        return [event for event in self.events() if get_event_date(event) in date_range]
+
+    def events(self) -> list["Event"]:
+        return [cast("Event", event) for event in self.state.events.values()]
+
+    def events_for_source(self, source_id: str) -> list["Event"]:
+        return [event for event in self.events() if get_private_property(event, "source_id") == source_id]
+
+    def events_for_booking(self, booking_id: str) -> list["Event"]:
+        return [event for event in self.events() if get_private_property(event, "booking_id") == booking_id]
+
+    def duplicate_booking_ids(self) -> list[str]:
+        """Booking IDs with more than one event, i.e. stale events left behind by an interrupted run."""
+        counts = Counter(get_private_property(event, "booking_id") for event in self.events())
+        return sorted(booking_id for booking_id, count in counts.items() if booking_id is not None and count > 1)
+
+
+def get_private_property(event: "Event", name: str) -> str | None:
+    return event.get("extendedProperties", {}).get("private", {}).get(name)
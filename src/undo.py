@@ -0,0 +1,76 @@
+"""
+Undo a bad extraction: delete the calendar events created from a stored image and its saved bookings, and reset
+its processing status.
+
+The events to delete are those still tagged with the image's `source_id`, including unchanged events carried over
+from an earlier extraction; in incremental sync mode they are read from the calendar mirror (see `src.sync`). The
+event IDs recorded in the manifest are not deleted as such: event IDs are derived from the booking, so another image
+may have taken an event over since (e.g. a scoped reconcile), retagging it as its own.
+"""
+
+import argparse
+import logging
+from dataclasses import dataclass
+
+from src.dedup import delete_result
+from src.gcal import delete_events, list_source_events
+from src.manifest import ManifestStore, ProcessingStatus
+from src.run import get_calendar_mirror, get_manifest_store
+from src.sources import get_source
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class UndoResult:
+    id_: str
+    deleted: int
+    status: ProcessingStatus | None
+
+
+def undo(id_: str, store: ManifestStore | None = None, reprocess: bool = False) -> UndoResult:
+    """
+    Delete the events created from the image with content hash `id_` in batches, and its saved bookings so they are
+    not reused (see `src.run.extract_content`), and reset its manifest entry.
+
+    Args:
+        id_ (str): The content hash of the image.
+        store (ManifestStore | None): The loaded manifest; loaded from S3 if not set.
+        reprocess (bool): Clear the status so the next run re-extracts the image, instead of marking it ROLLED_BACK
+            (which the scheduled run skips, leaving it for a backfill with `--status rolled_back`).
+
+    Returns:
+        UndoResult: The number of events deleted and the new status.
+    """
+    store = store or get_manifest_store()
+    entry = store.manifest.entries.get(id_)
+    if entry is None:
+        raise ValueError(f"No manifest entry for content {id_}")
+
+    calendar_id = get_source(entry.source).get_calendar_id()
+    mirror = get_calendar_mirror(store, calendar_id)
+    events = mirror.events_for_source(id_) if mirror else list_source_events(id_, calendar_id)
+    event_ids = [event_id for event in events if (event_id := event.get("id"))]
+    logger.info(f"Undoing content {id_}: deleting {len(event_ids)} events")
+    delete_events(event_ids, lambda done, total: logger.info(f"Deleted {done}/{total} events"), calendar_id)
+
+    delete_result(store.client, store.bucket, id_)
+    status = None if reprocess else ProcessingStatus.ROLLED_BACK
+    store.update(id_, entry.key, status=status, event_ids=[])
+    return UndoResult(id_=id_, deleted=len(event_ids), status=status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("ids", nargs="+", help="Content hashes of the images to undo")
+    parser.add_argument("--reprocess", action="store_true", help="Let the next run re-extract the images")
+    args = parser.parse_args()
+
+    store = get_manifest_store()
+    for id_ in args.ids:
+        undo(id_, store, args.reprocess)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,102 @@
+"""
+Token and cost accounting for LLM calls.
+
+Each call's usage is passed to `record_usage`, which adds it to every `track_usage` block open in the current context,
+e.g. the extraction of one image (kept in its manifest entry) and the whole run (logged at the end). Replayed calls
+(see `src/extract/replay.py`) report the usage recorded with them.
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+from collections.abc import Iterator
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+PRICES_PER_MILLION_TOKENS: dict[str, tuple[float, float, float]] = {
+    "gemini-3-flash-preview": (0.50, 0.05, 3.00),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+"USD per million input, cached input and output tokens of each model; output includes thinking tokens"
+BATCH_PRICE_FACTOR = 0.5
+"Fraction of the interactive price charged for requests in a batch job"
+
+
+class Usage(BaseModel):
+    calls: int = 0
+    failed_calls: int = 0
+    "Calls that raised, e.g. rate limited or timed out; a later successful call for the same image is a retry"
+    input_tokens: int = 0
+    output_tokens: int = 0
+    image_tokens: int = 0
+    "The part of `input_tokens` spent on images and PDF pages"
+    cached_tokens: int = 0
+    "The part of `input_tokens` read from a context cache, at the cached input price"
+    latency_s: float = 0.0
+    cost_usd: float = 0.0
+
+    def __add__(self, other: "Usage") -> "Usage":
+        return Usage(**{name: getattr(self, name) + getattr(other, name) for name in Usage.model_fields})
+
+
+def call_usage(
+    model: str,
+    latency_s: float,
+    input_tokens: int = 0,
+    output_tokens: int = 0,
+    image_tokens: int = 0,
+    cached_tokens: int = 0,
+    failed: bool = False,
+    batch: bool = False,
+) -> Usage:
+    """
+    The usage of a single call to `model`, priced with `PRICES_PER_MILLION_TOKENS` (free if not listed), or at
+    `BATCH_PRICE_FACTOR` of that for a request in a batch job.
+    """
+    input_price, cached_price, output_price = PRICES_PER_MILLION_TOKENS.get(model, (0.0, 0.0, 0.0))
+    return Usage(
+        calls=1,
+        failed_calls=int(failed),
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        image_tokens=image_tokens,
+        cached_tokens=cached_tokens,
+        latency_s=latency_s,
+        cost_usd=(
+            (input_tokens - cached_tokens) * input_price + cached_tokens * cached_price + output_tokens * output_price
+        )
+        / 1_000_000
+        * (BATCH_PRICE_FACTOR if batch else 1),
+    )
+
+
+class UsageTracker:
+    def __init__(self):
+        self.usage = Usage()
+
+
+_trackers: contextvars.ContextVar[tuple[UsageTracker, ...]] = contextvars.ContextVar("usage_trackers", default=())
+
+
+@contextlib.contextmanager
+def track_usage() -> Iterator[UsageTracker]:
+    """Collect the usage recorded in the block, including in nested blocks."""
+    tracker = UsageTracker()
+    token = _trackers.set((*_trackers.get(), tracker))
+    try:
+        yield tracker
+    finally:
+        _trackers.reset(token)
+
+
+def record_usage(usage: Usage, model: str) -> None:
+    logger.info(f"LLM call: {json.dumps({'model': model, **usage.model_dump()})}")
+    for tracker in _trackers.get():
+        tracker.usage += usage
+
+
+def log_usage(scope: str, usage: Usage, **labels: str) -> None:
+    """Log `usage` as a single JSON object, e.g. to filter or chart with CloudWatch Logs Insights."""
+    logger.info(f"LLM usage for {scope}: {json.dumps({'scope': scope, **labels, **usage.model_dump()})}")
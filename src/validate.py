@@ -0,0 +1,166 @@
+import datetime
+import logging
+import statistics
+from dataclasses import dataclass, field
+
+from src.bookings import BookingRecord, Bookings, from_records, to_records
+
+logger = logging.getLogger(__name__)
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+WEEKDAY_INDEX = {day: i for i, day in enumerate(WEEKDAYS)}
+NO_VALUE = -1
+MIDNIGHT = 0
+"An end time of 00:00 is the end of the day, not a time before the start"
+MIN_OUTLIER_DAYS = 30 * 4  # ~ 4 months
+"Distance from the median date within which a booking is never an outlier, however tightly the others cluster"
+OUTLIER_SPREAD_FACTOR = 4
+"Bookings further from the median date than this many times the median distance to it are outliers"
+
+
+@dataclass
+class ValidationResult:
+    bookings: Bookings
+    issues: list[str] = field(default_factory=list)
+    year_shift: int = 0
+    "Number of years added to every booking date"
+
+
+@dataclass
+class Columns:
+    """The fields of a batch of bookings that validation works on, one list per field."""
+
+    ordinals: list[int]
+    weekdays: list[int]
+    "The weekday the model labelled each booking with, `NO_VALUE` if unlabelled"
+    starts: list[int]
+    ends: list[int]
+    "Minutes since midnight, `NO_VALUE` for bookings with a free-text time; an end of 0 is midnight"
+
+    @classmethod
+    def from_records(cls, records: list[BookingRecord]) -> "Columns":
+        return cls(
+            ordinals=[r.date.toordinal() for r in records],
+            weekdays=[WEEKDAY_INDEX.get(r.day, NO_VALUE) if r.day else NO_VALUE for r in records],
+            starts=[NO_VALUE if r.start is None else r.start for r in records],
+            ends=[NO_VALUE if r.end is None else r.end for r in records],
+        )
+
+
+def shift_year(date: datetime.date, years: int) -> datetime.date | None:
+    try:
+        return date.replace(year=date.year + years)
+    except ValueError:  # 29 February
+        return None
+
+
+def count_weekday_matches(records: list[BookingRecord], columns: Columns, years: int) -> int:
+    matches = 0
+    for record, weekday in zip(records, columns.weekdays):
+        if weekday != NO_VALUE and (shifted := shift_year(record.date, years)) and shifted.weekday() == weekday:
+            matches += 1
+    return matches
+
+
+def infer_year_shift(records: list[BookingRecord], columns: Columns) -> int:
+    """
+    The shift (-1, 0 or +1 years) that makes the most dates agree with their weekday labels.
+
+    Models often get the weekday right but the year wrong, so a shift is only applied if it makes a majority of the
+    labelled bookings consistent and beats leaving the dates alone.
+    """
+    labelled = sum(1 for weekday in columns.weekdays if weekday != NO_VALUE)
+    if not labelled:
+        return 0
+    matches = {years: count_weekday_matches(records, columns, years) for years in (0, -1, 1)}
+    best = max(matches, key=lambda years: matches[years])
+    if best != 0 and matches[best] > matches[0] and matches[best] * 2 > labelled:
+        return best
+    return 0
+
+
+def outlier_days(ordinals: list[int], min_days: int = MIN_OUTLIER_DAYS) -> int:
+    """
+    The distance from the median date beyond which a booking is an outlier: `OUTLIER_SPREAD_FACTOR` times the median
+    distance, so a season-long schedule keeps its first and last months while a date in the wrong year (e.g. among a
+    few weeks of bookings) still stands out, but at least `min_days`.
+    """
+    median = statistics.median_low(ordinals)
+    spread = statistics.median_low(abs(ordinal - median) for ordinal in ordinals)
+    return max(min_days, OUTLIER_SPREAD_FACTOR * spread)
+
+
+def validate_bookings(bookings: Bookings, min_outlier_days: int = MIN_OUTLIER_DAYS) -> ValidationResult:
+    """
+    Check and normalise a batch of extracted bookings before they reach the calendar.
+
+    - Infers the most likely year from the weekday labels and shifts every date accordingly.
+    - Moves individual bookings whose label only matches the neighbouring year (e.g. a schedule spanning new year),
+      if that brings them closer to the rest of the batch; other mismatched labels are corrected from the date.
+    - Swaps start and end times given in the wrong order (an end of 00:00 is midnight, e.g. 18:00-00:00) and drops
+      bookings with an empty time range.
+    - Drops outlier dates, too far from the median date given the spread of the others (see `outlier_days`), and
+      exact duplicates.
+
+    Returns:
+        ValidationResult: The normalised bookings and a description of each change made.
+    """
+    records = to_records(bookings)
+    result = ValidationResult(bookings=bookings)
+    if not records:
+        return result
+
+    columns = Columns.from_records(records)
+    result.year_shift = infer_year_shift(records, columns)
+    if result.year_shift:
+        result.issues.append(f"Shifted all dates by {result.year_shift:+d} year(s) to match weekday labels")
+
+    median = statistics.median_low(columns.ordinals) + round(result.year_shift * 365.25)
+    max_days = outlier_days(columns.ordinals, min_outlier_days)
+    keep: list[BookingRecord] = []
+    seen: set[BookingRecord] = set()
+    for record, weekday, start, end in zip(records, columns.weekdays, columns.starts, columns.ends):
+        date = shift_year(record.date, result.year_shift)
+        if date is None:
+            result.issues.append(f"Dropped {record.date}: does not exist in the inferred year")
+            continue
+
+        if weekday != NO_VALUE and date.weekday() != weekday:
+            for years in (-1, 1):
+                candidate = shift_year(date, years)
+                if (
+                    candidate
+                    and candidate.weekday() == weekday
+                    and abs(candidate.toordinal() - median) < abs(date.toordinal() - median)
+                ):
+                    result.issues.append(f"Moved {date} to {candidate} to match its {WEEKDAYS[weekday]} label")
+                    date = candidate
+                    break
+            else:
+                result.issues.append(f"Relabelled {date} from {WEEKDAYS[weekday]} to {WEEKDAYS[date.weekday()]}")
+
+        if start != NO_VALUE and start > end and end != MIDNIGHT:
+            result.issues.append(f"Swapped start and end times on {date}")
+            start, end = end, start
+        elif start != NO_VALUE and start == end:
+            result.issues.append(f"Dropped booking on {date} with an empty time range")
+            continue
+
+        if abs(date.toordinal() - median) > max_days:
+            result.issues.append(f"Dropped outlier date {date}, more than {max_days} days from the other bookings")
+            continue
+
+        normalised = record._replace(
+            date=date,
+            day=WEEKDAYS[date.weekday()] if record.day else None,
+            start=None if start == NO_VALUE else start,
+            end=None if end == NO_VALUE else end,
+        )
+        if normalised in seen:
+            result.issues.append(f"Dropped duplicate booking on {date}")
+            continue
+        seen.add(normalised)
+        keep.append(normalised)
+
+    if result.issues:
+        result.bookings = from_records(keep)
+    return result
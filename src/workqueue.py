@@ -0,0 +1,320 @@
+"""
+Fan out image processing through a queue, one work item per new image.
+
+`enqueue` scrapes every source, stores each new image and sends one message per content hash; consumers (the
+Lambda's SQS event source mapping, or `consume` locally) each extract and reconcile one image, so throughput scales
+with the number of concurrent consumers. A message is only deleted once its image is reconciled: if processing
+fails it becomes visible again after the visibility timeout and is retried, until the queue's redrive policy moves
+it to a dead-letter queue.
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import boto3
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from types_boto3_sqs.client import SQSClient
+
+from src.deadline import Deadline
+from src.manifest import ManifestStore, ProcessingStatus
+from src.run import (
+    EXTRACT_ESTIMATE_S,
+    RECONCILE_RESERVE_S,
+    ContentStoreResult,
+    extract_content,
+    get_content_store_s3,
+    get_manifest_store,
+    reconcile_contents,
+)
+from src.scrape import upload_time
+from src.sources import get_source, get_source_img_urls, get_sources
+
+logger = logging.getLogger(__name__)
+WORK_QUEUE_URL = os.getenv("WORK_QUEUE_URL")
+VISIBILITY_TIMEOUT_S = 900
+"How long a received message is hidden from other consumers; the Lambda timeout, so retries never overlap"
+MAX_RECEIVES = 5
+"Receives after which `LocalQueue` dead-letters a message, like the redrive policy of an SQS queue"
+RETRYING_STATUSES = (ProcessingStatus.QUEUED, ProcessingStatus.FAILED)
+"Statuses of images whose message may still be on the queue, being processed or waiting to be retried"
+STALE_QUEUED_AFTER = datetime.timedelta(seconds=VISIBILITY_TIMEOUT_S * MAX_RECEIVES)
+"""
+Age after which a QUEUED or FAILED image is sent again: by then its message has been dead-lettered, after failing
+every receive or because every consumer was killed by the Lambda timeout before it could mark the image FAILED
+"""
+BATCH_SIZE = 10
+"Maximum number of messages sent or received in one SQS call"
+POLL_WAIT_S = 5
+"Long-polling wait for `SqsQueue.receive`, so an empty response means the queue is really empty"
+
+
+class WorkItem(BaseModel):
+    """One stored image to extract and reconcile."""
+
+    id_: str
+    key: str
+    s3_url: str
+    img_url: str
+    source: str
+    "Name of the registered source the image was scraped for"
+
+
+@dataclass(frozen=True)
+class Message:
+    receipt: str
+    item: WorkItem
+    receive_count: int
+
+
+class SqsQueue:
+    """
+    An SQS queue of work items. On a FIFO queue, messages are grouped by source (so each calendar is reconciled one
+    image at a time, in order) and deduplicated by content hash.
+    """
+
+    def __init__(self, client: "SQSClient", url: str):
+        self.client = client
+        self.url = url
+        self.fifo = url.endswith(".fifo")
+
+    def send(self, items: list[WorkItem]) -> None:
+        for start in range(0, len(items), BATCH_SIZE):
+            entries = []
+            for i, item in enumerate(items[start : start + BATCH_SIZE]):
+                entry: dict[str, Any] = {"Id": str(i), "MessageBody": item.model_dump_json()}
+                if self.fifo:
+                    entry |= {"MessageGroupId": item.source, "MessageDeduplicationId": item.id_}
+                entries.append(entry)
+            response = self.client.send_message_batch(QueueUrl=self.url, Entries=entries)
+            if failed := response.get("Failed"):
+                raise RuntimeError(f"Failed to enqueue {len(failed)} of {len(entries)} messages: {failed}")
+
+    def receive(
+        self, max_messages: int = BATCH_SIZE, visibility_timeout_s: int = VISIBILITY_TIMEOUT_S
+    ) -> list[Message]:
+        response = self.client.receive_message(
+            QueueUrl=self.url,
+            MaxNumberOfMessages=max_messages,
+            VisibilityTimeout=visibility_timeout_s,
+            WaitTimeSeconds=POLL_WAIT_S,
+            MessageSystemAttributeNames=["ApproximateReceiveCount"],
+        )
+        return [
+            Message(
+                receipt=message["ReceiptHandle"],
+                item=WorkItem.model_validate_json(message["Body"]),
+                receive_count=int(message.get("Attributes", {}).get("ApproximateReceiveCount", 1)),
+            )
+            for message in response.get("Messages", [])
+        ]
+
+    def delete(self, message: Message) -> None:
+        self.client.delete_message(QueueUrl=self.url, ReceiptHandle=message.receipt)
+
+
+@dataclass
+class LocalMessage:
+    item: WorkItem
+    visible_at: float
+    receive_count: int = 0
+
+
+class LocalQueue:
+    """An in-process queue with the visibility-timeout semantics of SQS, for tests and local runs."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.messages: dict[str, LocalMessage] = {}
+        self.dead_letters: list[WorkItem] = []
+
+    def send(self, items: list[WorkItem]) -> None:
+        for item in items:
+            self.messages[uuid.uuid4().hex] = LocalMessage(item, visible_at=self.clock())
+
+    def receive(
+        self, max_messages: int = BATCH_SIZE, visibility_timeout_s: int = VISIBILITY_TIMEOUT_S
+    ) -> list[Message]:
+        now = self.clock()
+        received = []
+        for receipt, message in list(self.messages.items()):
+            if len(received) == max_messages:
+                break
+            if message.visible_at > now:
+                continue
+            if message.receive_count >= MAX_RECEIVES:
+                logger.error(f"Content {message.item.id_} failed {message.receive_count} times; dead-lettering it")
+                self.dead_letters.append(self.messages.pop(receipt).item)
+                continue
+            message.receive_count += 1
+            message.visible_at = now + visibility_timeout_s
+            received.append(Message(receipt, message.item, message.receive_count))
+        return received
+
+    def delete(self, message: Message) -> None:
+        self.messages.pop(message.receipt, None)
+
+
+WorkQueue = SqsQueue | LocalQueue
+
+
+def get_work_queue() -> SqsQueue:
+    if not WORK_QUEUE_URL:
+        raise ValueError("`WORK_QUEUE_URL` environment variable is not set")
+    return SqsQueue(boto3.client("sqs"), WORK_QUEUE_URL)
+
+
+def is_stale(store: ManifestStore, id_: str) -> bool:
+    """
+    Whether the image `id_` was queued so long ago (or never) that its message must have been dead-lettered, so
+    it can be sent again.
+    """
+    entry = store.manifest.entries.get(id_)
+    if entry is None or entry.queued_at is None:
+        return True
+    if stale := datetime.datetime.now(datetime.UTC) - entry.queued_at > STALE_QUEUED_AFTER:
+        logger.warning(f"Content {id_} was queued at {entry.queued_at} and is still {entry.status}; sending it again")
+    return stale
+
+
+def enqueue(queue: WorkQueue, store: ManifestStore | None = None) -> list[WorkItem]:
+    """
+    Store every new image from the registered sources and send one work item per content hash, newest upload first.
+
+    Images already sent (status QUEUED) are not sent again, so a scrape that runs while consumers are busy does not
+    duplicate work, unless they were sent more than `STALE_QUEUED_AFTER` ago. Failed images are sent again, like the
+    scheduled run retries them, but only once their last message can no longer be retried by the queue itself.
+
+    Returns:
+        list[WorkItem]: The work items sent.
+    """
+    sources = get_sources()
+    img_urls = get_source_img_urls(sources)
+    logger.info(f"Retrieved {len(img_urls)} image URLs from {len(sources)} sources")
+    if not img_urls:
+        raise ValueError("Expected at least 1 image URL, found 0")
+    img_urls.sort(key=lambda source_url: upload_time(source_url[1]), reverse=True)
+
+    store = store or get_manifest_store()
+    items: list[WorkItem] = []
+    errors: list[Exception] = []
+    for source, img_url in img_urls:
+        try:
+            result = get_content_store_s3(img_url, store, source.name)
+        except Exception as e:
+            logger.exception(f"Failed to store {source.name} image {img_url}")
+            errors.append(e)
+            continue
+        if result.should_process and (result.processing_status not in RETRYING_STATUSES or is_stale(store, result.id_)):
+            items.append(
+                WorkItem(id_=result.id_, key=result.key, s3_url=result.s3_url, img_url=img_url, source=source.name)
+            )
+
+    queue.send(items)
+    queued_at = datetime.datetime.now(datetime.UTC)
+    for item in items:
+        store.update(item.id_, item.key, status=ProcessingStatus.QUEUED, queued_at=queued_at)
+    logger.info(f"Enqueued {len(items)} of {len(img_urls)} images")
+    if errors:
+        raise errors[0]
+    return items
+
+
+def process_work_item(item: WorkItem, store: ManifestStore | None = None) -> None:
+    """
+    Extract and reconcile one queued image. Does nothing if the image has already been completed or rolled back,
+    e.g. on a duplicate delivery.
+    """
+    store = store or get_manifest_store()
+    status = store.manifest.get_status(item.id_)
+    if status in (ProcessingStatus.COMPLETED, ProcessingStatus.ROLLED_BACK):
+        logger.info(f"Content {item.id_} is already {status}; skipping")
+        return
+
+    source = get_source(item.source)
+    result = ContentStoreResult(
+        id_=item.id_, key=item.key, s3_url=item.s3_url, should_process=True, processing_status=status
+    )
+    bookings = extract_content(store, result, item.img_url, source)
+    store.load()  # see images other consumers completed meanwhile, which may own some of these dates
+    reconcile_contents(store, [(result, bookings)], calendar_id=source.get_calendar_id())
+
+
+def handle_sqs_records(
+    records: list[dict[str, Any]], deadline: Deadline | None = None
+) -> dict[str, list[dict[str, str]]]:
+    """
+    Process the messages of an SQS-triggered Lambda invocation, one image each.
+
+    With a `deadline` (the Lambda's remaining time), a message is only started if an image can be extracted and
+    reconciled in the time left (see `src.run.run`); the rest are reported as failed without being processed, so
+    they are retried by a later invocation instead of being killed half way through.
+
+    Returns:
+        dict: The failed messages as `batchItemFailures`; with `ReportBatchItemFailures` enabled on the event source
+            mapping, only those are retried after the visibility timeout.
+    """
+    deadline = deadline or Deadline()
+    store = get_manifest_store()
+    failures = []
+    for i, record in enumerate(records):
+        if not deadline.has_time_for(EXTRACT_ESTIMATE_S + RECONCILE_RESERVE_S):
+            logger.warning(f"{deadline.remaining():.0f}s left; returning {len(records) - i} messages to the queue")
+            failures.extend({"itemIdentifier": unstarted["messageId"]} for unstarted in records[i:])
+            break
+        try:
+            process_work_item(WorkItem.model_validate_json(record["body"]), store)
+        except Exception:
+            logger.exception(f"Failed to process message {record['messageId']}")
+            failures.append({"itemIdentifier": record["messageId"]})
+    return {"batchItemFailures": failures}
+
+
+def consume(queue: WorkQueue, store: ManifestStore | None = None, max_messages: int = BATCH_SIZE) -> int:
+    """
+    Receive and process messages until none are visible, deleting each once its image is reconciled. Failed
+    messages are left on the queue to be retried after the visibility timeout.
+
+    Returns:
+        int: The number of messages processed.
+    """
+    store = store or get_manifest_store()
+    processed = 0
+    while messages := queue.receive(max_messages):
+        for message in messages:
+            try:
+                process_work_item(message.item, store)
+            except Exception:
+                logger.exception(
+                    f"Failed to process content {message.item.id_} (receive {message.receive_count}); will retry"
+                )
+                continue
+            queue.delete(message)
+            processed += 1
+    logger.info(f"Processed {processed} messages")
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=["enqueue", "consume"], help="Send new images, or process queued images")
+    args = parser.parse_args()
+
+    queue = get_work_queue()
+    if args.command == "enqueue":
+        enqueue(queue)
+    else:
+        consume(queue)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,5 +1,14 @@
+import datetime
+import io
+from collections.abc import Callable
 from typing import TYPE_CHECKING, Any
 
+import httplib2
+from google import genai
+from googleapiclient.errors import HttpError
+
+from src.manifest import MANIFEST_KEY, Manifest
+
 if TYPE_CHECKING:
     from googleapiclient._apis.calendar.v3 import Event
 
@@ -15,3 +24,198 @@ class MockCalendarResource:
     def insert(self, calendarId: str, body: Any = ...): ...
     def list(self, *args, **kwargs): ...
     def delete(self, *args, **kwargs): ...
+
+
+class FakeClock:
+    """A `time.monotonic` stand-in that only moves when `now` is set."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeS3Client:
+    class exceptions:
+        class ClientError(Exception):
+            def __init__(self, error_code: str):
+                self.response = {"Error": {"Code": error_code}}
+
+    def __init__(self, should_exist: bool = False, manifest: Manifest | None = None):
+        self.should_exist = should_exist
+        self.objects: dict[str, tuple[bytes, str]] = {}
+        self.last_modified: dict[str, datetime.datetime] = {}
+        self.put_calls = []
+        self.etag_counter = 0
+        if manifest is not None:
+            self.store_object(MANIFEST_KEY, manifest.model_dump_json().encode())
+
+    def store_object(self, key: str, body: bytes) -> str:
+        self.etag_counter += 1
+        etag = f'"{self.etag_counter}"'
+        self.objects[key] = (body, etag)
+        self.last_modified.setdefault(key, datetime.datetime.now(datetime.UTC))
+        return etag
+
+    def put_object(self, **kwargs):
+        self.put_calls.append(kwargs)
+        key = kwargs["Key"]
+        existing = self.objects.get(key)
+        if kwargs.get("IfNoneMatch") == "*" and (existing is not None or (self.should_exist and key != MANIFEST_KEY)):
+            raise self.exceptions.ClientError("PreconditionFailed")
+        if "IfMatch" in kwargs and (existing is None or existing[1] != kwargs["IfMatch"]):
+            raise self.exceptions.ClientError("PreconditionFailed")
+        return {"ETag": self.store_object(key, kwargs["Body"])}
+
+    def get_object(self, **kwargs):
+        if kwargs["Key"] not in self.objects:
+            raise self.exceptions.ClientError("NoSuchKey")
+        body, etag = self.objects[kwargs["Key"]]
+        return {"Body": io.BytesIO(body), "ETag": etag}
+
+    def delete_object(self, **kwargs):
+        self.objects.pop(kwargs["Key"], None)
+        return {}
+
+    def get_paginator(self, operation_name: str):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket: str, Prefix: str = ""):
+                keys = sorted(key for key in client.objects if key.startswith(Prefix))
+                yield {"Contents": [{"Key": key, "LastModified": client.last_modified[key]} for key in keys]}
+
+        return Paginator()
+
+    @property
+    def manifest_puts(self) -> list[dict]:
+        return [call for call in self.put_calls if call["Key"] == MANIFEST_KEY]
+
+    def get_manifest(self) -> Manifest:
+        return Manifest.model_validate_json(self.objects[MANIFEST_KEY][0])
+
+
+class FakeRequest:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return self.fn()
+
+
+class FakeBatch:
+    def __init__(self, service: "FakeCalendarService"):
+        self.service = service
+        self.requests = []
+
+    def add(self, request: FakeRequest, callback, request_id: str):
+        self.requests.append((request, callback, request_id))
+
+    def execute(self):
+        self.service.batch_sizes.append(len(self.requests))
+        for request, callback, request_id in self.requests:
+            try:
+                response = request.execute()
+            except Exception as e:
+                callback(request_id, None, e)
+            else:
+                callback(request_id, response, None)
+
+
+class FakeCalendarService:
+    """An in-memory stand-in for the Calendar API `events()` resource and batch requests."""
+
+    def __init__(self, events: list["Event"] | None = None):
+        self.events_by_id: dict[str, "Event"] = {event["id"]: event for event in events or [] if "id" in event}
+        self.list_calls: list[dict[str, Any]] = []
+        self.batch_sizes: list[int] = []
+        self.cancelled: set[str] = set()
+
+    def events(self):
+        return self
+
+    def new_batch_http_request(self):
+        return FakeBatch(self)
+
+    def list(self, calendarId: str, maxResults: int = 250, pageToken: str | None = None, **params):
+        self.list_calls.append({"maxResults": maxResults, "pageToken": pageToken, **params})
+        events = list(self.events_by_id.values())
+        if prop := params.get("privateExtendedProperty"):
+            name, value = prop.split("=", 1)
+            events = [e for e in events if e.get("extendedProperties", {}).get("private", {}).get(name) == value]
+        start = int(pageToken or 0)
+        page = {"items": events[start : start + maxResults]}
+        if start + maxResults < len(events):
+            page["nextPageToken"] = str(start + maxResults)
+        return FakeRequest(lambda: page)
+
+    def insert(self, calendarId: str, body: "Event"):
+        def insert():
+            event = {**body, "id": body.get("id", f"event-{len(self.events_by_id)}")}
+            if event["id"] in self.events_by_id or event["id"] in self.cancelled:
+                raise HttpError(httplib2.Response({"status": 409}), b"The requested identifier already exists.")
+            self.events_by_id[event["id"]] = event
+            return event
+
+        return FakeRequest(insert)
+
+    def update(self, calendarId: str, eventId: str, body: "Event"):
+        def update():
+            self.cancelled.discard(eventId)
+            self.events_by_id[eventId] = {**body, "id": eventId}
+            return self.events_by_id[eventId]
+
+        return FakeRequest(update)
+
+    def delete(self, calendarId: str, eventId: str):
+        def delete():
+            if eventId not in self.events_by_id:
+                raise HttpError(httplib2.Response({"status": 410}), b"Resource has been deleted")
+            self.events_by_id.pop(eventId)
+            self.cancelled.add(eventId)
+
+        return FakeRequest(delete)
+
+
+class FakeGeminiBatches:
+    """
+    An in-memory stand-in for the Gemini `client.batches` resource: each job reports running for `polls_to_finish`
+    polls, then succeeds with `respond`'s JSON text (or error, if it raises) for each of its inlined requests.
+    """
+
+    def __init__(self, respond: Callable[[genai.types.InlinedRequest], str], polls_to_finish: int = 1):
+        self.respond = respond
+        self.polls_to_finish = polls_to_finish
+        self.jobs: dict[str, list[genai.types.InlinedRequest]] = {}
+        self.polls: dict[str, int] = {}
+
+    def create(self, model: str, src: list[genai.types.InlinedRequest], config: Any = None) -> genai.types.BatchJob:
+        name = f"batches/{len(self.jobs) + 1}"
+        self.jobs[name] = src
+        self.polls[name] = 0
+        return genai.types.BatchJob(name=name, state=genai.types.JobState.JOB_STATE_PENDING)
+
+    def get(self, name: str) -> genai.types.BatchJob:
+        self.polls[name] += 1
+        if self.polls[name] <= self.polls_to_finish:
+            return genai.types.BatchJob(name=name, state=genai.types.JobState.JOB_STATE_RUNNING)
+        return genai.types.BatchJob(
+            name=name,
+            state=genai.types.JobState.JOB_STATE_SUCCEEDED,
+            dest=genai.types.BatchJobDestination(inlined_responses=[self.answer(r) for r in self.jobs[name]]),
+        )
+
+    def answer(self, request: genai.types.InlinedRequest) -> genai.types.InlinedResponse:
+        try:
+            text = self.respond(request)
+        except Exception as e:
+            return genai.types.InlinedResponse(error=genai.types.JobError(code=500, message=str(e)))
+        return genai.types.InlinedResponse(
+            response=genai.types.GenerateContentResponse(
+                candidates=[genai.types.Candidate(content=genai.types.Content(parts=[genai.types.Part(text=text)]))],
+                usage_metadata=genai.types.GenerateContentResponseUsageMetadata(
+                    prompt_token_count=1000, candidates_token_count=100
+                ),
+            )
+        )
@@ -0,0 +1,32 @@
+import datetime
+import unittest
+from unittest.mock import Mock, patch
+
+from src.audit import find_duplicates
+from src.bookings import Booking
+from src.gcal import CALENDAR_ID, booking_to_event
+from src.manifest import ManifestStore
+from tests import FakeS3Client
+
+
+def event(day: int, source_id: str) -> dict:
+    return booking_to_event(Booking(date=datetime.date(2026, 4, day), time="ALL DAY"), source_id=source_id)
+
+
+class AuditTests(unittest.TestCase):
+    @patch("src.sync.sync_events")
+    def test_bookings_with_several_events_are_reported(self, mock_sync_events: Mock):
+        first, other = event(1, "image-a"), event(2, "image-a")
+        stale = {**first, "id": "stale"}
+        mock_sync_events.return_value = ([first, other, stale], "token")
+        store = ManifestStore(FakeS3Client(), "test-bucket")
+        store.load()
+
+        duplicates = find_duplicates(store, CALENDAR_ID)
+
+        booking_id = first["extendedProperties"]["private"]["booking_id"]
+        self.assertEqual(duplicates, {booking_id: [first["id"], "stale"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
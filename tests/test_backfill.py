@@ -0,0 +1,115 @@
+import datetime
+import unittest
+from unittest.mock import Mock, patch
+
+from src.backfill import BackfillFilter, backfill
+from src.bookings import Booking, Bookings
+from src.extract.google_ import MODEL
+from src.gcal import booking_to_event
+from src.manifest import Manifest, ManifestEntry, ManifestStore, ProcessingStatus
+from src.usage import call_usage, record_usage
+from tests import FakeCalendarService, FakeS3Client
+
+
+def bookings_on(date: datetime.date) -> Bookings:
+    return Bookings(bookings=[Booking(date=date, time="ALL DAY", event_type="Athletics Track")])
+
+
+class BackfillTests(unittest.TestCase):
+    def setUp(self):
+        self.fake_client = FakeS3Client(
+            manifest=Manifest(
+                entries={
+                    "done": ManifestEntry(key="done.png", status=ProcessingStatus.COMPLETED),
+                    "failed": ManifestEntry(key="failed.png", status=ProcessingStatus.FAILED),
+                }
+            )
+        )
+        for key in ["done.png", "failed.png", "unset.png"]:
+            self.fake_client.store_object(key, key.encode())
+        self.store = ManifestStore(self.fake_client, "test-bucket")
+        self.store.load()
+
+    @patch("src.run.reconcile")
+    @patch("src.backfill.extract_bookings_from_bytes")
+    def test_backfill_filters_by_status_and_skips_state_objects(self, mock_extract: Mock, mock_reconcile: Mock):
+        mock_extract.return_value = bookings_on(datetime.date(2026, 4, 9))
+        mock_reconcile.side_effect = lambda sources, **kwargs: {source.source_id: ["event-1"] for source in sources}
+
+        result = backfill(
+            filter_=BackfillFilter(statuses=frozenset({ProcessingStatus.FAILED, None})),
+            store=self.store,
+            min_interval_s=0,
+        )
+
+        self.assertEqual(sorted(result.completed), ["failed", "unset"])
+        self.assertEqual(sorted(call.args[0] for call in mock_extract.call_args_list), [b"failed.png", b"unset.png"])
+        entries = self.fake_client.get_manifest().entries
+        self.assertEqual(entries["unset"].status, ProcessingStatus.COMPLETED)
+        self.assertEqual(entries["failed"].event_ids, ["event-1"])
+
+    @patch("src.run.reconcile")
+    @patch("src.backfill.extract_bookings_from_bytes")
+    def test_backfill_resumes_from_checkpoint_and_retries_failures(self, mock_extract: Mock, mock_reconcile: Mock):
+        mock_extract.side_effect = [bookings_on(datetime.date(2026, 4, 9)), RuntimeError("boom"), None]
+        mock_reconcile.return_value = {}
+
+        first = backfill(name="resume", store=self.store, max_workers=1, min_interval_s=0)
+        self.assertEqual(len(first.completed) + len(first.failed), 3)
+        self.assertEqual(len(first.failed), 2)
+
+        mock_extract.side_effect = None
+        mock_extract.return_value = bookings_on(datetime.date(2026, 4, 10))
+        second = backfill(name="resume", store=self.store, min_interval_s=0)
+        self.assertEqual(second.skipped, first.completed)
+        self.assertEqual(sorted(second.completed), sorted(first.failed))
+
+        third = backfill(name="resume", store=self.store, min_interval_s=0)
+        self.assertEqual((third.completed, sorted(third.skipped)), ([], ["done", "failed", "unset"]))
+
+    @patch("src.backfill.extract_bookings_from_bytes")
+    def test_backfill_of_an_older_image_leaves_a_newer_images_dates_alone(self, mock_extract: Mock):
+        newer = Booking(date=datetime.date(2026, 4, 9), time="ALL DAY", event_type="NEW")
+        self.store.update(
+            "done",
+            "done.png",
+            uploaded_at=datetime.datetime(2026, 4, 2, tzinfo=datetime.UTC),
+            from_date=newer.date,
+            to_date=newer.date,
+        )
+        self.store.update("failed", "failed.png", uploaded_at=datetime.datetime(2026, 4, 1, tzinfo=datetime.UTC))
+        mock_extract.return_value = Bookings(
+            bookings=[Booking(date=datetime.date(2026, 4, day), time="ALL DAY", event_type="OLD") for day in (1, 9, 30)]
+        )
+        service = FakeCalendarService([booking_to_event(newer, source_id="done")])
+
+        with patch("src.gcal.get_client", return_value=service):
+            backfill(
+                filter_=BackfillFilter(statuses=frozenset({ProcessingStatus.FAILED})),
+                store=self.store,
+                min_interval_s=0,
+            )
+
+        self.assertEqual(
+            sorted((event["start"]["date"], event["summary"]) for event in service.events_by_id.values()),
+            [("2026-04-01", "OLD (ALL DAY)"), ("2026-04-09", "NEW (ALL DAY)"), ("2026-04-30", "OLD (ALL DAY)")],
+        )
+
+    @patch("src.backfill.extract_bookings_from_bytes")
+    def test_usage_of_a_failed_extraction_is_recorded(self, mock_extract: Mock):
+        def extract(*args):
+            record_usage(call_usage(MODEL, 1.0, failed=True), MODEL)
+            raise RuntimeError("429 RESOURCE_EXHAUSTED")
+
+        mock_extract.side_effect = extract
+
+        result = backfill(filter_=BackfillFilter(prefix="unset"), store=self.store, min_interval_s=0)
+
+        self.assertEqual(result.failed, ["unset"])
+        entry = self.fake_client.get_manifest().entries["unset"]
+        self.assertEqual(entry.status, ProcessingStatus.FAILED)
+        self.assertEqual((entry.usage.calls, entry.usage.failed_calls), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import datetime
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from google import genai
+
+from src.backfill import backfill
+from src.bookings import Booking, Bookings
+from src.extract.batch import BatchRequest, GeminiBatchBackend, LocalBatchBackend
+from src.extract.replay import ReplayMode, ResponseRecorder
+from src.manifest import Manifest, ManifestStore, ProcessingStatus
+from tests import FakeGeminiBatches, FakeS3Client
+
+
+def bookings_on(date: datetime.date) -> Bookings:
+    return Bookings(bookings=[Booking(date=date, time="ALL DAY", event_type="Athletics Track")])
+
+
+def respond(request: genai.types.InlinedRequest) -> str:
+    """Bookings on the day given by the image's bytes, e.g. `b"2026-04-09"`; anything else fails."""
+    data = request.contents[0].parts[0].inline_data.data  # type: ignore[index, union-attr]
+    return bookings_on(datetime.date.fromisoformat(data.decode())).model_dump_json()  # type: ignore[union-attr]
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.recorder = ResponseRecorder(Path(directory.name))
+        recorder_patcher = patch("src.extract.google_.recorder", self.recorder)
+        recorder_patcher.start()
+        self.addCleanup(recorder_patcher.stop)
+        self.batches = FakeGeminiBatches(respond, polls_to_finish=2)
+        self.backend = GeminiBatchBackend(Mock(batches=self.batches), poll_interval_s=0)
+
+
+class GeminiBatchBackendTests(BatchTestCase):
+    def test_results_are_parsed_in_request_order_and_failures_reported(self):
+        requests = [
+            BatchRequest("a", b"2026-04-09", "image/png"),
+            BatchRequest("b", b"not a date", "image/png"),
+            BatchRequest("c", b"2026-05-01", "image/png"),
+        ]
+
+        results = self.backend.run(requests)
+
+        self.assertEqual([result.key for result in results], ["a", "b", "c"])
+        self.assertEqual(results[0].bookings, bookings_on(datetime.date(2026, 4, 9)))
+        self.assertEqual(results[2].bookings, bookings_on(datetime.date(2026, 5, 1)))
+        self.assertIsNone(results[1].bookings)
+        self.assertIsNotNone(results[1].error)
+        self.assertEqual((len(self.batches.jobs), self.batches.polls["batches/1"]), (1, 3))
+        self.assertAlmostEqual(results[0].usage.cost_usd, (1000 * 0.50 + 100 * 3.00) / 1_000_000 * 0.5)
+
+    @patch("src.extract.batch.MAX_JOB_BYTES", 20)
+    def test_large_batches_are_split_across_jobs(self):
+        requests = [BatchRequest(str(day), f"2026-04-{day:02}".encode()) for day in range(1, 6)]
+
+        results = self.backend.run(requests)
+
+        self.assertEqual(len(self.batches.jobs), 3)
+        self.assertEqual(
+            [result.bookings.bookings[0].date.day for result in results if result.bookings], [1, 2, 3, 4, 5]
+        )
+
+    def test_recorded_responses_are_replayed_and_only_misses_sent(self):
+        self.recorder.mode = ReplayMode.RECORD
+        self.backend.run([BatchRequest("a", b"2026-04-09"), BatchRequest("a", b"2026-04-09", sample=1)])
+
+        results = self.backend.run([BatchRequest("a", b"2026-04-09", sample=1), BatchRequest("b", b"2026-04-10")])
+
+        self.assertEqual(len(self.batches.jobs), 2)
+        self.assertEqual(len(self.batches.jobs["batches/2"]), 1)
+        self.assertEqual(results[0].bookings, bookings_on(datetime.date(2026, 4, 9)))
+        self.assertEqual(results[1].bookings, bookings_on(datetime.date(2026, 4, 10)))
+
+
+class LocalBatchBackendTests(BatchTestCase):
+    @patch("src.extract.google_.CONTEXT_CACHING", False)
+    @patch("src.extract.google_.client")
+    def test_requests_are_extracted_one_at_a_time(self, client: Mock):
+        client.models.generate_content.side_effect = [
+            Mock(parsed=bookings_on(datetime.date(2026, 4, 9)), usage_metadata=None),
+            RuntimeError("429 RESOURCE_EXHAUSTED"),
+        ]
+
+        results = LocalBatchBackend().run([BatchRequest("a", b"image-a"), BatchRequest("b", b"image-b")])
+
+        self.assertEqual(results[0].bookings, bookings_on(datetime.date(2026, 4, 9)))
+        self.assertEqual((results[1].bookings, results[1].usage.failed_calls), (None, 1))
+        self.assertIn("RESOURCE_EXHAUSTED", results[1].error or "")
+
+
+class BatchBackfillTests(BatchTestCase):
+    @patch("src.run.reconcile")
+    def test_backfill_reconciles_batch_results_oldest_first(self, mock_reconcile: Mock):
+        fake_client = FakeS3Client(manifest=Manifest())
+        now = datetime.datetime.now(datetime.UTC)
+        for key, body, age_days in [("new.png", b"2026-05-01", 1), ("bad.png", b"?", 2), ("old.png", b"2026-04-09", 3)]:
+            fake_client.store_object(key, body)
+            fake_client.last_modified[key] = now - datetime.timedelta(days=age_days)
+        store = ManifestStore(fake_client, "test-bucket")
+        store.load()
+        reconciled = []
+        mock_reconcile.side_effect = lambda sources, **kwargs: reconciled.append(sources[0].bookings) or {}
+
+        result = backfill(store=store, batch=self.backend)
+
+        self.assertEqual(len(self.batches.jobs), 1)
+        self.assertEqual((result.completed, result.failed), (["old", "new"], ["bad"]))
+        self.assertEqual(reconciled, [bookings_on(datetime.date(2026, 4, 9)), bookings_on(datetime.date(2026, 5, 1))])
+        entries = fake_client.get_manifest().entries
+        self.assertEqual(entries["bad"].status, ProcessingStatus.FAILED)
+        self.assertEqual(entries["old"].usage.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
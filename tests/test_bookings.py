@@ -0,0 +1,39 @@
+import datetime
+import unittest
+
+from src.bookings import Booking, Bookings, FromToTime, from_records, to_records
+
+
+class BookingRecordTests(unittest.TestCase):
+    def setUp(self):
+        self.bookings = Bookings(
+            bookings=[
+                Booking(
+                    day="Friday",
+                    date=datetime.date(2025, 8, 8),
+                    time=FromToTime(start=datetime.time(9, 0), end=datetime.time(17, 30)),
+                    event_type="EXCLUSIVE USE TRACK BOOKING",
+                ),
+                Booking(
+                    date=datetime.date(2025, 8, 15),
+                    time="ALL DAY",
+                    event_type='Schools "Sports" Day',
+                    any_other_info="Lanes 1–4\nonly",
+                ),
+            ]
+        )
+
+    def test_round_trip(self):
+        records = to_records(self.bookings)
+
+        self.assertEqual(records[0].start, 9 * 60)
+        self.assertEqual(records[0].end, 17 * 60 + 30)
+        self.assertEqual(records[1].duration, "ALL DAY")
+        self.assertEqual(from_records(records), self.bookings)
+
+    def test_records_are_hashable_by_value(self):
+        self.assertEqual(set(to_records(self.bookings)), set(to_records(self.bookings.model_copy(deep=True))))
+
+
+if __name__ == "__main__":
+    unittest.main()
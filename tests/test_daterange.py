@@ -0,0 +1,46 @@
+import datetime
+import unittest
+
+from src.daterange import DateRange
+
+
+class DateRangeTests(unittest.TestCase):
+    def test_inclusive_range_contains_last_date(self):
+        date_range = DateRange.inclusive(datetime.date(2026, 4, 1), datetime.date(2026, 4, 30))
+
+        self.assertEqual(date_range.stop, datetime.date(2026, 5, 1))
+        self.assertEqual(date_range.last, datetime.date(2026, 4, 30))
+        self.assertEqual(date_range.days, 30)
+        self.assertIn(datetime.date(2026, 4, 30), date_range)
+        self.assertNotIn(datetime.date(2026, 5, 1), date_range)
+        self.assertEqual(len(list(date_range)), 30)
+
+    def test_split_months(self):
+        date_range = DateRange.inclusive(datetime.date(2023, 1, 15), datetime.date(2023, 3, 10))
+
+        self.assertEqual(
+            [str(r) for r in date_range.split_months()],
+            ["2023-01-15 to 2023-01-31", "2023-02-01 to 2023-02-28", "2023-03-01 to 2023-03-10"],
+        )
+
+    def test_to_datetimes_uses_offset_in_force_on_each_date(self):
+        # British Summer Time starts on 2026-03-29 and ends on 2026-10-25
+        spring = DateRange.inclusive(datetime.date(2026, 3, 28), datetime.date(2026, 3, 29))
+        autumn = DateRange.inclusive(datetime.date(2026, 10, 24), datetime.date(2026, 10, 25))
+
+        self.assertEqual(
+            [dt.isoformat() for dt in spring.to_datetimes("Europe/London")],
+            ["2026-03-28T00:00:00+00:00", "2026-03-30T00:00:00+01:00"],
+        )
+        self.assertEqual(
+            [dt.isoformat() for dt in autumn.to_datetimes("Europe/London")],
+            ["2026-10-24T00:00:00+01:00", "2026-10-26T00:00:00+00:00"],
+        )
+
+    def test_rejects_reversed_range(self):
+        with self.assertRaises(ValueError):
+            DateRange(datetime.date(2026, 4, 2), datetime.date(2026, 4, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import datetime
+import unittest
+from unittest.mock import Mock, patch
+
+from src.bookings import Booking, Bookings
+from src.deadline import Deadline, DurationEstimate
+from src.dedup import load_result
+from src.manifest import ProcessingStatus
+from src.run import run
+from src.sources import ATHLETICS_TRACK
+from tests import FakeClock, FakeS3Client
+
+CDN = "https://images.squarespace-cdn.com/content/v1/site"
+
+
+def sample_bookings(day: int) -> Bookings:
+    return Bookings(bookings=[Booking(date=datetime.date(2026, 4, day), time="ALL DAY")])
+
+
+class DeadlineTests(unittest.TestCase):
+    def test_deadline_counts_down_and_is_unlimited_without_a_budget(self):
+        clock = FakeClock()
+        deadline = Deadline(100, clock)
+        clock.now = 30
+
+        self.assertEqual(deadline.remaining(), 70)
+        self.assertTrue(deadline.has_time_for(70))
+        self.assertFalse(deadline.has_time_for(71))
+        self.assertTrue(Deadline().has_time_for(10**9))
+        self.assertAlmostEqual(
+            Deadline.from_lambda_context(Mock(get_remaining_time_in_millis=lambda: 1500)).remaining(), 1.5, places=2
+        )
+
+    def test_duration_estimate_replaces_the_guess_then_smooths(self):
+        estimate = DurationEstimate(60)
+        estimate.observe(20)
+        estimate.observe(40)
+
+        self.assertEqual(estimate.seconds, 30)
+
+
+@patch("src.run.BUCKET", "test-bucket")
+@patch("src.run.reconcile")
+@patch("src.run.extract_bookings_from_url")
+@patch("src.run.requests.get")
+@patch("src.run.boto3.client")
+@patch("src.run.get_source_img_urls")
+class RunDeadlineTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        clock_patcher = patch("src.run.time.monotonic", self.clock)
+        clock_patcher.start()
+        self.addCleanup(clock_patcher.stop)
+        self.client = FakeS3Client()
+
+    def configure(self, mock_get_source_img_urls, mock_boto_client, mock_get, urls: list[str]):
+        mock_get_source_img_urls.return_value = [(ATHLETICS_TRACK, url) for url in urls]
+        mock_boto_client.return_value = self.client
+        mock_get.side_effect = lambda url, **kwargs: Mock(content=url.encode())
+
+    def extracting_in(self, seconds: float):
+        def extract(url, prompt):
+            self.clock.now += seconds
+            return sample_bookings(int(url[-6:-4]))
+
+        return extract
+
+    def test_run_extracts_newest_uploads_first_and_defers_what_does_not_fit(
+        self, mock_get_source_img_urls, mock_boto_client, mock_get, mock_extract, mock_reconcile
+    ):
+        urls = [f"{CDN}/16000000000{day}-A/track-{day}.png" for day in (10, 12, 11)]
+        self.configure(mock_get_source_img_urls, mock_boto_client, mock_get, urls)
+        mock_extract.side_effect = self.extracting_in(50)
+        mock_reconcile.return_value = {}
+
+        run(Deadline(200, self.clock))
+
+        self.assertEqual([call.args[0] for call in mock_extract.call_args_list], [urls[1], urls[2]])
+        self.assertEqual(len(mock_reconcile.call_args.args[0]), 2)
+        self.assertNotIn(urls[0], [call.args[0] for call in mock_get.call_args_list])
+
+    def test_run_with_no_budget_does_no_work(
+        self, mock_get_source_img_urls, mock_boto_client, mock_get, mock_extract, mock_reconcile
+    ):
+        self.configure(mock_get_source_img_urls, mock_boto_client, mock_get, [f"{CDN}/1600000000010-A/track-10.png"])
+
+        run(Deadline(0, self.clock))
+
+        mock_get.assert_not_called()
+        mock_extract.assert_not_called()
+        mock_reconcile.assert_not_called()
+
+    def test_extraction_left_pending_is_reconciled_by_the_next_run_without_re_extracting(
+        self, mock_get_source_img_urls, mock_boto_client, mock_get, mock_extract, mock_reconcile
+    ):
+        self.configure(mock_get_source_img_urls, mock_boto_client, mock_get, [f"{CDN}/1600000000010-A/track-10.png"])
+        mock_extract.side_effect = self.extracting_in(100)
+        mock_reconcile.return_value = {}
+
+        run(Deadline(130, self.clock))
+
+        mock_reconcile.assert_not_called()
+        ((id_, entry),) = self.client.get_manifest().entries.items()
+        self.assertEqual(entry.status, ProcessingStatus.PENDING)
+        self.assertEqual(load_result(self.client, "test-bucket", id_), sample_bookings(10))
+
+        run(Deadline(130, self.clock))
+
+        mock_extract.assert_called_once()
+        ((source,),) = mock_reconcile.call_args.args[:1]
+        self.assertEqual((source.source_id, source.bookings), (id_, sample_bookings(10)))
+        self.assertEqual(self.client.get_manifest().entries[id_].status, ProcessingStatus.COMPLETED)
+
+
+if __name__ == "__main__":
+    unittest.main()
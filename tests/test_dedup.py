@@ -0,0 +1,70 @@
+import datetime
+import io
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from PIL import Image
+
+from src.bookings import Booking, Bookings
+from src.dedup import dhash, hamming_distance, save_result
+from src.manifest import Manifest, ManifestEntry, ManifestStore, ProcessingStatus
+from src.run import extract_img_url
+from tests import FakeS3Client
+
+TRACK_IMAGE = Path(__file__).parents[1] / "eval_data" / "track.jpg"
+URL_PATH = "/content/v1/site/1600000000000-ABC/Athletics+Track+Bookings.jpg"
+
+
+def reencode(data: bytes, scale: float, quality: int) -> bytes:
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB").resize((int(image.width * scale), int(image.height * scale)))
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=quality)
+        return out.getvalue()
+
+
+class DedupTests(unittest.TestCase):
+    def setUp(self):
+        self.original = reencode(TRACK_IMAGE.read_bytes(), 0.4, 90)
+        self.rerendered = reencode(self.original, 0.75, 60)
+
+    def test_dhash_is_stable_across_reencoding_and_skips_non_images(self):
+        self.assertLessEqual(hamming_distance(dhash(self.original), dhash(self.rerendered)), 8)
+        self.assertIsNone(dhash(b"%PDF-1.7"))
+
+    @patch("src.run.BUCKET", "test-bucket")
+    @patch("src.run.extract_bookings_from_url")
+    @patch("src.run.requests.get")
+    def test_rerendered_image_reuses_extraction_only_from_the_same_asset(self, mock_get: Mock, mock_extract: Mock):
+        bookings = Bookings(bookings=[Booking(date=datetime.date(2026, 4, 9), time="ALL DAY")])
+        fake_client = FakeS3Client(
+            manifest=Manifest(
+                entries={
+                    "original": ManifestEntry(
+                        key="original.jpg",
+                        status=ProcessingStatus.COMPLETED,
+                        source="athletics-track",
+                        phash=dhash(self.original),
+                        url_path=URL_PATH,
+                    )
+                }
+            )
+        )
+        save_result(fake_client, "test-bucket", "original", bookings)
+        store = ManifestStore(fake_client, "test-bucket")
+        store.load()
+        mock_get.return_value.content = self.rerendered
+        mock_extract.return_value = Bookings(bookings=[Booking(date=datetime.date(2026, 5, 1), time="ALL DAY")])
+
+        _, reused = extract_img_url(f"https://images.example.com{URL_PATH}?format=750w", store)
+        mock_get.return_value.content = reencode(self.original, 0.5, 50)
+        _, extracted = extract_img_url("https://images.example.com/content/v1/site/1700000000000-DEF/new.jpg", store)
+
+        self.assertEqual(reused, bookings)
+        self.assertEqual(extracted, mock_extract.return_value)
+        mock_extract.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
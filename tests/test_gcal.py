@@ -4,7 +4,9 @@ import os
 import unittest
 from unittest.mock import patch
 
-from src.bookings import Booking
+from src.bookings import Booking, Bookings, FromToTime
+from src.daterange import DateRange
+from tests import FakeCalendarService
 
 
 class GCalTests(unittest.TestCase):
@@ -30,6 +32,124 @@ class GCalTests(unittest.TestCase):
         self.assertIn("Source+ID%3A+source-id", html)
         self.assertIn("Source+image%3A+https%3A%2F%2Fbucket.s3.amazonaws.com%2Fsource-id.png", html)
 
+    @patch.dict(os.environ, {"CALENDAR_ID": "test-calendar"}, clear=False)
+    def test_booking_to_html_escapes_extracted_text(self):
+        gcal = importlib.import_module("src.gcal")
+        booking = Booking(
+            date=datetime.date(2026, 4, 9),
+            time=FromToTime(start=datetime.time(9, 0), end=datetime.time(17, 30)),
+            event_type="Schools <Sports Day>",
+            any_other_info="Lanes 1 & 2 <script>alert(1)</script>",
+        )
+
+        html = gcal.booking_to_html(booking)
+
+        self.assertIn("<p><strong>Date:</strong> Thursday, April 09, 2026</p>", html)
+        self.assertIn("<p><strong>Time:</strong> 09:00 - 17:30</p>", html)
+        self.assertIn("Schools &lt;Sports Day&gt;", html)
+        self.assertIn("Lanes 1 &amp; 2 &lt;script&gt;alert(1)&lt;/script&gt;", html)
+        self.assertNotIn("<script>", html)
+
+    @patch.dict(os.environ, {"CALENDAR_ID": "test-calendar"}, clear=False)
+    def test_bookings_to_events_matches_booking_to_event(self):
+        gcal = importlib.import_module("src.gcal")
+        bookings = Bookings(
+            bookings=[
+                Booking(date=datetime.date(2026, 4, day), time="ALL DAY", event_type="Athletics Track")
+                for day in range(1, 4)
+            ]
+        )
+
+        events = gcal.bookings_to_events(bookings, "https://bucket.s3.amazonaws.com/id.png", "id")
+
+        self.assertEqual(
+            events,
+            [gcal.booking_to_event(b, "https://bucket.s3.amazonaws.com/id.png", "id") for b in bookings.bookings],
+        )
+
+    @patch.dict(os.environ, {"CALENDAR_ID": "test-calendar"}, clear=False)
+    def test_delete_all_events_pages_and_batches_filtered_events(self):
+        gcal = importlib.import_module("src.gcal")
+        booking = Booking(date=datetime.date(2026, 4, 9), time="ALL DAY")
+        ours = [{**gcal.booking_to_event(booking), "id": f"ours-{i}"} for i in range(120)]
+        unmarked = {**ours[0], "id": "unmarked", "extendedProperties": {"private": {"booking_id": booking.booking_id}}}
+        manual = [{"id": f"manual-{i}", "summary": "Manual"} for i in range(5)]
+        service = FakeCalendarService([*ours, unmarked, *manual])
+        progress = []
+
+        with patch("src.gcal.get_client", return_value=service), patch("src.gcal.MAX_RESULTS", 50):
+            deleted = gcal.delete_all_events(
+                match=gcal.is_app_event, progress=lambda done, total: progress.append((done, total))
+            )
+
+        self.assertEqual(deleted, 121)
+        self.assertEqual(len(service.list_calls), 3)
+        self.assertEqual(service.batch_sizes, [50, 50, 21])
+        self.assertEqual(progress, [(50, 121), (100, 121), (121, 121)])
+        self.assertEqual(sorted(service.events_by_id), [f"manual-{i}" for i in range(5)])
+
+    @patch.dict(os.environ, {"CALENDAR_ID": "test-calendar"}, clear=False)
+    def test_list_events_includes_last_day(self):
+        gcal = importlib.import_module("src.gcal")
+        service = FakeCalendarService()
+
+        with patch("src.gcal.get_client", return_value=service):
+            gcal.list_events(DateRange.inclusive(datetime.date(2026, 4, 1), datetime.date(2026, 4, 30)))
+
+        self.assertEqual(service.list_calls[0]["timeMin"], "2026-04-01T00:00:00+01:00")
+        self.assertEqual(service.list_calls[0]["timeMax"], "2026-05-01T00:00:00+01:00")
+
+    @patch.dict(os.environ, {"CALENDAR_ID": "test-calendar"}, clear=False)
+    def test_all_day_event_ends_on_following_day(self):
+        gcal = importlib.import_module("src.gcal")
+        booking = Booking(date=datetime.date(2026, 4, 30), time="ALL DAY")
+
+        event = gcal.booking_to_event(booking)
+
+        self.assertEqual(event["start"]["date"], "2026-04-30")
+        self.assertEqual(event["end"]["date"], "2026-05-01")
+        self.assertEqual(gcal.get_event_date(event), datetime.date(2026, 4, 30))
+
+    @patch.dict(os.environ, {"CALENDAR_ID": "test-calendar"}, clear=False)
+    def test_event_ending_at_midnight_ends_on_following_day(self):
+        gcal = importlib.import_module("src.gcal")
+        booking = Booking(
+            date=datetime.date(2026, 4, 30), time=FromToTime(start=datetime.time(18), end=datetime.time(0))
+        )
+
+        event = gcal.booking_to_event(booking)
+
+        self.assertEqual(event["start"]["dateTime"], "2026-04-30T18:00:00")
+        self.assertEqual(event["end"]["dateTime"], "2026-05-01T00:00:00")
+
+    @patch.dict(os.environ, {"CALENDAR_ID": "test-calendar"}, clear=False)
+    def test_event_ids_are_deterministic_and_valid(self):
+        gcal = importlib.import_module("src.gcal")
+        booking = Booking(date=datetime.date(2026, 4, 9), time="ALL DAY")
+
+        event_id = gcal.get_event_id(booking.booking_id)
+
+        self.assertEqual(event_id, gcal.booking_to_event(booking.model_copy(deep=True))["id"])
+        self.assertRegex(event_id, r"^[0-9a-v]{5,1024}$")
+        self.assertNotEqual(event_id, gcal.get_event_id(booking.booking_id, "other-calendar"))
+
+    @patch.dict(os.environ, {"CALENDAR_ID": "test-calendar"}, clear=False)
+    def test_repeated_inserts_do_not_duplicate_and_restore_cancelled_events(self):
+        gcal = importlib.import_module("src.gcal")
+        first, second = (Booking(date=datetime.date(2026, 4, day), time="ALL DAY") for day in (9, 10))
+        service = FakeCalendarService()
+
+        with patch("src.gcal.get_client", return_value=service):
+            gcal.insert_events([gcal.booking_to_event(first)])
+            gcal.delete_events([gcal.get_event_id(second.booking_id)])  # already gone: no error
+            gcal.insert_events([gcal.booking_to_event(second)])
+            gcal.delete_events([gcal.get_event_id(second.booking_id)])
+            retried = gcal.insert_events([gcal.booking_to_event(first), gcal.booking_to_event(second)])
+
+        self.assertEqual(len(retried), 2)
+        self.assertEqual(len(service.events_by_id), 2)
+        self.assertEqual(service.events_by_id[gcal.get_event_id(second.booking_id)]["status"], "confirmed")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from src.manifest import Manifest, ManifestEntry, ManifestStore, ProcessingStatus
+from tests import FakeS3Client
+
+
+class ManifestStoreTests(unittest.TestCase):
+    def test_load_missing_manifest_starts_empty(self):
+        store = ManifestStore(FakeS3Client(), "test-bucket")
+
+        manifest = store.load()
+
+        self.assertEqual(manifest.entries, {})
+        self.assertIsNone(store.etag)
+
+    def test_update_creates_manifest_conditionally(self):
+        fake_client = FakeS3Client()
+        store = ManifestStore(fake_client, "test-bucket")
+        store.load()
+
+        store.update("abc", "abc.png", status=ProcessingStatus.COMPLETED, booking_count=3)
+
+        self.assertEqual(fake_client.manifest_puts[0]["IfNoneMatch"], "*")
+        entry = fake_client.get_manifest().entries["abc"]
+        self.assertEqual(entry.status, ProcessingStatus.COMPLETED)
+        self.assertEqual(entry.booking_count, 3)
+
+    def test_update_reloads_and_reapplies_on_concurrent_write(self):
+        fake_client = FakeS3Client(manifest=Manifest(entries={"old": ManifestEntry(key="old.png")}))
+        store = ManifestStore(fake_client, "test-bucket")
+        store.load()
+
+        other = ManifestStore(fake_client, "test-bucket")
+        other.load()
+        other.update("other", "other.png", status=ProcessingStatus.FAILED)
+
+        store.update("abc", "abc.png", status=ProcessingStatus.COMPLETED)
+
+        entries = fake_client.get_manifest().entries
+        self.assertEqual(set(entries), {"old", "other", "abc"})
+        self.assertEqual(entries["other"].status, ProcessingStatus.FAILED)
+        self.assertEqual(entries["abc"].status, ProcessingStatus.COMPLETED)
+
+
+if __name__ == "__main__":
+    unittest.main()
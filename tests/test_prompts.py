@@ -0,0 +1,81 @@
+import datetime
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from src.bookings import Booking, Bookings
+from src.extract.google_ import PROMPT, extract_bookings_from_bytes
+from src.extract.prompts import get_prompt, parse_prompt_id
+from src.extract.replay import ResponseRecorder
+from src.sources import ATHLETICS_TRACK
+
+
+class PromptTests(unittest.TestCase):
+    def test_prompts_are_looked_up_by_name_and_version(self):
+        self.assertEqual(parse_prompt_id("athletics-track@1").text, PROMPT)
+        self.assertEqual(ATHLETICS_TRACK.prompt, parse_prompt_id("athletics-track@1"))
+        self.assertEqual(parse_prompt_id("athletics-track"), get_prompt("athletics-track"))
+        self.assertGreater(get_prompt("athletics-track").version, 1)
+        with self.assertRaises(ValueError):
+            get_prompt("athletics-track", 99)
+
+
+@patch.dict("src.extract.google_.prefix_caches", clear=True)
+@patch("src.extract.google_.recorder", ResponseRecorder(Path("recordings")))
+@patch("src.extract.google_.CONTEXT_CACHING", True)
+@patch("src.extract.google_.client")
+class ContextCachingTests(unittest.TestCase):
+    def configure(self, client: Mock, prompt_tokens: int):
+        client.models.count_tokens.return_value = Mock(total_tokens=prompt_tokens)
+        client.caches.create.return_value.name = "cachedContents/abc"
+        client.models.generate_content.return_value = Mock(
+            parsed=Bookings(bookings=[Booking(date=datetime.date(2026, 4, 9), time="ALL DAY")]), usage_metadata=None
+        )
+
+    @patch("src.extract.google_.MIN_CACHE_TOKENS", 100)
+    def test_prompt_is_cached_once_and_referenced_by_every_request(self, client: Mock):
+        self.configure(client, prompt_tokens=150)
+
+        extract_bookings_from_bytes(b"image-1", "image/png")
+        extract_bookings_from_bytes(b"image-2", "image/png")
+
+        client.caches.create.assert_called_once()
+        for call in client.models.generate_content.call_args_list:
+            self.assertEqual(call.kwargs["config"].cached_content, "cachedContents/abc")
+            self.assertIsNone(call.kwargs["config"].system_instruction)
+            self.assertEqual(len(call.kwargs["contents"]), 1)
+
+    def test_short_prompt_is_sent_inline_as_the_system_instruction(self, client: Mock):
+        self.configure(client, prompt_tokens=80)
+
+        extract_bookings_from_bytes(b"image-1", "image/png")
+        extract_bookings_from_bytes(b"image-2", "image/png")
+
+        client.caches.create.assert_not_called()
+        client.models.count_tokens.assert_not_called()
+        config = client.models.generate_content.call_args.kwargs["config"]
+        self.assertEqual((config.system_instruction, config.cached_content), (PROMPT, None))
+
+    @patch("src.extract.google_.MIN_CACHE_TOKENS", 100)
+    def test_prompt_with_too_few_tokens_is_counted_once_and_sent_inline(self, client: Mock):
+        self.configure(client, prompt_tokens=80)
+
+        extract_bookings_from_bytes(b"image-1", "image/png")
+        extract_bookings_from_bytes(b"image-2", "image/png")
+
+        client.caches.create.assert_not_called()
+        client.models.count_tokens.assert_called_once()
+
+    @patch("src.extract.google_.MIN_CACHE_TOKENS", 100)
+    def test_prompt_is_sent_inline_if_caching_fails(self, client: Mock):
+        self.configure(client, prompt_tokens=150)
+        client.caches.create.side_effect = ConnectionError("network down")
+
+        extract_bookings_from_bytes(b"image-1", "image/png")
+
+        config = client.models.generate_content.call_args.kwargs["config"]
+        self.assertEqual((config.system_instruction, config.cached_content), (PROMPT, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
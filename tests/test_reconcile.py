@@ -0,0 +1,170 @@
+import datetime
+import unittest
+from unittest.mock import Mock, patch
+
+from src.bookings import Booking, Bookings
+from src.daterange import DateRange
+from src.gcal import CALENDAR_ID, booking_to_event
+from src.reconcile import ReconciledRange, SourcedBookings, reconcile, reconcile_source, resolve_overlaps
+from src.sources import get_source
+from tests import FakeCalendarService
+
+
+def booking(day: int, event_type: str | None = "Athletics Track") -> Booking:
+    return Booking(date=datetime.date(2026, 4, day), time="ALL DAY", event_type=event_type)
+
+
+def source(source_id: str, hour: int, *bookings: Booking) -> SourcedBookings:
+    return SourcedBookings(
+        source_id=source_id,
+        s3_url=None,
+        bookings=Bookings(bookings=list(bookings)),
+        published_at=datetime.datetime(2026, 4, 1, hour, tzinfo=datetime.UTC),
+    )
+
+
+class ResolveOverlapsTests(unittest.TestCase):
+    def test_newest_source_wins_every_date_in_its_range(self):
+        old = source("old", 1, booking(1), booking(5, "old"), booking(10))
+        new = source("new", 2, booking(4), booking(6))
+
+        resolved = resolve_overlaps([new, old])
+
+        self.assertEqual(
+            [(b.date.day, s.source_id) for b, s in resolved.bookings],
+            [(4, "new"), (6, "new"), (1, "old"), (10, "old")],
+        )
+        self.assertEqual(len(resolved.dates), 10)
+
+    def test_dates_of_a_newer_reconciled_image_are_left_out(self):
+        old = source("old", 1, booking(1), booking(5), booking(10))
+        newer = ReconciledRange(
+            DateRange.inclusive(datetime.date(2026, 4, 4), datetime.date(2026, 4, 6)),
+            datetime.datetime(2026, 4, 1, 2, tzinfo=datetime.UTC),
+        )
+        older = ReconciledRange(
+            DateRange.inclusive(datetime.date(2026, 4, 9), datetime.date(2026, 4, 12)),
+            datetime.datetime(2026, 4, 1, 0, tzinfo=datetime.UTC),
+        )
+
+        resolved = resolve_overlaps([old], [newer, older])
+
+        self.assertEqual([b.date.day for b, _ in resolved.bookings], [1, 10])
+        self.assertEqual(sorted(d.day for d in resolved.dates), [1, 2, 3, 7, 8, 9, 10])
+
+
+class ReconcileTests(unittest.TestCase):
+    @patch("src.reconcile.insert_events")
+    @patch("src.reconcile.delete_events")
+    @patch("src.reconcile.list_events")
+    def test_reconcile_lists_once_and_only_touches_covered_dates(
+        self, mock_list_events: Mock, mock_delete_events: Mock, mock_insert_events: Mock
+    ):
+        keep, stale, outside = booking(2), booking(3, "stale"), booking(20)
+        mock_list_events.return_value = [
+            {**booking_to_event(keep), "id": "keep"},
+            {**booking_to_event(keep), "id": "duplicate"},
+            {**booking_to_event(stale), "id": "stale"},
+            {**booking_to_event(outside), "id": "outside"},
+        ]
+        mock_insert_events.side_effect = lambda events, calendar_id: [
+            {**event, "id": f"new-{i}"} for i, event in enumerate(events)
+        ]
+
+        created = reconcile([source("a", 1, booking(1), keep, booking(3)), source("b", 2, booking(25), booking(30))])
+
+        mock_list_events.assert_called_once_with(
+            DateRange(datetime.date(2026, 4, 1), datetime.date(2026, 5, 1)), CALENDAR_ID
+        )
+        mock_delete_events.assert_called_once_with(["duplicate", "stale"], calendar_id=CALENDAR_ID)
+        self.assertEqual(created, {"a": ["new-0", "new-1"], "b": ["new-2", "new-3"]})
+
+    @patch("src.reconcile.insert_events")
+    @patch("src.reconcile.delete_events")
+    @patch("src.reconcile.list_events")
+    def test_reconcile_splits_long_spans_into_month_windows(
+        self, mock_list_events: Mock, mock_delete_events: Mock, mock_insert_events: Mock
+    ):
+        mock_list_events.return_value = []
+        mock_insert_events.side_effect = lambda events, calendar_id: [
+            {**event, "id": event["start"]["date"]} for event in events
+        ]
+        long_season = Bookings(
+            bookings=[
+                Booking(date=datetime.date(2026, 4, 9), time="ALL DAY"),
+                Booking(date=datetime.date(2026, 5, 9), time="ALL DAY"),
+                Booking(date=datetime.date(2026, 9, 30), time="ALL DAY"),
+            ]
+        )
+
+        created = reconcile([SourcedBookings("season", None, long_season, datetime.datetime(2026, 4, 1))])
+
+        self.assertEqual(
+            [str(call.args[0]) for call in mock_list_events.call_args_list],
+            [
+                "2026-04-09 to 2026-04-30",
+                "2026-05-01 to 2026-05-31",
+                "2026-06-01 to 2026-06-30",
+                "2026-07-01 to 2026-07-31",
+                "2026-08-01 to 2026-08-31",
+                "2026-09-01 to 2026-09-30",
+            ],
+        )
+        self.assertEqual(created, {"season": ["2026-04-09", "2026-05-09", "2026-09-30"]})
+
+    def test_reconcile_source_only_reads_and_replaces_its_own_events(self):
+        old_a, kept_a, other_b = booking(1), booking(2), booking(2, "other")
+        service = FakeCalendarService(
+            [
+                booking_to_event(old_a, source_id="a"),
+                booking_to_event(kept_a, source_id="a"),
+                booking_to_event(other_b, source_id="b"),
+            ]
+        )
+
+        with patch("src.gcal.get_client", return_value=service):
+            created = reconcile_source(source("a", 3, kept_a, booking(3)))
+
+        self.assertEqual([call["privateExtendedProperty"] for call in service.list_calls], ["source_id=a"])
+        self.assertEqual(created, [booking_to_event(booking(3))["id"]])
+        self.assertEqual(
+            sorted(
+                (e["start"]["date"], e["extendedProperties"]["private"]["source_id"])
+                for e in service.events_by_id.values()
+            ),
+            [("2026-04-02", "a"), ("2026-04-02", "b"), ("2026-04-03", "a")],
+        )
+
+    def test_reconcile_source_reads_its_events_with_the_source_lister(self):
+        old_a = booking_to_event(booking(1), source_id="a")
+        service = FakeCalendarService([old_a])
+        source_lister = Mock(return_value=[old_a])
+
+        with patch("src.gcal.get_client", return_value=service):
+            reconcile_source(source("a", 3, booking(3)), source_lister=source_lister)
+
+        source_lister.assert_called_once_with("a")
+        self.assertEqual(service.list_calls, [])
+        self.assertEqual([e["start"]["date"] for e in service.events_by_id.values()], ["2026-04-03"])
+
+    def test_events_are_labelled_for_the_source(self):
+        service = FakeCalendarService()
+        tennis = SourcedBookings(
+            source_id="tennis-image",
+            s3_url=None,
+            bookings=Bookings(bookings=[booking(1, event_type=None)]),
+            published_at=datetime.datetime(2026, 4, 1, tzinfo=datetime.UTC),
+            labels=get_source("tennis").labels,
+        )
+
+        with patch("src.gcal.get_client", return_value=service):
+            reconcile_source(tennis)
+
+        (event,) = service.events_by_id.values()
+        self.assertEqual(event["summary"], "BPMA Tennis courts booked (ALL DAY)")
+        self.assertIn("<h3>BPMA Tennis Booking</h3>", event["description"])
+        self.assertNotIn("Track", event["description"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import datetime
+import io
+import unittest
+from unittest.mock import Mock
+
+from PIL import Image, ImageDraw, ImageFont
+
+from src.bookings import Booking, Bookings
+from src.manifest import Manifest, ManifestEntry, ProcessingStatus
+from src.regions import extract_changes, find_previous_version
+
+FONT = ImageFont.load_default(size=24)
+ROW_HEIGHT = 60
+
+
+def schedule_image(rows: list[str]) -> bytes:
+    image = Image.new("RGB", (800, ROW_HEIGHT * (len(rows) + 2)), "white")
+    draw = ImageDraw.Draw(image)
+    draw.text((20, 20), "Athletics Track Bookings April 2026", fill="black", font=FONT)
+    for i, row in enumerate(rows, start=2):
+        draw.line((0, i * ROW_HEIGHT, 800, i * ROW_HEIGHT), fill="grey")
+        draw.text((20, i * ROW_HEIGHT + 15), row, fill="black", font=FONT)
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return out.getvalue()
+
+
+def booking(day: int, time: str = "ALL DAY") -> Booking:
+    return Booking(date=datetime.date(2026, 4, day), time=time)
+
+
+class ExtractChangesTests(unittest.TestCase):
+    def setUp(self):
+        self.rows = [f"Thursday {day} April  ALL DAY" for day in range(1, 11)]
+        self.previous = Bookings(bookings=[booking(day) for day in range(1, 11)])
+
+    def test_only_the_edited_row_is_extracted_from_both_versions(self):
+        edited = self.rows[:4] + ["Sunday 5 April  CLOSED"] + self.rows[5:]
+        extract = Mock(side_effect=[Bookings(bookings=[booking(5)]), Bookings(bookings=[booking(5, "CLOSED")])])
+
+        merged = extract_changes(schedule_image(self.rows), schedule_image(edited), self.previous, extract)
+
+        self.assertEqual(extract.call_count, 2)
+        with Image.open(io.BytesIO(extract.call_args.args[0])) as crop:
+            self.assertLess(crop.height, ROW_HEIGHT * 4)
+        self.assertEqual(
+            [(b.date.day, b.time) for b in merged.bookings],
+            [(day, "ALL DAY") for day in range(1, 11) if day != 5] + [(5, "CLOSED")],
+        )
+
+    def test_falls_back_when_old_region_disagrees_with_previous_result(self):
+        edited = self.rows[:4] + ["Sunday 5 April  CLOSED"] + self.rows[5:]
+        extract = Mock(side_effect=[Bookings(bookings=[booking(5, "09:00")]), Bookings(bookings=[])])
+
+        self.assertIsNone(extract_changes(schedule_image(self.rows), schedule_image(edited), self.previous, extract))
+
+    def test_falls_back_when_old_region_is_empty_or_row_counts_differ(self):
+        edited = self.rows[:4] + ["Sunday 5 April  CLOSED"] + self.rows[5:]
+        for old_bookings, new_bookings in (
+            ([], [booking(5, "CLOSED")]),
+            ([booking(5)], [booking(5, "CLOSED"), booking(6, "CLOSED")]),
+        ):
+            with self.subTest(old=old_bookings, new=new_bookings):
+                extract = Mock(side_effect=[Bookings(bookings=old_bookings), Bookings(bookings=new_bookings)])
+                self.assertIsNone(
+                    extract_changes(schedule_image(self.rows), schedule_image(edited), self.previous, extract)
+                )
+
+    def test_falls_back_when_most_rows_change(self):
+        extract = Mock()
+        edited = [row.replace("ALL DAY", "CLOSED") for row in self.rows]
+
+        self.assertIsNone(extract_changes(schedule_image(self.rows), schedule_image(edited), self.previous, extract))
+        extract.assert_not_called()
+
+    def test_falls_back_when_too_many_separate_bands_change(self):
+        extract = Mock()
+        edited = [row.replace("ALL DAY", "CLOSED") if day % 3 == 0 else row for day, row in enumerate(self.rows)]
+
+        self.assertIsNone(extract_changes(schedule_image(self.rows), schedule_image(edited), self.previous, extract))
+        extract.assert_not_called()
+
+
+class FindPreviousVersionTests(unittest.TestCase):
+    def test_prefers_the_same_asset_path_over_a_newer_schedule_on_the_same_page(self):
+        def entry(days_ago: int, url_path: str, status: ProcessingStatus | None = ProcessingStatus.COMPLETED):
+            created_at = datetime.datetime(2026, 4, 30, tzinfo=datetime.UTC) - datetime.timedelta(days=days_ago)
+            return ManifestEntry(
+                key=f"{url_path}.png",
+                status=status,
+                phash="0",
+                source="athletics-track",
+                url_path=url_path,
+                created_at=created_at,
+            )
+
+        manifest = Manifest(
+            entries={
+                "april-v1": entry(3, "/april.png"),
+                "may-v1": entry(1, "/may.png"),
+                "april-v2": entry(0, "/april.png", status=None),
+            }
+        )
+
+        self.assertEqual(find_previous_version(manifest, "april-v2"), "april-v1")
+
+
+if __name__ == "__main__":
+    unittest.main()
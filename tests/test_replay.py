@@ -0,0 +1,68 @@
+import datetime
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from src.bookings import Booking, Bookings
+from src.extract.google_ import TENNIS_PROMPT, extract_bookings_from_bytes
+from src.extract.replay import RecordingNotFound, ReplayMode, ResponseRecorder
+
+
+def sample_bookings() -> Bookings:
+    return Bookings(bookings=[Booking(date=datetime.date(2026, 4, 9), time="ALL DAY")])
+
+
+class ReplayTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.recorder = ResponseRecorder(Path(directory.name))
+        recorder_patcher = patch("src.extract.google_.recorder", self.recorder)
+        recorder_patcher.start()
+        self.addCleanup(recorder_patcher.stop)
+        caching_patcher = patch("src.extract.google_.CONTEXT_CACHING", False)
+        caching_patcher.start()
+        self.addCleanup(caching_patcher.stop)
+        client_patcher = patch("src.extract.google_.client")
+        self.client = client_patcher.start()
+        self.addCleanup(client_patcher.stop)
+        self.client.models.generate_content.return_value = Mock(parsed=sample_bookings(), usage_metadata=None)
+
+    def test_recorded_response_is_replayed_without_calling_the_model(self):
+        self.recorder.mode = ReplayMode.RECORD
+        self.assertEqual(extract_bookings_from_bytes(b"image", "image/png"), sample_bookings())
+        self.assertEqual(extract_bookings_from_bytes(b"image", "image/png"), sample_bookings())
+        self.assertEqual(self.client.models.generate_content.call_count, 1)
+
+        self.recorder.mode = ReplayMode.REPLAY
+        self.assertEqual(extract_bookings_from_bytes(b"image", "image/png"), sample_bookings())
+        self.assertEqual(self.client.models.generate_content.call_count, 1)
+
+    def test_replay_misses_on_a_different_image_prompt_or_sample(self):
+        self.recorder.mode = ReplayMode.RECORD
+        extract_bookings_from_bytes(b"image", "image/png")
+
+        self.recorder.mode = ReplayMode.REPLAY
+        with self.assertRaises(RecordingNotFound):
+            extract_bookings_from_bytes(b"other image", "image/png")
+        with self.assertRaises(RecordingNotFound):
+            extract_bookings_from_bytes(b"image", "image/png", TENNIS_PROMPT)
+        self.recorder.sample = 1
+        with self.assertRaises(RecordingNotFound):
+            extract_bookings_from_bytes(b"image", "image/png")
+
+    def test_refresh_overwrites_the_recording(self):
+        self.recorder.mode = ReplayMode.RECORD
+        extract_bookings_from_bytes(b"image", "image/png")
+        self.client.models.generate_content.return_value = Mock(parsed=None, usage_metadata=None)
+
+        self.recorder.mode = ReplayMode.REFRESH
+        self.assertIsNone(extract_bookings_from_bytes(b"image", "image/png"))
+        self.recorder.mode = ReplayMode.REPLAY
+        self.assertIsNone(extract_bookings_from_bytes(b"image", "image/png"))
+        self.assertEqual(self.client.models.generate_content.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
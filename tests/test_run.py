@@ -1,35 +1,19 @@
 import datetime
 import hashlib
+import tempfile
 import unittest
+from pathlib import Path
 from unittest.mock import Mock, patch
 
 from src.bookings import Booking, Bookings
+from src.dedup import save_result
+from src.extract.google_ import get_media_from_bytes, get_replay_request
+from src.extract.replay import RecordingNotFound, ReplayMode, ResponseRecorder
+from src.manifest import Manifest, ManifestEntry
 from src.run import ContentStoreResult, ProcessingStatus, get_content_store_s3, run
-
-
-class FakeS3Client:
-    class exceptions:
-        class ClientError(Exception):
-            def __init__(self, error_code: str):
-                self.response = {"Error": {"Code": error_code}}
-
-    def __init__(self, should_exist: bool = False, tag_set: list[dict[str, str]] | None = None):
-        self.should_exist = should_exist
-        self.tag_set = tag_set or []
-        self.put_calls = []
-        self.put_tagging_calls = []
-
-    def put_object(self, **kwargs):
-        self.put_calls.append(kwargs)
-        if self.should_exist:
-            raise self.exceptions.ClientError("PreconditionFailed")
-
-    def get_object_tagging(self, **kwargs):
-        return {"TagSet": self.tag_set}
-
-    def put_object_tagging(self, **kwargs):
-        self.put_tagging_calls.append(kwargs)
-        self.tag_set = kwargs["Tagging"]["TagSet"]
+from src.sources import ATHLETICS_TRACK
+from src.usage import Usage
+from tests import FakeCalendarService, FakeS3Client
 
 
 def sample_bookings() -> Bookings:
@@ -49,6 +33,22 @@ class RunTests(unittest.TestCase):
         self.bucket_patcher = patch("src.run.BUCKET", "test-bucket")
         self.bucket_patcher.start()
         self.addCleanup(self.bucket_patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.recorder = ResponseRecorder(Path(directory.name), ReplayMode.REPLAY)
+        recorder_patcher = patch("src.extract.google_.recorder", self.recorder)
+        recorder_patcher.start()
+        self.addCleanup(recorder_patcher.stop)
+        get_patcher = patch("src.extract.google_.requests.get")
+        self.get = get_patcher.start()
+        self.get.side_effect = lambda url: Mock(content=url.encode(), headers={"content-type": "image/png"})
+        self.addCleanup(get_patcher.stop)
+
+    def record(self, url: str, bookings: Bookings) -> None:
+        """Record `bookings` as the model's response to the image at `url`, whose bytes are the URL itself."""
+        part = get_media_from_bytes(url.encode(), "image/png")
+        request = {**get_replay_request(part, ATHLETICS_TRACK.prompt.text), "sample": 0}
+        self.recorder.record(request, bookings, Usage())
 
     @patch("src.run.requests.get")
     @patch("src.run.boto3.client")
@@ -57,7 +57,9 @@ class RunTests(unittest.TestCase):
         expected_id = hashlib.sha256(content).hexdigest()
         fake_client = FakeS3Client(
             should_exist=True,
-            tag_set=[{"Key": "processing_status", "Value": "completed"}],
+            manifest=Manifest(
+                entries={expected_id: ManifestEntry(key=f"{expected_id}.png", status=ProcessingStatus.COMPLETED)}
+            ),
         )
         mock_boto_client.return_value = fake_client
         mock_get.return_value.content = content
@@ -75,11 +77,11 @@ class RunTests(unittest.TestCase):
                 processing_status=ProcessingStatus.COMPLETED,
             ),
         )
-        self.assertEqual(fake_client.put_tagging_calls, [])
+        self.assertEqual(fake_client.manifest_puts, [])
 
     @patch("src.run.requests.get")
     @patch("src.run.boto3.client")
-    def test_get_content_store_s3_retries_when_existing_object_is_untagged(
+    def test_get_content_store_s3_retries_when_existing_object_has_no_status(
         self, mock_boto_client: Mock, mock_get: Mock
     ):
         content = b"image-bytes"
@@ -92,7 +94,7 @@ class RunTests(unittest.TestCase):
 
         self.assertTrue(result.should_process)
         self.assertIsNone(result.processing_status)
-        self.assertEqual(fake_client.put_tagging_calls, [])
+        self.assertEqual(fake_client.manifest_puts, [])
 
     @patch("src.run.requests.get")
     @patch("src.run.boto3.client")
@@ -101,7 +103,9 @@ class RunTests(unittest.TestCase):
         expected_id = hashlib.sha256(content).hexdigest()
         fake_client = FakeS3Client(
             should_exist=True,
-            tag_set=[{"Key": "processing_status", "Value": "failed"}],
+            manifest=Manifest(
+                entries={expected_id: ManifestEntry(key=f"{expected_id}.png", status=ProcessingStatus.FAILED)}
+            ),
         )
         mock_boto_client.return_value = fake_client
         mock_get.return_value.content = content
@@ -119,27 +123,23 @@ class RunTests(unittest.TestCase):
                 processing_status=ProcessingStatus.FAILED,
             ),
         )
-        self.assertEqual(fake_client.put_tagging_calls, [])
+        self.assertEqual(fake_client.manifest_puts, [])
 
     @patch("src.run.boto3.client")
-    @patch("src.run.push_bookings_to_calendar")
-    @patch("src.run.increment_bookings")
-    @patch("src.run.extract_bookings_from_url")
+    @patch("src.run.reconcile")
     @patch("src.run.get_content_store_s3")
-    @patch("src.run.get_img_urls")
+    @patch("src.run.get_source_img_urls")
     def test_run_marks_completed_after_success(
         self,
-        mock_get_img_urls: Mock,
+        mock_get_source_img_urls: Mock,
         mock_get_content_store_s3: Mock,
-        mock_extract_bookings_from_url: Mock,
-        mock_increment_bookings: Mock,
-        mock_push_bookings_to_calendar: Mock,
+        mock_reconcile: Mock,
         mock_boto_client: Mock,
     ):
         bookings = sample_bookings()
         fake_client = FakeS3Client()
         mock_boto_client.return_value = fake_client
-        mock_get_img_urls.return_value = ["https://example.com/image.png"]
+        mock_get_source_img_urls.return_value = [(ATHLETICS_TRACK, "https://example.com/image.png")]
         mock_get_content_store_s3.return_value = ContentStoreResult(
             id_="source-id",
             key="source-id.png",
@@ -147,35 +147,62 @@ class RunTests(unittest.TestCase):
             should_process=True,
             processing_status=None,
         )
-        mock_extract_bookings_from_url.return_value = bookings
-        mock_increment_bookings.return_value = bookings
+        self.record("https://example.com/image.png", bookings)
+        mock_reconcile.return_value = {"source-id": ["event-1"]}
 
         run()
 
-        mock_push_bookings_to_calendar.assert_called_once_with(
-            bookings,
-            "source-id",
-            "https://bucket.s3.amazonaws.com/source-id.png",
-        )
+        mock_reconcile.assert_called_once()
+        (source,) = mock_reconcile.call_args.args[0]
         self.assertEqual(
-            fake_client.put_tagging_calls[-1]["Tagging"]["TagSet"],
-            [{"Key": "processing_status", "Value": "completed"}],
+            (source.source_id, source.s3_url, source.bookings),
+            ("source-id", "https://bucket.s3.amazonaws.com/source-id.png", bookings),
         )
-        self.assertEqual(fake_client.put_tagging_calls[-1]["Key"], "source-id.png")
+        entry = fake_client.get_manifest().entries["source-id"]
+        self.assertEqual(entry.status, ProcessingStatus.COMPLETED)
+        self.assertEqual(entry.key, "source-id.png")
+        self.assertEqual(entry.booking_count, 1)
+        self.assertEqual(entry.from_date, datetime.date(2026, 4, 9))
+        self.assertEqual(entry.event_ids, ["event-1"])
 
     @patch("src.run.boto3.client")
-    @patch("src.run.push_bookings_to_calendar")
-    @patch("src.run.increment_bookings")
-    @patch("src.run.extract_bookings_from_url")
+    @patch("src.run.reconcile")
     @patch("src.run.get_content_store_s3")
-    @patch("src.run.get_img_urls")
-    def test_run_processes_multiple_images_in_order(
+    @patch("src.run.get_source_img_urls")
+    def test_run_reuses_the_saved_result_of_a_pending_image(
         self,
-        mock_get_img_urls: Mock,
+        mock_get_source_img_urls: Mock,
         mock_get_content_store_s3: Mock,
-        mock_extract_bookings_from_url: Mock,
-        mock_increment_bookings: Mock,
-        mock_push_bookings_to_calendar: Mock,
+        mock_reconcile: Mock,
+        mock_boto_client: Mock,
+    ):
+        fake_client = FakeS3Client()
+        save_result(fake_client, "test-bucket", "source-id", sample_bookings())
+        mock_boto_client.return_value = fake_client
+        mock_get_source_img_urls.return_value = [(ATHLETICS_TRACK, "https://example.com/image.png")]
+        mock_get_content_store_s3.return_value = ContentStoreResult(
+            id_="source-id",
+            key="source-id.png",
+            s3_url="https://bucket.s3.amazonaws.com/source-id.png",
+            should_process=True,
+            processing_status=ProcessingStatus.PENDING,
+        )
+        mock_reconcile.return_value = {"source-id": ["event-1"]}
+
+        run()
+
+        self.get.assert_not_called()
+        self.assertEqual(mock_reconcile.call_args.args[0][0].bookings, sample_bookings())
+
+    @patch("src.run.boto3.client")
+    @patch("src.run.reconcile")
+    @patch("src.run.get_content_store_s3")
+    @patch("src.run.get_source_img_urls")
+    def test_run_reconciles_all_images_together(
+        self,
+        mock_get_source_img_urls: Mock,
+        mock_get_content_store_s3: Mock,
+        mock_reconcile: Mock,
         mock_boto_client: Mock,
     ):
         first_bookings = sample_bookings()
@@ -188,13 +215,11 @@ class RunTests(unittest.TestCase):
                 )
             ]
         )
-        first_incremented = sample_bookings()
-        second_incremented = sample_bookings()
         fake_client = FakeS3Client()
         mock_boto_client.return_value = fake_client
-        mock_get_img_urls.return_value = [
-            "https://example.com/april.png",
-            "https://example.com/may.jpg",
+        mock_get_source_img_urls.return_value = [
+            (ATHLETICS_TRACK, "https://example.com/april.png"),
+            (ATHLETICS_TRACK, "https://example.com/may.jpg"),
         ]
         mock_get_content_store_s3.side_effect = [
             ContentStoreResult(
@@ -212,8 +237,9 @@ class RunTests(unittest.TestCase):
                 processing_status=None,
             ),
         ]
-        mock_extract_bookings_from_url.side_effect = [first_bookings, second_bookings]
-        mock_increment_bookings.side_effect = [first_incremented, second_incremented]
+        self.record("https://example.com/april.png", first_bookings)
+        self.record("https://example.com/may.jpg", second_bookings)
+        mock_reconcile.return_value = {"may-id": ["event-1"]}
 
         run()
 
@@ -222,36 +248,32 @@ class RunTests(unittest.TestCase):
             ["https://example.com/april.png", "https://example.com/may.jpg"],
         )
         self.assertEqual(
-            [call.args[0] for call in mock_extract_bookings_from_url.call_args_list],
+            [call.args[0] for call in self.get.call_args_list],
             ["https://example.com/april.png", "https://example.com/may.jpg"],
         )
+        mock_reconcile.assert_called_once()
         self.assertEqual(
-            mock_push_bookings_to_calendar.call_args_list[0].args,
-            (first_incremented, "april-id", "https://bucket.s3.amazonaws.com/april-id.png"),
-        )
-        self.assertEqual(
-            mock_push_bookings_to_calendar.call_args_list[1].args,
-            (second_incremented, "may-id", "https://bucket.s3.amazonaws.com/may-id.jpg"),
-        )
-        self.assertEqual(
-            [call["Key"] for call in fake_client.put_tagging_calls],
-            ["april-id.png", "may-id.jpg"],
+            [(source.source_id, source.bookings) for source in mock_reconcile.call_args.args[0]],
+            [("april-id", first_bookings), ("may-id", second_bookings)],
         )
+        entries = fake_client.get_manifest().entries
+        self.assertEqual([entry.key for entry in entries.values()], ["april-id.png", "may-id.jpg"])
+        self.assertEqual([entry.status for entry in entries.values()], [ProcessingStatus.COMPLETED] * 2)
+        self.assertEqual(entries["april-id"].event_ids, [])
+        self.assertEqual(entries["may-id"].event_ids, ["event-1"])
 
     @patch("src.run.boto3.client")
-    @patch("src.run.extract_bookings_from_url")
     @patch("src.run.get_content_store_s3")
-    @patch("src.run.get_img_urls")
+    @patch("src.run.get_source_img_urls")
     def test_run_marks_failed_when_processing_raises(
         self,
-        mock_get_img_urls: Mock,
+        mock_get_source_img_urls: Mock,
         mock_get_content_store_s3: Mock,
-        mock_extract_bookings_from_url: Mock,
         mock_boto_client: Mock,
     ):
         fake_client = FakeS3Client()
         mock_boto_client.return_value = fake_client
-        mock_get_img_urls.return_value = ["https://example.com/image.png"]
+        mock_get_source_img_urls.return_value = [(ATHLETICS_TRACK, "https://example.com/image.png")]
         mock_get_content_store_s3.return_value = ContentStoreResult(
             id_="source-id",
             key="source-id.png",
@@ -259,34 +281,65 @@ class RunTests(unittest.TestCase):
             should_process=True,
             processing_status=ProcessingStatus.FAILED,
         )
-        mock_extract_bookings_from_url.side_effect = RuntimeError("boom")
 
-        with self.assertRaises(RuntimeError):
+        with self.assertRaises(RecordingNotFound):
             run()
 
-        self.assertEqual(
-            fake_client.put_tagging_calls[-1]["Tagging"]["TagSet"],
-            [{"Key": "processing_status", "Value": "failed"}],
-        )
-        self.assertEqual(fake_client.put_tagging_calls[-1]["Key"], "source-id.png")
+        entry = fake_client.get_manifest().entries["source-id"]
+        self.assertEqual(entry.status, ProcessingStatus.FAILED)
+        self.assertEqual(entry.key, "source-id.png")
+
+    @patch("src.run.boto3.client")
+    @patch("src.run.reconcile")
+    @patch("src.run.get_content_store_s3")
+    @patch("src.run.get_source_img_urls")
+    def test_run_reconciles_remaining_images_when_one_fails(
+        self,
+        mock_get_source_img_urls: Mock,
+        mock_get_content_store_s3: Mock,
+        mock_reconcile: Mock,
+        mock_boto_client: Mock,
+    ):
+        fake_client = FakeS3Client()
+        mock_boto_client.return_value = fake_client
+        mock_get_source_img_urls.return_value = [
+            (ATHLETICS_TRACK, "https://example.com/bad.png"),
+            (ATHLETICS_TRACK, "https://example.com/good.png"),
+        ]
+        mock_get_content_store_s3.side_effect = [
+            ContentStoreResult(
+                id_=id_,
+                key=f"{id_}.png",
+                s3_url=f"https://bucket.s3.amazonaws.com/{id_}.png",
+                should_process=True,
+                processing_status=None,
+            )
+            for id_ in ["bad-id", "good-id"]
+        ]
+        self.record("https://example.com/good.png", sample_bookings())
+        mock_reconcile.return_value = {}
+
+        with self.assertRaises(RecordingNotFound):
+            run()
+
+        self.assertEqual([source.source_id for source in mock_reconcile.call_args.args[0]], ["good-id"])
+        entries = fake_client.get_manifest().entries
+        self.assertEqual(entries["bad-id"].status, ProcessingStatus.FAILED)
+        self.assertEqual(entries["good-id"].status, ProcessingStatus.COMPLETED)
 
     @patch("src.run.boto3.client")
-    @patch("src.run.push_bookings_to_calendar")
-    @patch("src.run.increment_bookings")
-    @patch("src.run.extract_bookings_from_url")
+    @patch("src.run.reconcile")
     @patch("src.run.get_content_store_s3")
-    @patch("src.run.get_img_urls")
+    @patch("src.run.get_source_img_urls")
     def test_run_skips_completed_content(
         self,
-        mock_get_img_urls: Mock,
+        mock_get_source_img_urls: Mock,
         mock_get_content_store_s3: Mock,
-        mock_extract_bookings_from_url: Mock,
-        mock_increment_bookings: Mock,
-        mock_push_bookings_to_calendar: Mock,
+        mock_reconcile: Mock,
         mock_boto_client: Mock,
     ):
         mock_boto_client.return_value = FakeS3Client()
-        mock_get_img_urls.return_value = ["https://example.com/image.png"]
+        mock_get_source_img_urls.return_value = [(ATHLETICS_TRACK, "https://example.com/image.png")]
         mock_get_content_store_s3.return_value = ContentStoreResult(
             id_="source-id",
             key="source-id.png",
@@ -297,9 +350,32 @@ class RunTests(unittest.TestCase):
 
         run()
 
-        mock_extract_bookings_from_url.assert_not_called()
-        mock_increment_bookings.assert_not_called()
-        mock_push_bookings_to_calendar.assert_not_called()
+        self.get.assert_not_called()
+        mock_reconcile.assert_not_called()
+
+    @patch("src.gcal.get_client")
+    @patch("src.run.boto3.client")
+    @patch("src.run.get_source_img_urls")
+    def test_newest_upload_wins_overlapping_dates(
+        self, mock_get_source_img_urls: Mock, mock_boto_client: Mock, mock_get_client: Mock
+    ):
+        old_url = "https://images.squarespace-cdn.com/content/1700000000000-A/athletics-track-bookings.png"
+        new_url = "https://images.squarespace-cdn.com/content/1800000000000-B/athletics-track-bookings.png"
+        for url, event_type in [(old_url, "OLD"), (new_url, "NEW")]:
+            self.record(
+                url, Bookings(bookings=[Booking(date=datetime.date(2026, 4, 9), time="ALL DAY", event_type=event_type)])
+            )
+        fake_client = FakeS3Client()
+        mock_boto_client.return_value = fake_client
+        service = FakeCalendarService()
+        mock_get_client.return_value = service
+        mock_get_source_img_urls.return_value = [(ATHLETICS_TRACK, old_url), (ATHLETICS_TRACK, new_url)]
+
+        run()
+
+        self.assertEqual([event["summary"] for event in service.events_by_id.values()], ["NEW (ALL DAY)"])
+        entries = fake_client.get_manifest().entries.values()
+        self.assertEqual(sorted(entry.uploaded_at.year for entry in entries if entry.uploaded_at), [2023, 2027])
 
 
 if __name__ == "__main__":
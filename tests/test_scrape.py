@@ -0,0 +1,40 @@
+import unittest
+from pathlib import Path
+
+from src.scrape import URL, best_img_url, is_booking_url, normalise_url, scan_img_urls, upload_time
+
+FIXTURE = Path(__file__).parent / "fixtures" / "squarespace_page.html"
+CDN = "https://images.squarespace-cdn.com/content/v1/5f1a2b3c4d5e6f7a8b9c0d1e"
+
+
+class ScrapeTests(unittest.TestCase):
+    def test_scan_finds_lazy_loaded_images_once_at_full_resolution(self):
+        urls = [url for url in scan_img_urls(FIXTURE.read_text(), URL) if is_booking_url(url)]
+
+        self.assertEqual(
+            urls,
+            [
+                f"{CDN}/1600000000100-ABCDEF0100/Athletics+Track+Bookings+April+2026.png",
+                f"{CDN}/1600000000101-ABCDEF0101/Athletics+Track+Bookings+May+2026.png",
+                f"{CDN}/1600000000102-ABCDEF0102/athletics-track-bookings-june-2026.jpg",
+            ],
+        )
+
+    def test_best_img_url_prefers_widest_srcset_over_placeholder_src(self):
+        attrs = {"src": "data:image/gif;base64,R0lGOD", "srcset": "a.png?format=300w 300w, a.png?format=2500w 2500w"}
+
+        self.assertEqual(best_img_url(attrs), "a.png?format=2500w")
+
+    def test_normalise_url_resolves_relative_urls_and_drops_resize_params(self):
+        self.assertEqual(
+            normalise_url("//images.example.com/a.png?format=750w&v=2#top", URL),
+            "https://images.example.com/a.png?v=2",
+        )
+
+    def test_upload_time_reads_the_squarespace_upload_folder(self):
+        self.assertEqual(upload_time(f"{CDN}/1600000000101-ABCDEF0101/Athletics+Track+Bookings.png"), 1600000000101)
+        self.assertEqual(upload_time("https://example.com/image.png"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from src.sources import ATHLETICS_TRACK, Source, get_source, get_source_img_urls
+
+TENNIS = Source(
+    name="tennis",
+    url=ATHLETICS_TRACK.url,
+    keywords=("tennis",),
+    prompt=ATHLETICS_TRACK.prompt,
+    calendar_id="tennis-calendar",
+)
+GYM = Source(
+    name="gym",
+    url="https://example.com/gym",
+    keywords=("gym",),
+    prompt=ATHLETICS_TRACK.prompt,
+    calendar_id="gym-calendar",
+)
+
+
+class SourcesTests(unittest.TestCase):
+    @patch("src.sources.get_page_img_urls")
+    def test_get_source_img_urls_fetches_each_page_once_and_matches_per_source(self, mock_get_page_img_urls: Mock):
+        pages = {
+            ATHLETICS_TRACK.url: ["https://cdn/Athletics+Track+Bookings.png", "https://cdn/Tennis+Courts.png"],
+            GYM.url: ["https://cdn/gym-timetable.png", "https://cdn/logo.png"],
+        }
+        mock_get_page_img_urls.side_effect = pages.__getitem__
+
+        img_urls = get_source_img_urls([ATHLETICS_TRACK, TENNIS, GYM])
+
+        self.assertEqual(sorted(call.args[0] for call in mock_get_page_img_urls.call_args_list), sorted(pages))
+        self.assertEqual(
+            [(source.name, url) for source, url in img_urls],
+            [
+                ("athletics-track", "https://cdn/Athletics+Track+Bookings.png"),
+                ("tennis", "https://cdn/Tennis+Courts.png"),
+                ("gym", "https://cdn/gym-timetable.png"),
+            ],
+        )
+
+    def test_get_source_defaults_to_athletics_track(self):
+        self.assertIs(get_source(None), ATHLETICS_TRACK)
+        with self.assertRaises(ValueError):
+            get_source("unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
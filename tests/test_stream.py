@@ -0,0 +1,108 @@
+import datetime
+import tempfile
+import unittest
+from collections.abc import Iterator
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from google import genai
+
+from src.bookings import Booking, Bookings, FromToTime
+from src.extract.google_ import extract_bookings_from_bytes
+from src.extract.replay import ResponseRecorder
+from src.extract.stream import MAX_REPEATS, BookingsStreamParser, StreamAborted
+
+BOOKINGS = Bookings(
+    bookings=[
+        Booking(
+            day="Thursday",
+            date=datetime.date(2026, 4, 9),
+            time=FromToTime(start=datetime.time(18), end=datetime.time(20)),
+            event_type='Club night {"juniors"}',
+        ),
+        Booking(date=datetime.date(2026, 4, 11), time="ALL DAY", event_type="Schools [county] meet"),
+    ]
+)
+
+
+def chunks(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+class BookingsStreamParserTests(unittest.TestCase):
+    def test_bookings_are_completed_as_they_stream_whatever_the_chunking(self):
+        text = BOOKINGS.model_dump_json(indent=2)
+        for size in (1, 7, len(text)):
+            parser = BookingsStreamParser()
+            completed = [booking for chunk in chunks(text, size) for booking in parser.feed(chunk)]
+            self.assertEqual(completed, BOOKINGS.bookings)
+            self.assertEqual(parser.finish(), BOOKINGS)
+
+    def test_first_booking_is_available_before_the_second_arrives(self):
+        text = BOOKINGS.model_dump_json()
+        parser = BookingsStreamParser()
+        self.assertEqual(parser.feed(text[: text.index('{"day":null')]), BOOKINGS.bookings[:1])
+
+    def test_schema_violations_abort(self):
+        for text in (
+            'I could not find any bookings, sorry! {"bookings": []}',
+            '{"events": [{"date": "2026-04-09"',
+            '{"bookings": [{"date": "2026-04-09", "time": "ALL DAY"}, {"date": "9th April", "time": "ALL DAY"}',
+        ):
+            with self.subTest(text=text), self.assertRaises(StreamAborted):
+                BookingsStreamParser().feed(text)
+        with self.assertRaises(StreamAborted):
+            BookingsStreamParser().finish()
+
+    def test_runaway_generations_abort(self):
+        booking = '{"date": "2026-04-09", "time": "ALL DAY"}, '
+        parser = BookingsStreamParser()
+        with self.assertRaises(StreamAborted):
+            parser.feed('{"bookings": [' + booking * (MAX_REPEATS + 1))
+        self.assertEqual(len(parser.bookings), MAX_REPEATS)
+
+        with self.assertRaises(StreamAborted):
+            BookingsStreamParser().feed('{"bookings": [' + booking + '{"date": "2028-01-01", "time": "ALL DAY"}')
+
+
+@patch("src.extract.google_.STREAMING", True)
+@patch("src.extract.google_.CONTEXT_CACHING", False)
+@patch("src.extract.google_.client")
+class StreamingExtractionTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        recorder_patcher = patch("src.extract.google_.recorder", ResponseRecorder(Path(directory.name)))
+        recorder_patcher.start()
+        self.addCleanup(recorder_patcher.stop)
+
+    def stream(self, parts: list[str]) -> Iterator[Mock]:
+        self.received = 0
+        for i, text in enumerate(parts):
+            self.received += 1
+            yield Mock(
+                text=text,
+                usage_metadata=genai.types.GenerateContentResponseUsageMetadata(
+                    prompt_token_count=1000, candidates_token_count=10 * (i + 1)
+                ),
+            )
+
+    def test_complete_stream_gives_the_bookings(self, client: Mock):
+        client.models.generate_content_stream.return_value = self.stream(chunks(BOOKINGS.model_dump_json(), 20))
+
+        self.assertEqual(extract_bookings_from_bytes(b"image", "image/png"), BOOKINGS)
+        client.models.generate_content.assert_not_called()
+
+    def test_off_the_rails_stream_is_stopped_early(self, client: Mock):
+        parts = ['{"bookings": [', '{"date": "2026-04-09", "time": "ALL DAY"}, ' * (MAX_REPEATS + 1), "{", "}", "]}"]
+        client.models.generate_content_stream.return_value = self.stream(parts)
+
+        with patch("src.extract.google_.record_usage") as record_usage:
+            self.assertIsNone(extract_bookings_from_bytes(b"image", "image/png"))
+
+        self.assertEqual(self.received, 2)
+        self.assertEqual(record_usage.call_args.args[0].output_tokens, 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
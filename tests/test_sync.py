@@ -0,0 +1,79 @@
+import datetime
+import unittest
+from unittest.mock import Mock, patch
+
+from src.bookings import Booking
+from src.daterange import DateRange
+from src.gcal import CALENDAR_ID, SyncTokenExpired, booking_to_event
+from src.sync import CalendarMirror
+from tests import FakeS3Client
+
+
+def event(day: int, source_id: str | None = None) -> dict:
+    return booking_to_event(Booking(date=datetime.date(2026, 4, day), time="ALL DAY"), source_id=source_id)
+
+
+class CalendarMirrorTests(unittest.TestCase):
+    def setUp(self):
+        self.fake_client = FakeS3Client()
+        self.mirror = CalendarMirror(self.fake_client, "test-bucket")
+        self.mirror.load()
+
+    @patch("src.sync.sync_events")
+    def test_incremental_sync_applies_changes_and_persists_token(self, mock_sync_events: Mock):
+        first, second, third = event(1), event(2), event(3)
+        mock_sync_events.side_effect = [
+            ([first, second], "token-1"),
+            ([{"id": first["id"], "status": "cancelled"}, third], "token-2"),
+        ]
+
+        self.mirror.sync()
+        self.mirror.save()
+        reloaded = CalendarMirror(self.fake_client, "test-bucket")
+        reloaded.load()
+        reloaded.sync()
+
+        self.assertEqual(
+            [call.args for call in mock_sync_events.call_args_list], [(None, CALENDAR_ID), ("token-1", CALENDAR_ID)]
+        )
+        self.assertEqual(reloaded.state.sync_token, "token-2")
+        self.assertEqual(set(reloaded.state.events), {second["id"], third["id"]})
+        self.assertNotIn("description", reloaded.state.events[second["id"]])
+        listed = reloaded.list_events(DateRange.inclusive(datetime.date(2026, 4, 3), datetime.date(2026, 4, 30)))
+        self.assertEqual([e["id"] for e in listed], [third["id"]])
+
+    @patch("src.sync.sync_events")
+    def test_expired_token_triggers_full_resync(self, mock_sync_events: Mock):
+        self.mirror.state.sync_token = "stale"
+        self.mirror.state.events = {"gone": {"id": "gone"}}
+        mock_sync_events.side_effect = [SyncTokenExpired(), ([event(1)], "fresh")]
+
+        self.mirror.sync()
+
+        self.assertEqual(
+            [call.args for call in mock_sync_events.call_args_list], [("stale", CALENDAR_ID), (None, CALENDAR_ID)]
+        )
+        self.assertEqual(list(self.mirror.state.events), [event(1)["id"]])
+        self.assertEqual(self.mirror.state.sync_token, "fresh")
+
+    @patch("src.sync.sync_events")
+    def test_events_are_looked_up_by_source_and_booking(self, mock_sync_events: Mock):
+        first, second, other = event(1, "image-a"), event(2, "image-a"), event(3, "image-b")
+        stale = {**first, "id": "stale"}
+        mock_sync_events.return_value = ([first, second, other, stale], "token")
+        self.mirror.sync()
+
+        self.assertEqual([e["id"] for e in self.mirror.events_for_source("image-b")], [other["id"]])
+        self.assertEqual(len(self.mirror.events_for_source("image-a")), 3)
+        booking_id = first["extendedProperties"]["private"]["booking_id"]
+        self.assertEqual(self.mirror.duplicate_booking_ids(), [booking_id])
+
+        mock_sync_events.return_value = ([{"id": "stale", "status": "cancelled"}], "token-2")
+        self.mirror.sync()
+
+        self.assertEqual([e["id"] for e in self.mirror.events_for_booking(booking_id)], [first["id"]])
+        self.assertEqual(self.mirror.duplicate_booking_ids(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
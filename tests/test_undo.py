@@ -0,0 +1,133 @@
+import datetime
+import unittest
+from unittest.mock import Mock, patch
+
+from src.bookings import Booking, Bookings
+from src.dedup import save_result
+from src.gcal import booking_to_event
+from src.manifest import Manifest, ManifestEntry, ManifestStore, ProcessingStatus
+from src.reconcile import SourcedBookings, reconcile_source
+from src.run import ContentStoreResult, run
+from src.sources import ATHLETICS_TRACK
+from src.undo import undo
+from tests import FakeCalendarService, FakeS3Client
+
+
+def event(day: int, source_id: str) -> dict:
+    return booking_to_event(Booking(date=datetime.date(2026, 4, day), time="ALL DAY"), source_id=source_id)
+
+
+class UndoTests(unittest.TestCase):
+    def test_undo_deletes_only_the_images_events_and_marks_it_rolled_back(self):
+        created, carried_over, other = event(1, "bad"), event(2, "bad"), event(3, "good")
+        fake_client = FakeS3Client(
+            manifest=Manifest(
+                entries={
+                    "bad": ManifestEntry(
+                        key="bad.png", status=ProcessingStatus.COMPLETED, event_ids=[created["id"], "already-gone"]
+                    )
+                }
+            )
+        )
+        store = ManifestStore(fake_client, "test-bucket")
+        store.load()
+        service = FakeCalendarService([created, carried_over, other])
+
+        with patch("src.gcal.get_client", return_value=service):
+            result = undo("bad", store)
+
+        self.assertEqual(result.deleted, 2)
+        self.assertEqual(list(service.events_by_id), [other["id"]])
+        self.assertEqual(service.batch_sizes, [2])
+        entry = fake_client.get_manifest().entries["bad"]
+        self.assertEqual((entry.status, entry.event_ids), (ProcessingStatus.ROLLED_BACK, []))
+
+    @patch("src.run.INCREMENTAL_SYNC", True)
+    @patch("src.undo.list_source_events")
+    @patch("src.sync.sync_events")
+    def test_undo_finds_the_images_events_in_the_mirror_in_incremental_sync_mode(
+        self, mock_sync_events: Mock, mock_list_source_events: Mock
+    ):
+        created, other = event(1, "bad"), event(3, "good")
+        mock_sync_events.return_value = ([created, other], "token")
+        fake_client = FakeS3Client(
+            manifest=Manifest(entries={"bad": ManifestEntry(key="bad.png", status=ProcessingStatus.COMPLETED)})
+        )
+        store = ManifestStore(fake_client, "test-bucket")
+        store.load()
+        service = FakeCalendarService([created, other])
+
+        with patch("src.gcal.get_client", return_value=service):
+            result = undo("bad", store)
+
+        mock_list_source_events.assert_not_called()
+        self.assertEqual(result.deleted, 1)
+        self.assertEqual(list(service.events_by_id), [other["id"]])
+
+    def test_undo_leaves_events_another_image_has_taken_over(self):
+        booking = Booking(date=datetime.date(2026, 4, 1), time="ALL DAY")
+        service = FakeCalendarService()
+        with patch("src.gcal.get_client", return_value=service):
+            created = reconcile_source(
+                SourcedBookings("a", None, Bookings(bookings=[booking]), datetime.datetime(2026, 4, 1))
+            )
+            reconcile_source(SourcedBookings("b", None, Bookings(bookings=[booking]), datetime.datetime(2026, 4, 2)))
+            fake_client = FakeS3Client(
+                manifest=Manifest(
+                    entries={"a": ManifestEntry(key="a.png", status=ProcessingStatus.COMPLETED, event_ids=created)}
+                )
+            )
+            store = ManifestStore(fake_client, "test-bucket")
+            store.load()
+
+            result = undo("a", store)
+
+        self.assertEqual(result.deleted, 0)
+        (event,) = service.events_by_id.values()
+        self.assertEqual(event["extendedProperties"]["private"]["source_id"], "b")
+
+    @patch("src.run.BUCKET", "test-bucket")
+    @patch("src.run.boto3.client")
+    @patch("src.run.reconcile")
+    @patch("src.run.extract_bookings_from_url")
+    @patch("src.run.get_content_store_s3")
+    @patch("src.run.get_source_img_urls")
+    def test_undone_image_is_re_extracted_by_the_next_run(
+        self,
+        mock_get_source_img_urls: Mock,
+        mock_get_content_store_s3: Mock,
+        mock_extract_bookings_from_url: Mock,
+        mock_reconcile: Mock,
+        mock_boto_client: Mock,
+    ):
+        bad = Bookings(bookings=[Booking(date=datetime.date(2025, 4, 9), time="ALL DAY")])
+        fixed = Bookings(bookings=[Booking(date=datetime.date(2026, 4, 9), time="ALL DAY")])
+        fake_client = FakeS3Client(
+            manifest=Manifest(entries={"bad": ManifestEntry(key="bad.png", status=ProcessingStatus.COMPLETED)})
+        )
+        save_result(fake_client, "test-bucket", "bad", bad)
+        store = ManifestStore(fake_client, "test-bucket")
+        store.load()
+        with patch("src.gcal.get_client", return_value=FakeCalendarService()):
+            undo("bad", store, reprocess=True)
+
+        mock_boto_client.return_value = fake_client
+        mock_get_source_img_urls.return_value = [(ATHLETICS_TRACK, "https://example.com/bad.png")]
+        mock_get_content_store_s3.return_value = ContentStoreResult(
+            id_="bad",
+            key="bad.png",
+            s3_url="https://test-bucket.s3.amazonaws.com/bad.png",
+            should_process=True,
+            processing_status=None,
+        )
+        mock_extract_bookings_from_url.return_value = fixed
+        mock_reconcile.return_value = {"bad": ["event-1"]}
+
+        run()
+
+        mock_extract_bookings_from_url.assert_called_once()
+        self.assertEqual(mock_reconcile.call_args.args[0][0].bookings, fixed)
+
+
+if __name__ == "__main__":
+    unittest.main()
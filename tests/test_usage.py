@@ -0,0 +1,87 @@
+import datetime
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from google import genai
+
+from src.bookings import Booking, Bookings
+from src.extract.replay import ResponseRecorder
+from src.manifest import ManifestStore
+from src.run import extract_img_url
+from src.sources import ATHLETICS_TRACK
+from src.usage import call_usage, record_usage, track_usage
+from tests import FakeS3Client
+
+METADATA = genai.types.GenerateContentResponseUsageMetadata(
+    prompt_token_count=1300,
+    candidates_token_count=200,
+    thoughts_token_count=100,
+    prompt_tokens_details=[
+        genai.types.ModalityTokenCount(modality=genai.types.MediaModality.TEXT, token_count=100),
+        genai.types.ModalityTokenCount(modality=genai.types.MediaModality.IMAGE, token_count=1200),
+    ],
+)
+
+
+def sample_bookings() -> Bookings:
+    return Bookings(bookings=[Booking(date=datetime.date(2026, 4, 9), time="ALL DAY")])
+
+
+class UsageTests(unittest.TestCase):
+    def test_call_usage_prices_tokens_and_nested_trackers_both_collect(self):
+        usage = call_usage("gemini-3-flash-preview", 2.0, input_tokens=1_000_000, output_tokens=100_000)
+        self.assertAlmostEqual(usage.cost_usd, 0.80)
+        self.assertEqual(call_usage("unknown-model", 1.0, input_tokens=10).cost_usd, 0)
+
+        with track_usage() as outer:
+            record_usage(usage, "gemini-3-flash-preview")
+            with track_usage() as inner:
+                record_usage(usage, "gemini-3-flash-preview")
+        record_usage(usage, "gemini-3-flash-preview")
+
+        self.assertEqual((outer.usage.calls, inner.usage.calls), (2, 1))
+        self.assertEqual(outer.usage.input_tokens, 2_000_000)
+
+
+@patch("src.run.BUCKET", "test-bucket")
+@patch("src.extract.google_.requests.get")
+@patch("src.run.requests.get")
+class ExtractionUsageTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        recorder_patcher = patch("src.extract.google_.recorder", ResponseRecorder(Path(directory.name)))
+        recorder_patcher.start()
+        self.addCleanup(recorder_patcher.stop)
+        caching_patcher = patch("src.extract.google_.CONTEXT_CACHING", False)
+        caching_patcher.start()
+        self.addCleanup(caching_patcher.stop)
+        client_patcher = patch("src.extract.google_.client")
+        self.client = client_patcher.start()
+        self.addCleanup(client_patcher.stop)
+
+    def test_usage_of_failed_and_successful_extractions_is_summed_in_the_manifest(self, mock_get, mock_media_get):
+        mock_get.return_value = Mock(content=b"image")
+        mock_media_get.return_value = Mock(content=b"image", headers={"content-type": "image/png"})
+        self.client.models.generate_content.side_effect = [
+            RuntimeError("429 RESOURCE_EXHAUSTED"),
+            Mock(parsed=sample_bookings(), usage_metadata=METADATA),
+        ]
+        store = ManifestStore(FakeS3Client(), "test-bucket")
+
+        with self.assertRaises(RuntimeError):
+            extract_img_url("https://example.com/track.png", store, ATHLETICS_TRACK)
+        with track_usage() as tracker:
+            result, _ = extract_img_url("https://example.com/track.png", store, ATHLETICS_TRACK)
+
+        usage = store.manifest.entries[result.id_].usage
+        self.assertEqual((usage.calls, usage.failed_calls), (2, 1))
+        self.assertEqual((usage.input_tokens, usage.output_tokens, usage.image_tokens), (1300, 300, 1200))
+        self.assertAlmostEqual(usage.cost_usd, (1300 * 0.50 + 300 * 3.00) / 1_000_000)
+        self.assertEqual((tracker.usage.calls, tracker.usage.failed_calls, tracker.usage.input_tokens), (1, 0, 1300))
+
+
+if __name__ == "__main__":
+    unittest.main()
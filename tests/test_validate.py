@@ -0,0 +1,98 @@
+import datetime
+import unittest
+
+from src.bookings import Booking, Bookings, FromToTime
+from src.validate import validate_bookings
+
+
+def booking(date: datetime.date, day: str | None = None, start: int = 9, end: int = 17, **kwargs) -> Booking:
+    return Booking(
+        day=day,  # type: ignore[arg-type]
+        date=date,
+        time=FromToTime(start=datetime.time(start), end=datetime.time(end)),
+        **kwargs,
+    )
+
+
+class ValidateBookingsTests(unittest.TestCase):
+    def test_valid_bookings_are_returned_unchanged(self):
+        bookings = Bookings(bookings=[booking(datetime.date(2025, 8, 8), "Friday")])
+
+        result = validate_bookings(bookings, 120)
+
+        self.assertIs(result.bookings, bookings)
+        self.assertEqual(result.issues, [])
+
+    def test_infers_year_from_weekday_labels(self):
+        # 2025-08-08 is a Friday; the model wrote 2024
+        bookings = Bookings(
+            bookings=[
+                booking(datetime.date(2024, 8, 8), "Friday"),
+                booking(datetime.date(2024, 8, 13), "Wednesday"),
+                booking(datetime.date(2024, 8, 18), "Monday"),
+            ]
+        )
+
+        result = validate_bookings(bookings, 120)
+
+        self.assertEqual(result.year_shift, 1)
+        self.assertEqual([b.date.year for b in result.bookings.bookings], [2025, 2025, 2025])
+
+    def test_moves_single_booking_across_new_year(self):
+        bookings = Bookings(
+            bookings=[
+                booking(datetime.date(2025, 12, 29), "Monday"),
+                booking(datetime.date(2025, 12, 31), "Wednesday"),
+                booking(datetime.date(2025, 1, 2), "Friday"),
+            ]
+        )
+
+        result = validate_bookings(bookings, 120)
+
+        self.assertEqual(result.year_shift, 0)
+        self.assertEqual(result.bookings.bookings[-1].date, datetime.date(2026, 1, 2))
+
+    def test_fixes_labels_times_outliers_and_duplicates(self):
+        bookings = Bookings(
+            bookings=[
+                booking(datetime.date(2025, 8, 8), "Friday"),
+                booking(datetime.date(2025, 8, 8), "Friday"),
+                booking(datetime.date(2025, 8, 9), "Friday"),
+                booking(datetime.date(2025, 8, 10), "Sunday", start=17, end=9),
+                booking(datetime.date(2025, 8, 11), "Monday", start=9, end=9),
+                booking(datetime.date(2025, 8, 12), "Tuesday"),
+                booking(datetime.date(2023, 3, 1), None),
+            ]
+        )
+
+        result = validate_bookings(bookings, 120)
+
+        self.assertEqual(
+            [(b.date.day, b.day) for b in result.bookings.bookings],
+            [(8, "Friday"), (9, "Saturday"), (10, "Sunday"), (12, "Tuesday")],
+        )
+        swapped = result.bookings.bookings[2].time
+        assert isinstance(swapped, FromToTime)
+        self.assertEqual((swapped.start, swapped.end), (datetime.time(9), datetime.time(17)))
+        self.assertEqual(len(result.issues), 5)
+
+    def test_an_end_of_midnight_is_not_swapped(self):
+        bookings = Bookings(bookings=[booking(datetime.date(2025, 8, 8), "Friday", start=18, end=0)])
+
+        result = validate_bookings(bookings)
+
+        self.assertEqual(result.bookings, bookings)
+        self.assertEqual(result.issues, [])
+
+    def test_season_long_schedules_keep_their_first_and_last_months(self):
+        season = [datetime.date(2026, 3, 1) + datetime.timedelta(days=days) for days in range(0, 300, 10)]
+        bookings = Bookings(bookings=[booking(date) for date in season] + [booking(datetime.date(2025, 9, 1))])
+
+        result = validate_bookings(bookings)
+
+        self.assertEqual([b.date for b in result.bookings.bookings], season)
+        self.assertEqual(result.issues, ["Dropped outlier date 2025-09-01, more than 320 days from the other bookings"])
+
+
+if __name__ == "__main__":
+    unittest.main()
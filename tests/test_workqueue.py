@@ -0,0 +1,191 @@
+import datetime
+import unittest
+from unittest.mock import Mock, patch
+
+from src.bookings import Booking, Bookings
+from src.deadline import Deadline
+from src.manifest import ManifestStore, ProcessingStatus
+from src.reconcile import reconcile
+from src.sources import ATHLETICS_TRACK
+from src.workqueue import (
+    MAX_RECEIVES,
+    STALE_QUEUED_AFTER,
+    VISIBILITY_TIMEOUT_S,
+    LocalQueue,
+    SqsQueue,
+    WorkItem,
+    consume,
+    enqueue,
+    handle_sqs_records,
+)
+from tests import FakeCalendarService, FakeClock, FakeS3Client
+
+CDN = "https://images.squarespace-cdn.com/content/v1/site"
+URLS = [f"{CDN}/1600000000010-A/track-april.png", f"{CDN}/1600000000011-A/track-may.png"]
+
+
+def sample_bookings() -> Bookings:
+    return Bookings(bookings=[Booking(date=datetime.date(2026, 4, 9), time="ALL DAY")])
+
+
+@patch("src.run.BUCKET", "test-bucket")
+@patch("src.run.reconcile")
+@patch("src.run.extract_bookings_from_url")
+@patch("src.run.requests.get")
+@patch("src.workqueue.get_source_img_urls")
+class WorkQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeS3Client()
+        self.store = ManifestStore(self.client, "test-bucket")
+        self.clock = FakeClock()
+        self.queue = LocalQueue(self.clock)
+
+    def configure(self, mock_get_source_img_urls: Mock, mock_get: Mock):
+        mock_get_source_img_urls.return_value = [(ATHLETICS_TRACK, url) for url in URLS]
+        mock_get.side_effect = lambda url, **kwargs: Mock(content=url.encode())
+
+    def test_enqueue_sends_each_new_image_once_and_consume_reconciles_it(
+        self, mock_get_source_img_urls, mock_get, mock_extract, mock_reconcile
+    ):
+        self.configure(mock_get_source_img_urls, mock_get)
+        mock_extract.return_value = sample_bookings()
+        mock_reconcile.return_value = {}
+
+        items = enqueue(self.queue, self.store)
+
+        self.assertEqual([item.img_url for item in items], URLS[::-1])
+        self.assertEqual({entry.status for entry in self.store.manifest.entries.values()}, {ProcessingStatus.QUEUED})
+        self.assertEqual(enqueue(self.queue, self.store), [])
+
+        self.assertEqual(consume(self.queue, self.store), 2)
+
+        self.assertEqual(self.queue.messages, {})
+        self.assertEqual(mock_reconcile.call_count, 2)
+        self.assertEqual({entry.status for entry in self.store.manifest.entries.values()}, {ProcessingStatus.COMPLETED})
+
+    def test_newest_upload_keeps_overlapping_dates_whatever_order_images_are_consumed(
+        self, mock_get_source_img_urls, mock_get, mock_extract, mock_reconcile
+    ):
+        self.configure(mock_get_source_img_urls, mock_get)
+        event_types = {URLS[0]: "OLD", URLS[1]: "NEW"}
+        mock_extract.side_effect = lambda url, prompt: Bookings(
+            bookings=[Booking(date=datetime.date(2026, 4, 9), time="ALL DAY", event_type=event_types[url])]
+        )
+        mock_reconcile.side_effect = reconcile
+        service = FakeCalendarService()
+
+        items = enqueue(self.queue, self.store)
+        with patch("src.gcal.get_client", return_value=service):
+            consume(self.queue, self.store)
+
+        self.assertEqual([item.img_url for item in items], [URLS[1], URLS[0]])
+        self.assertEqual([event["summary"] for event in service.events_by_id.values()], ["NEW (ALL DAY)"])
+
+    def test_failed_message_is_retried_after_the_visibility_timeout_then_dead_lettered(
+        self, mock_get_source_img_urls, mock_get, mock_extract, mock_reconcile
+    ):
+        self.configure(mock_get_source_img_urls, mock_get)
+        mock_get_source_img_urls.return_value = mock_get_source_img_urls.return_value[:1]
+        mock_extract.side_effect = RuntimeError("boom")
+        enqueue(self.queue, self.store)
+
+        self.assertEqual(consume(self.queue, self.store), 0)
+        self.assertEqual(mock_extract.call_count, 1)
+        self.assertEqual(consume(self.queue, self.store), 0)
+        self.assertEqual(mock_extract.call_count, 1)
+
+        for _ in range(MAX_RECEIVES):
+            self.clock.now += VISIBILITY_TIMEOUT_S
+            consume(self.queue, self.store)
+
+        self.assertEqual(mock_extract.call_count, MAX_RECEIVES)
+        self.assertEqual([item.img_url for item in self.queue.dead_letters], URLS[:1])
+        self.assertEqual(self.queue.messages, {})
+
+    def test_failed_image_is_not_sent_again_while_its_message_is_retrying(
+        self, mock_get_source_img_urls, mock_get, mock_extract, mock_reconcile
+    ):
+        self.configure(mock_get_source_img_urls, mock_get)
+        mock_get_source_img_urls.return_value = mock_get_source_img_urls.return_value[:1]
+        mock_extract.side_effect = RuntimeError("boom")
+        (item,) = enqueue(self.queue, self.store)
+        consume(self.queue, self.store)
+        self.assertEqual(self.store.manifest.entries[item.id_].status, ProcessingStatus.FAILED)
+
+        self.assertEqual(enqueue(self.queue, self.store), [])
+
+        queued_at = datetime.datetime.now(datetime.UTC) - STALE_QUEUED_AFTER - datetime.timedelta(minutes=1)
+        self.store.update(item.id_, item.key, queued_at=queued_at)
+        self.assertEqual(enqueue(self.queue, self.store), [item])
+
+    def test_image_left_queued_by_a_killed_consumer_is_sent_again_once_stale(
+        self, mock_get_source_img_urls, mock_get, mock_extract, mock_reconcile
+    ):
+        self.configure(mock_get_source_img_urls, mock_get)
+        mock_get_source_img_urls.return_value = mock_get_source_img_urls.return_value[:1]
+        (item,) = enqueue(self.queue, self.store)
+        self.assertEqual(enqueue(self.queue, self.store), [])
+
+        queued_at = datetime.datetime.now(datetime.UTC) - STALE_QUEUED_AFTER - datetime.timedelta(minutes=1)
+        self.store.update(item.id_, item.key, queued_at=queued_at)
+
+        self.assertEqual(enqueue(self.queue, self.store), [item])
+        self.assertGreater(self.store.manifest.entries[item.id_].queued_at, queued_at)
+
+    @patch("src.run.boto3.client")
+    def test_handle_sqs_records_returns_messages_it_has_no_time_for(
+        self, mock_boto_client, mock_get_source_img_urls, mock_get, mock_extract, mock_reconcile
+    ):
+        self.configure(mock_get_source_img_urls, mock_get)
+        mock_boto_client.return_value = self.client
+        items = enqueue(self.queue, self.store)
+        mock_extract.return_value = sample_bookings()
+        mock_reconcile.return_value = {}
+        deadline = Deadline(200, self.clock)
+        mock_extract.side_effect = lambda *args: setattr(self.clock, "now", 100) or sample_bookings()
+
+        response = handle_sqs_records(
+            [{"messageId": f"m{i}", "body": item.model_dump_json()} for i, item in enumerate(items)], deadline
+        )
+
+        self.assertEqual(response, {"batchItemFailures": [{"itemIdentifier": "m1"}]})
+        self.assertEqual(mock_extract.call_count, 1)
+
+    @patch("src.run.boto3.client")
+    def test_handle_sqs_records_reports_only_failed_messages(
+        self, mock_boto_client, mock_get_source_img_urls, mock_get, mock_extract, mock_reconcile
+    ):
+        self.configure(mock_get_source_img_urls, mock_get)
+        mock_boto_client.return_value = self.client
+        items = enqueue(self.queue, self.store)
+        mock_extract.side_effect = [RuntimeError("boom"), sample_bookings()]
+        mock_reconcile.return_value = {}
+
+        response = handle_sqs_records(
+            [{"messageId": f"m{i}", "body": item.model_dump_json()} for i, item in enumerate(items)]
+        )
+
+        self.assertEqual(response, {"batchItemFailures": [{"itemIdentifier": "m0"}]})
+        statuses = {id_: entry.status for id_, entry in self.client.get_manifest().entries.items()}
+        self.assertEqual([statuses[item.id_] for item in items], [ProcessingStatus.FAILED, ProcessingStatus.COMPLETED])
+
+
+class SqsQueueTests(unittest.TestCase):
+    def test_fifo_queue_groups_messages_by_source_and_deduplicates_by_content_hash(self):
+        client = Mock()
+        client.send_message_batch.return_value = {"Successful": []}
+        items = [
+            WorkItem(id_=f"id-{i}", key=f"id-{i}.png", s3_url="s3", img_url="img", source="tennis") for i in range(12)
+        ]
+
+        SqsQueue(client, "https://sqs.eu-west-1.amazonaws.com/1/work.fifo").send(items)
+
+        batches = [call.kwargs["Entries"] for call in client.send_message_batch.call_args_list]
+        self.assertEqual([len(entries) for entries in batches], [10, 2])
+        self.assertEqual(
+            (batches[1][1]["MessageGroupId"], batches[1][1]["MessageDeduplicationId"]), ("tennis", "id-11")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()